@@ -0,0 +1,4 @@
+import os
+
+# the suite only ever talks to the local MockServer, keep `import samino` off pypi
+os.environ.setdefault("SAMINO_NO_VERSION_CHECK", "1")
@@ -0,0 +1,67 @@
+"""Inline media messages (voice notes): the old read/b64encode/dumps/sign path vs InlineBody, peak memory and time."""
+import os
+import tempfile
+import time
+import tracemalloc
+from base64 import b64encode
+
+from ujson import dumps
+
+from samino import Local
+from samino.lib import util
+from samino.lib.upload import InlineBody, MediaStream
+
+
+def message():
+    return {"type": 2, "content": None, "mediaType": 110, "attachedObject": None, "extensions": None}
+
+
+def legacy(path: str):
+    with open(path, "rb") as file:
+        data = {**message(), "mediaUploadValue": b64encode(file.read()).decode()}
+    body = dumps(data)
+    return body, util.generateSig(body)
+
+
+def streamed(path: str):
+    with MediaStream(path) as raw:
+        body = InlineBody(message(), "mediaUploadValue", raw)
+    return body, body.signature
+
+
+def traced(build, path: str):
+    tracemalloc.start()
+    begin = time.perf_counter()
+    result = build(path)
+    elapsed = time.perf_counter() - begin
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return peak, elapsed
+
+
+def run(server, sizes: tuple = (1, 4, 16)):
+    results = {}
+    local = Local(server.comId)
+    for megabytes in sizes:
+        size = megabytes * 1024 * 1024
+        with tempfile.NamedTemporaryFile(suffix=".aac", delete=False) as file:
+            file.write(os.urandom(size))
+        try:
+            legacyPeak, legacySeconds = traced(legacy, file.name)
+            streamPeak, streamSeconds = traced(streamed, file.name)
+
+            begin = time.perf_counter()
+            local.send_message("chat", file=file.name, fileType="audio")
+            sendSeconds = time.perf_counter() - begin
+        finally:
+            os.remove(file.name)
+
+        results[f"{megabytes}MB"] = {
+            "legacyPeakRatio": legacyPeak / size,
+            "legacySeconds": legacySeconds,
+            "streamPeakRatio": streamPeak / size,
+            "streamSeconds": streamSeconds,
+            "sendSeconds": sendSeconds,
+        }
+    return results
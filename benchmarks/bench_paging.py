@@ -0,0 +1,35 @@
+"""Member export through iter_all_users, serial vs prefetching, for Local and SLocal."""
+import asyncio
+import time
+
+from samino import Local, SLocal
+
+
+def runSync(server, prefetch: int, size: int):
+    local = Local(server.comId)
+    begin = time.perf_counter()
+    count = sum(1 for _ in local.iter_all_users(size=size, prefetch=prefetch))
+    return count, time.perf_counter() - begin
+
+
+async def runAsync(server, prefetch: int, size: int):
+    async with SLocal(server.comId) as local:
+        begin = time.perf_counter()
+        count = 0
+        async for _ in local.iter_all_users(size=size, prefetch=prefetch):
+            count += 1
+        return count, time.perf_counter() - begin
+
+
+def run(server, windows: tuple = (0, 4, 16), size: int = 25):
+    results = {"members": server.members, "pageSize": size}
+    for prefetch in windows:
+        syncCount, syncElapsed = runSync(server, prefetch, size)
+        asyncCount, asyncElapsed = asyncio.run(runAsync(server, prefetch, size))
+        results[str(prefetch)] = {
+            "syncItems": syncCount,
+            "syncSeconds": syncElapsed,
+            "asyncItems": asyncCount,
+            "asyncSeconds": asyncElapsed,
+        }
+    return results
@@ -0,0 +1,26 @@
+"""Response-to-object cost for the major object types, on data shaped like the real API."""
+from samino.lib.objects import (CommentList, Community, Event, Message, MessageList, Thread, ThreadList,
+                                UserProfile, UserProfileList)
+
+from .common import measure
+
+
+def run(server, duration: float = 0.5, size: int = 25):
+    chatId = "chat0000-0000-4000-8000-000000000000"
+    profiles = [server.profile(index, server.comId) for index in range(size)]
+    messages = [server.message(chatId, index, server.comId) for index in range(size)]
+    threads = [server.thread(f"chat0000-0000-4000-8000-{index:012d}", server.comId) for index in range(size)]
+    comments = [{"commentId": str(index), "content": "comment", "author": profiles[index]} for index in range(size)]
+    frame = server.frame(chatId)["o"]
+
+    return {
+        "UserProfile": measure(lambda: UserProfile(profiles[0]).UserProfile, duration),
+        f"UserProfileList[{size}]": measure(lambda: UserProfileList(profiles).UserProfileList, duration),
+        "Message": measure(lambda: Message(messages[0]).Message, duration),
+        f"MessageList[{size}]": measure(lambda: MessageList(messages).MessageList, duration),
+        "Thread": measure(lambda: Thread(threads[0]).Thread, duration),
+        f"ThreadList[{size}]": measure(lambda: ThreadList(threads).ThreadList, duration),
+        "Community": measure(lambda: Community(server.community(server.comId)).Community, duration),
+        f"CommentList[{size}]": measure(lambda: CommentList(comments).CommentList, duration),
+        "Event": measure(lambda: Event(frame).Event, duration),
+    }
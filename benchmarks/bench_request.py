@@ -0,0 +1,35 @@
+"""Session.postRequest overhead: header build, signing and JSON encoding, then a full round trip."""
+from time import time as timestamp
+
+from ujson import dumps
+
+from samino.lib import util
+from samino.lib.sessions import Session
+
+from .common import measure
+
+
+def payload():
+    return {
+        "type": 0,
+        "content": "benchmark message " * 8,
+        "attachedObject": None,
+        "extensions": {"mentionedArray": [{"uid": "user0000-0000-4000-8000-000000000001"}]},
+        "clientRefId": int(timestamp() / 10 % 100000000),
+        "timestamp": int(timestamp() * 1000),
+    }
+
+
+def run(server, duration: float = 0.5):
+    session = Session()
+    data = payload()
+    encoded = dumps(data)
+
+    return {
+        "encode": measure(lambda: dumps(data), duration),
+        "sign": measure(lambda: util.generateSig(encoded), duration),
+        "headers": measure(lambda: session.updateHeaders(data=encoded, sid=session.sid), duration),
+        "postRequest": measure(
+            lambda: session.postRequest(f"/x{server.comId}/s/chat/thread/chat/message", payload()), duration),
+        "getRequest": measure(lambda: session.getRequest(f"/x{server.comId}/s/chat/thread/chat"), duration),
+    }
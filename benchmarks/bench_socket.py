@@ -0,0 +1,24 @@
+"""Socket dispatch throughput: raw frames through Callbacks.resolve into a registered handler."""
+import os
+import tempfile
+
+import ujson as json
+
+from samino.lib.recorder import Recorder, Replay
+from samino.sockets import Callbacks
+
+
+def run(server, frames: int = 5000):
+    callbacks = Callbacks()
+    callbacks.event("on_text_message")(lambda event: event.message.content)
+
+    path = os.path.join(tempfile.mkdtemp(), "frames.bin")
+    with Recorder(path) as recorder:
+        for index in range(frames):
+            recorder.write(json.dumps(server.frame(index=index)))
+
+    try:
+        report = Replay(callbacks, path).run()
+    finally:
+        os.remove(path)
+    return report.json
@@ -0,0 +1,42 @@
+"""Sync (threads over Local) vs SAsync (tasks over SLocal) request throughput at several concurrencies."""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from samino import Local, SLocal
+from samino.mock import fakeId
+
+
+def runSync(server, concurrency: int, requests: int):
+    local = Local(server.comId)
+
+    def work(index):
+        local.get_user_info(fakeId("user", index % server.members))
+
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(work, range(requests)))
+    return requests / (time.perf_counter() - begin)
+
+
+async def runAsync(server, concurrency: int, requests: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with SLocal(server.comId) as local:
+        async def work(index):
+            async with semaphore:
+                await local.get_user_info(fakeId("user", index % server.members))
+
+        begin = time.perf_counter()
+        await asyncio.gather(*[work(index) for index in range(requests)])
+        return requests / (time.perf_counter() - begin)
+
+
+def run(server, concurrencies: tuple = (1, 4, 16, 64), requests: int = 400):
+    results = {}
+    for concurrency in concurrencies:
+        results[str(concurrency)] = {
+            "syncRequestsPerSec": runSync(server, concurrency, requests),
+            "asyncRequestsPerSec": asyncio.run(runAsync(server, concurrency, requests)),
+        }
+    return results
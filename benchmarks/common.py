@@ -0,0 +1,39 @@
+import platform
+import time
+from datetime import datetime, timezone
+
+
+def percentile(values: list, q: float):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def measure(func, duration: float = 0.5, minCalls: int = 20):
+    """Call `func` repeatedly for about `duration` seconds and summarize per-call timings (seconds)."""
+    samples = []
+    deadline = time.perf_counter() + duration
+    while len(samples) < minCalls or time.perf_counter() < deadline:
+        begin = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - begin)
+
+    total = sum(samples)
+    return {
+        "calls": len(samples),
+        "mean": total / len(samples),
+        "p50": percentile(samples, 50),
+        "p99": percentile(samples, 99),
+        "opsPerSec": len(samples) / total if total else None,
+    }
+
+
+def meta():
+    import samino
+
+    return {
+        "samino": samino.version,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
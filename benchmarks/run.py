@@ -0,0 +1,52 @@
+"""
+Runs the benchmark suite against a local MockServer and prints (or writes) JSON results.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --only parse,socket --latency 0.005
+"""
+import argparse
+import sys
+
+import ujson as json
+
+from samino.mock import MockServer
+
+from . import bench_inline, bench_paging, bench_parse, bench_request, bench_socket, bench_throughput
+from .common import meta
+
+SUITES = {
+    "request": bench_request.run,
+    "parse": bench_parse.run,
+    "throughput": bench_throughput.run,
+    "socket": bench_socket.run,
+    "paging": bench_paging.run,
+    "inline": bench_inline.run,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="samino benchmarks")
+    parser.add_argument("--only", help="comma separated suites: " + ",".join(SUITES))
+    parser.add_argument("--latency", type=float, default=0.002, help="mock server latency in seconds")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    suites = args.only.split(",") if args.only else list(SUITES)
+    results = {"meta": meta(), "config": {"latency": args.latency, "suites": suites}, "results": {}}
+
+    with MockServer(latency=args.latency, seed=0) as server:
+        server.use()
+        for name in suites:
+            print(f"running {name} . . .", file=sys.stderr)
+            results["results"][name] = SUITES[name](server)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,20 +4,27 @@ from time import time as timestamp
 import aiohttp
 import ujson as json
 
+from .session import SSession
 from ..lib import *
+from ..lib.auth import Credentials
+from ..lib.cache import profiles
+from ..lib.hooks import hooks
 from ..lib.objects import *
+from ..lib.checkpoint import Checkpoint
+from ..lib.paging import aitems, aoffsetPages
 
 
+@hooks.traceable
 class SAcm(Headers):
-    def __init__(self, comId: str):
+    def __init__(self, comId: str, credentials: Credentials = None):
         if not comId: self.comId = None
         if comId: self.comId = comId
+        if credentials is not None: self.credentials = credentials
 
         Headers.__init__(self)
 
-        self.uid = headers.userId
         self.headers = self.app_headers
-        self.session = aiohttp.ClientSession()
+        self.session = SSession(credentials=self.credentials)
 
     async def __aenter__(self):
         return self
@@ -108,7 +115,7 @@ class SAcm(Headers):
         type = type.lower()
         async with self.session.get(api(f"/x{self.comId}/s/user-profile?type={type}&start={start}&size={size}"), headers=self.headers) as req:
             if req.status != 200: return CheckExceptions(await req.json())
-            else: return UserProfileList((await req.json())["userProfileList"]).UserProfileList
+            else: return UserProfileList(profiles.listed(self.comId, (await req.json())["userProfileList"])).UserProfileList
 
     async def add_influencer(self, userId: str, monthlyFee: int = 50):
         data = json.dumps({"monthlyFee": monthlyFee, "timestamp": int(timestamp() * 1000)})
@@ -120,3 +127,21 @@ class SAcm(Headers):
         async with self.session.delete(api(f"/x{self.comId}/s/influencer/{userId}"), headers=self.headers) as req:
             if req.status != 200: return CheckExceptions(await req.json())
             else: return Json(await req.json())
+
+    async def iter_all_members(self, type: str, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        """
+        Streams UserProfile objects page by page, stops on the first short page.
+
+        - limit (int, optional): Stop after this many items. Defaults to all of them.
+
+        - prefetch (int, optional): Keep this many pages in flight at once (threads, or tasks for the async clients),
+          adapting to latency and rate limits. Defaults to 0, one page at a time.
+
+        - checkpoint (Checkpoint, optional): Resume from, and keep saving to, a CheckpointStore entry.
+        """
+        async def fetch(start, size):
+            return (await self.session.getJson(f"/x{self.comId}/s/user-profile?type={type.lower()}&start={start}&size={size}", self.headers))["userProfileList"]
+
+        async for item in aitems(aoffsetPages(fetch, start, size, prefetch, checkpoint), lambda x: profiles.build(self.comId, x), limit):
+            yield item
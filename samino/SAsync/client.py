@@ -8,27 +8,40 @@ from uuid import UUID
 import aiohttp
 import ujson as json
 
+from .acm import SAcm
+from .local import SLocal
+from .session import SSession
 from .sockets import Wss
 from ..lib import *
+from ..lib.auth import STALE, Credentials, SessionRecord, SessionStore, accountKey
+from ..lib.cache import metadata, profiles
+from ..lib.devices import devices
+from ..lib.hooks import hooks
+from ..lib.media import media
 from ..lib.objects import *
+from ..lib.checkpoint import Checkpoint, CheckpointStore
+from ..lib.bulk import abulkSend
+from ..lib.chatsync import ChatSync
+from ..lib.links import DEAD, idKey, linkKey, links
+from ..lib.paging import aitems, aoffsetPages, atokenPages, nextToken, tokenParam
+from ..lib.upload import InlineBody, MediaStream
 
 
+@hooks.traceable
 class SClient(Wss, Headers):
-    def __init__(self, deviceId: str = None, Trace: bool = False):
-        self.uid = None
-        self.sid = None
-        self.secret = None
+    def __init__(self, deviceId: str = None, Trace: bool = False, credentials: Credentials = None):
         self.web_headers = None
 
         self.Trace = Trace
-        headers.staticDevice = deviceId
+        if credentials is not None: self.credentials = credentials
+        self.pinnedDevice = bool(deviceId or (credentials and credentials.deviceId))
+        self.deviceId = deviceId or (credentials and credentials.deviceId) or devices.take()
+        self.credentials.deviceId = self.deviceId
 
-        Headers.__init__(self)
-        Wss.__init__(self, client=self, Session=self.session, Trace=self.Trace)
-        
-        self.deviceId = self.headers_device
+        Headers.__init__(self, header_device=self.deviceId)
+        self.session = SSession(credentials=self.credentials)
         self.headers = self.app_headers
-        self.session = aiohttp.ClientSession()
+        Wss.__init__(self, client=self, Session=self.session, Trace=self.Trace)
 
     async def __aenter__(self) -> "SClient":
         return self
@@ -46,18 +59,48 @@ class SClient(Wss, Headers):
     async def _close_session(self):
         await self.session.close()
 
-    async def sid_login(self, sid: str):
-        finalSessionId = sid if "sid=" in sid else f"sid={sid}"
+    def local(self, comId: str) -> SLocal:
+        """An SLocal of `comId` acting as this client's account."""
+        return SLocal(comId, credentials=self.credentials)
+
+    def acm(self, comId: str) -> SAcm:
+        """An SAcm of `comId` acting as this client's account."""
+        return SAcm(comId, credentials=self.credentials)
 
+    async def sid_login(self, sid: str):
+        self.credentials.update(sid=sid)
         info = (await self.get_account_info())
         self.uid = info.userId
-        self.sid = finalSessionId
-        headers.userId = self.uid
-        headers.definedSession = self.sid
         await self.Start()
         return info
 
-    async def login(self, email: str = None, password: str = None, secret: str = None,socket: bool = False):
+    async def resume(self, record: SessionRecord):
+        """Comes back as the account of a stored login on its device, see Client.resume."""
+        if record.deviceId:
+            self.deviceId = self.credentials.deviceId = record.deviceId
+            devices.pin(record.account, record.deviceId)
+        self.credentials.update(sid=record.sid, uid=record.uid, secret=record.secret)
+        return await self.get_account_info()
+
+    async def login(self, email: str = None, password: str = None, secret: str = None,socket: bool = False, store: SessionStore = None):
+        if store and ((email and password) or secret):
+            account = accountKey(email, secret)
+            record = store.load(account)
+            if record and record.deviceId:
+                # the device the account was first seen on, see Client.login
+                self.deviceId = self.credentials.deviceId = record.deviceId
+                devices.pin(account, record.deviceId)
+            if record and record.usable():
+                try:
+                    await self.resume(record)
+                    if socket: self.Launch()
+                    return Login(record.login)
+                except STALE:
+                    store.delete(account)
+        if not self.pinnedDevice and ((email and password) or secret):
+            # the account logs in from its own device every time, see Client.login
+            self.deviceId = self.credentials.deviceId = devices.device(accountKey(email, secret))
+
         data = {
             "clientType": 100,
             "action": "normal",
@@ -77,11 +120,12 @@ class SClient(Wss, Headers):
         async with self.session.post(api(f"/g/s/auth/login"), headers=self.updateHeaders(data=data), data=data) as req:
             if req.status != 200: return CheckExceptions(await req.json())
         
-            self.sid = f'sid={(await req.json())["sid"]}'
-            self.secret = (await req.json())["secret"]
-            self.uid = (await req.json())["auid"]
-            headers.definedSession = self.sid
-            headers.userId = self.uid
+            response = await req.json()
+            self.credentials.update(sid=response["sid"], uid=response["auid"], secret=response["secret"])
+            if store:
+                account = (await req.json()).get("account", {})
+                store.save(SessionRecord(accountKey(email, secret), self.sid, uid=self.uid, secret=self.secret,
+                                         deviceId=self.deviceId, nickname=account.get("nickname"), aminoId=account.get("aminoId")))
 
             if socket: self.Launch()
             return Login(await req.json())
@@ -96,9 +140,7 @@ class SClient(Wss, Headers):
         async with self.session.post(api("/g/s/auth/logout"), headers=self.updateHeaders(data=data), data=data ) as req:
             if req.status != 200: return CheckExceptions(await req.json())
             
-            self.sid = None
-            self.uiduserIdNone
-            headers.uid = None
+            self.credentials.clear()
 
             if self.Ran:await self.close()
             return Json((await req.json()))
@@ -113,14 +155,15 @@ class SClient(Wss, Headers):
             if (await req.json())["api:statuscode"] != 0: return CheckExceptions(await req.json())
             return f"api:message {(await req.json())['api:message']}\napi:statuscode {(await req.json())['api:statuscode']}\nThe device is fine"
 
-    async def upload_image(self, image: BinaryIO):
-        data = image.read()
+    async def upload_image(self, image: Union[BinaryIO, str, bytes]):
+        async def upload():
+            headers = {**self.headers, "content-type": "image/jpg", "content-length": str(len(data))}
 
-        self.headers["content-type"] = "image/jpg"
-        self.headers["content-length"] = str(len(data))
+            async with self.session.post(api(f"/g/s/media/upload"), data=data, headers=headers) as req:
+                return (await req.json())["mediaValue"]
 
-        async with self.session.post(api(f"/g/s/media/upload"), data=data, headers=self.headers) as req:
-            return (await req.json())["mediaValue"]
+        with MediaStream.of(image) as data:
+            return await media.aupload(data, "upload:image/jpg", upload)
 
     async def send_verify(self, email: str):
         data = json.dumps({
@@ -193,24 +236,32 @@ class SClient(Wss, Headers):
             if req.status != 200: return CheckExceptions(((await req.json())))
             return CommunityList(((await req.json()))["communityList"]).CommunityList
 
-    async def get_chat_threads(self, start: int = 0, size: int = 25):
-        async with self.session.get(api(f"/g/s/chat/thread?type=joined-me&start={start}&size={size}"), headers=self.headers ) as req:
-            if req.status != 200: return CheckExceptions(((await req.json())))
-            return ThreadList(((await req.json()))["threadList"]).ThreadList
+    async def get_chat_threads(self, start: int = 0, size: int = 25, cached: bool = True):
+        async def request():
+            async with self.session.get(api(f"/g/s/chat/thread?type=joined-me&start={start}&size={size}"), headers=self.headers ) as req:
+                if req.status != 200: return CheckExceptions(((await req.json())))
+                return ((await req.json()))["threadList"]
 
-    async def get_chat_info(self, chatId: str):
-        async with self.session.get(api(f"/g/s/chat/thread/{chatId}"), headers=self.headers) as req:
-            if req.status != 200: return CheckExceptions(((await req.json())))
-            return Thread(((await req.json()))["thread"]).Thread
+        return await metadata.aget(metadata.threadsKey(None, start, size, self.uid), request, lambda x: ThreadList(x).ThreadList, cached)
+
+    async def get_chat_info(self, chatId: str, cached: bool = True):
+        async def request():
+            async with self.session.get(api(f"/g/s/chat/thread/{chatId}"), headers=self.headers) as req:
+                if req.status != 200: return CheckExceptions(((await req.json())))
+                return ((await req.json()))["thread"]
+
+        return await metadata.aget(metadata.threadKey(None, chatId, self.uid), request, lambda x: Thread(x).Thread, cached)
 
     async def leave_chat(self, chatId: str):
         async with self.session.delete(api(f"/g/s/chat/thread/{chatId}/member/{self.uid}"), headers=self.headers ) as req:
             if req.status != 200: return CheckExceptions(((await req.json())))
+            metadata.invalidate_thread(None, chatId)
             return Json(((await req.json())))
 
     async def join_chat(self, chatId: str):
         async with self.session.post(api(f"/g/s/chat/thread/{chatId}/member/{self.uid}"), headers=self.headers ) as req:
             if req.status != 200: return CheckExceptions(((await req.json())))
+            metadata.invalidate_thread(None, chatId)
             return Json(((await req.json())))
 
     async def start_chat(self, userId: Union[str, list], title: str = None, message: str = None, content: str = None,chatType: int = 0):
@@ -230,10 +281,30 @@ class SClient(Wss, Headers):
             if req.status != 200: return CheckExceptions(await req.json())
             return Json((await req.json()))
 
-    async def get_from_link(self, link: str):
-        async with self.session.get(api(f"/g/s/link-resolution?q={link}"), headers=self.headers ) as req:
-            if req.status != 200: return CheckExceptions(await req.json())
-            return FromCode((await req.json())["linkInfoV2"]["extensions"]).FromCode
+    async def get_from_link(self, link: str, cached: bool = True):
+        async def request():
+            async with self.session.get(api(f"/g/s/link-resolution?q={link}"), headers=self.headers ) as req:
+                if req.status != 200: return CheckExceptions(await req.json())
+                return (await req.json())["linkInfoV2"]["extensions"]
+
+        return FromCode(await links.afetch(linkKey(link), request, cached)).FromCode
+
+    async def get_from_links(self, urls: list, workers: int = 8, cached: bool = True):
+        """
+        Resolves many links at once, `workers` requests at a time. Links already in the
+        link cache cost no request, duplicates are resolved once.
+
+        Returns {link: FromCode}, dead links map to None.
+        """
+        limit = asyncio.Semaphore(max(1, workers))
+
+        async def resolve(link: str):
+            async with limit:
+                try: return await self.get_from_link(link, cached)
+                except DEAD: return None
+
+        urls = list(dict.fromkeys(urls))
+        return dict(zip(urls, await asyncio.gather(*map(resolve, urls))))
 
     async def edit_profile(self, nickname: str = None, content: str = None, icon: BinaryIO = None,
                      backgroundColor: str = None, backgroundImage: str = None, defaultBubbleId: str = None):
@@ -256,6 +327,7 @@ class SClient(Wss, Headers):
         data = json.dumps(data)
         async with self.session.post(api(f"/g/s/user-profile/{self.uid}"), headers=self.updateHeaders(data=data) , data=data) as req:
             if req.status != 200: return CheckExceptions(await req.json())
+            profiles.invalidate(None, self.uid)
             return Json((await req.json()))
 
     async def flag_community(self, comId: str, reason: str, flagType: int):
@@ -335,12 +407,12 @@ class SClient(Wss, Headers):
     async def get_member_following(self, userId: str, start: int = 0, size: int = 25):
         async with self.session.get(api(f"/g/s/user-profile/{userId}/joined?start={start}&size={size}"), headers=self.headers ) as req:
             if req.status != 200: return CheckExceptions(await req.json())
-            return UserProfileList((await req.json())["userProfileList"]).UserProfileList
+            return UserProfileList(profiles.listed(None, (await req.json())["userProfileList"])).UserProfileList
 
     async def get_member_followers(self, userId: str, start: int = 0, size: int = 25):
         async with self.session.get(api(f"/g/s/user-profile/{userId}/member?start={start}&size={size}"), headers=self.headers ) as req:
             if req.status != 200: return CheckExceptions(await req.json())
-        return UserProfileList((await req.json())["userProfileList"]).UserProfileList
+        return UserProfileList(profiles.listed(None, (await req.json())["userProfileList"])).UserProfileList
 
     async def get_member_visitors(self, userId: str, start: int = 0, size: int = 25):
         async with self.session.get(api(f"/g/s/user-profile/{userId}/visitors?start={start}&size={size}"), headers=self.headers ) as req:
@@ -455,21 +527,34 @@ class SClient(Wss, Headers):
             else:
                 raise TypeError(fileType)
 
-            data["mediaUploadValue"] = base64.b64encode(file.read()).decode()
             data["attachedObject"] = None
             data["extensions"] = None
-
-        data = json.dumps(data)
-        async with self.session.post(api(f"/g/s/chat/thread/{chatId}/message"),headers=self.updateHeaders(data=data) , data=data) as req:
+            with MediaStream(file) as raw:
+                digest = media.digest(raw) if media.enabled else None
+                known = media.get(digest, f"message:{fileType}") if digest else None
+                if known: data["mediaValue"] = known  # uploaded before, no need to inline it again
+                else: data = InlineBody(data, "mediaUploadValue", raw)  # encoded and signed in place, see lib.upload
+
+        if isinstance(data, InlineBody):
+            headers = {**self.updateHeaders(data=data, signature=data.signature), "content-length": str(len(data))}
+        else:
+            data = json.dumps(data)
+            headers = self.updateHeaders(data=data)
+        async with self.session.post(api(f"/g/s/chat/thread/{chatId}/message"),headers=headers , data=data) as req:
             if req.status != 200: return CheckExceptions(await req.json())
+            if file and digest and not known:
+                media.put(digest, f"message:{fileType}", (await req.json())["message"].get("mediaValue"), len(raw))
             return Json((await req.json()))
 
-    async def get_community_info(self, comId: str):
-        async with self.session.get(
-            api(f"/g/s-x{comId}/community/info?withInfluencerList=1&withTopicList=true&influencerListOrderStrategy=fansCount"),
-            headers=self.headers ) as req:
-            if req.status != 200: return CheckExceptions(await req.json())
-            return Community((await req.json())["community"]).Community
+    async def get_community_info(self, comId: str, cached: bool = True):
+        async def request():
+            async with self.session.get(
+                api(f"/g/s-x{comId}/community/info?withInfluencerList=1&withTopicList=true&influencerListOrderStrategy=fansCount"),
+                headers=self.headers ) as req:
+                if req.status != 200: return CheckExceptions(await req.json())
+                return (await req.json())["community"]
+
+        return await metadata.aget(metadata.communityKey(comId), request, lambda x: Community(x).Community, cached)
 
     async def mark_as_read(self, chatId: str):
         async with self.session.post(api(f"/g/s/chat/thread/{chatId}/mark-as-read"), headers=self.headers ) as req:
@@ -481,10 +566,10 @@ class SClient(Wss, Headers):
             if req.status != 200: return CheckExceptions(await req.json())
             return Json((await req.json()))
 
-    async def get_chat_messages(self, chatId: str, start: int = 0, size: int = 25):
-        async with self.session.get(api(f"/g/s/chat/thread/{chatId}/message?v=2&pagingType=t&size={size}"), headers=self.headers ) as req:
+    async def get_chat_messages(self, chatId: str, start: int = 0, size: int = 25, pageToken: str = None):
+        async with self.session.get(api(f"/g/s/chat/thread/{chatId}/message?v=2&pagingType=t&size={size}{tokenParam(pageToken)}"), headers=self.headers ) as req:
             if req.status != 200: return CheckExceptions(await req.json())
-            return GetMessages((await req.json())["messageList"]).GetMessages
+            return GetMessages(await req.json()).GetMessages
 
     async def get_message_info(self, messageId: str, chatId: str):
         async with self.session.get(api(f"/g/s/chat/thread/{chatId}/message/{messageId}"), headers=self.headers,
@@ -551,9 +636,13 @@ class SClient(Wss, Headers):
             else:
                 return Json((await req.json()))
 
-    async def get_user_info(self, userId: str):
+    async def get_user_info(self, userId: str, cached: bool = True):
+        if cached and profiles.enabled:
+            profile = profiles.get(None, userId)
+            if profile: return profile
         async with self.session.get(api(f"/g/s/user-profile/{userId}"), headers=self.headers ) as req:
             if req.status != 200: return CheckExceptions(await req.json())
+            if profiles.enabled: return profiles.put(None, (await req.json())["userProfile"])
             return UserProfile((await req.json())["userProfile"]).UserProfile
 
     async def comment(self, comment: str, userId: str = None, replyTo: str = None):
@@ -656,14 +745,14 @@ class SClient(Wss, Headers):
     async def get_all_users(self, type: str = "recent", start: int = 0, size: int = 25):
         async with self.session.get(api(f"/g/s/user-profile?type={type}&start={start}&size={size}"), headers=self.headers ) as req:
             if req.status != 200: return CheckExceptions(await req.json())
-            return UserProfileList((await req.json())["userProfileList"]).UserProfileList
+            return UserProfileList(profiles.listed(None, (await req.json())["userProfileList"])).UserProfileList
 
     async def get_chat_members(self, start: int = 0, size: int = 25, chatId: str = None):
         async with self.session.get(api(f"/g/s/chat/thread/{chatId}/member?start={start}&size={size}&type=async default&cv=1.2"),headers=self.headers ) as req:
             if req.status != 200: return CheckExceptions(await req.json())
-            return UserProfileList((await req.json())["memberList"]).UserProfileList
+            return UserProfileList(profiles.listed(None, (await req.json())["memberList"])).UserProfileList
 
-    async def get_from_id(self, id: str, comId: str = None, objectType: int = 2):  # never tried
+    async def get_from_id(self, id: str, comId: str = None, objectType: int = 2, cached: bool = True):
         data = json.dumps({
             "objectId": id,
             "targetCode": 1,
@@ -675,9 +764,12 @@ class SClient(Wss, Headers):
         elif comId is not None:url = api(f"/g/s-x{comId}/link-resolution")
         else:raise TypeError("please put a comId")
 
-        async with self.session.post(url, headers=self.updateHeaders(data=data) , data=data) as req:
-            if req.status != 200: return CheckExceptions(await req.json())
-            return FromCode((await req.json())["linkInfoV2"]["extensions"]["linkInfo"]).FromCode
+        async def request():
+            async with self.session.post(url, headers=self.updateHeaders(data=data) , data=data) as req:
+                if req.status != 200: return CheckExceptions(await req.json())
+                return (await req.json())["linkInfoV2"]["extensions"]
+
+        return FromCode(await links.afetch(idKey(id, comId, objectType), request, cached)).FromCode
 
     async def chat_settings(self, chatId: str, viewOnly: bool = None, doNotDisturb: bool = None, canInvite: bool = False,canTip: bool = None, pin: bool = None):
         res = []
@@ -824,4 +916,58 @@ class SClient(Wss, Headers):
         if not isinstance(requestId, str): raise Exception(f"Please use a string not {type(requestId)}")
         async with self.session.post(api(f"/g/s/notice/{requestId}/decline"), headers=self.headers) as req:
             if req.status != 200: return CheckExceptions(await req.json())
-            return Json(await req.json())
\ No newline at end of file
+            return Json(await req.json())
+
+    async def iter_my_communities(self, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        """
+        Streams Community objects page by page, stops on the first short page.
+
+        - limit (int, optional): Stop after this many items. Defaults to all of them.
+
+        - prefetch (int, optional): Keep this many pages in flight at once (threads, or tasks for the async clients),
+          adapting to latency and rate limits. Defaults to 0, one page at a time.
+
+        - checkpoint (Checkpoint, optional): Resume from, and keep saving to, a CheckpointStore entry.
+        """
+        async def fetch(start, size):
+            return (await self.session.getJson(f"/g/s/community/joined?v=1&start={start}&size={size}", self.headers))["communityList"]
+
+        async for item in aitems(aoffsetPages(fetch, start, size, prefetch, checkpoint), lambda x: Community(x).Community, limit):
+            yield item
+
+    async def iter_chat_threads(self, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        async def fetch(start, size):
+            return (await self.session.getJson(f"/g/s/chat/thread?type=joined-me&start={start}&size={size}", self.headers))["threadList"]
+
+        async for item in aitems(aoffsetPages(fetch, start, size, prefetch, checkpoint), lambda x: Thread(x).Thread, limit):
+            yield item
+
+    async def iter_chat_messages(self, chatId: str, pageToken: str = None, size: int = 25, limit: int = None, checkpoint: Checkpoint = None):
+        """Streams Message objects from the newest one backwards by following `nextPageToken`."""
+        async def fetch(pageToken, size):
+            req = await self.session.getJson(f"/g/s/chat/thread/{chatId}/message?v=2&pagingType=t&size={size}{tokenParam(pageToken)}", self.headers)
+            return req["messageList"], nextToken(req)
+
+        async for item in aitems(atokenPages(fetch, pageToken, size, checkpoint), lambda x: Message(x).Message, limit):
+            yield item
+
+    async def iter_notifications(self, pageToken: str = None, size: int = 25, limit: int = None, checkpoint: Checkpoint = None):
+        """Streams raw notification dicts, there is no single notification object."""
+        async def fetch(pageToken, size):
+            req = await self.session.getJson(f"/g/s/notification?pagingType=t&size={size}{tokenParam(pageToken)}", self.headers)
+            return req["notificationList"], nextToken(req)
+
+        async for item in aitems(atokenPages(fetch, pageToken, size, checkpoint), limit=limit):
+            yield item
+
+    async def sync_chat_messages(self, chatId: str, store: CheckpointStore, size: int = 100):
+        """Incrementally mirrors a chat, see `ChatSync`."""
+        async for message in ChatSync(self, chatId, store, size).arun():
+            yield message
+
+    async def send_messages(self, jobs: list, workers: int = 8, rate: float = None, retries: int = 3,
+                            stopOnError: bool = True):
+        """Sends many messages at once, see `abulkSend`. jobs are (chatId, message) pairs."""
+        return await abulkSend(self.send_message, jobs, workers, rate, retries=retries, stopOnError=stopOnError)
\ No newline at end of file
@@ -1,17 +1,49 @@
 # From https://github.com/okok7711/AminoAcid/blob/master/aminoacid/exceptions.py
 # Modified By SirLez
 
+from types import MappingProxyType
+from typing import Optional
+
+# what an error is about, the `category` of its class
+RATE_LIMIT = "rate-limit"  # wait and try again
+AUTH = "auth"  # the session or the account, log in again
+PERMISSION = "permission"  # this account may not do it
+NOT_FOUND = "not-found"  # the object is gone
+TRANSIENT = "transient"  # unknown answers, worth another try
+RETRYABLE = frozenset((RATE_LIMIT, TRANSIENT))
+
+
+def parseDuration(value) -> Optional[float]:
+    """Seconds of an `api:duration` ("0.051s")."""
+    try: return float(str(value).rstrip("s"))
+    except ValueError: return None
+
 
 class AminoBaseException(Exception):
-    ...
+    """
+    An error response of the api, `data`. Its `api:statuscode`, `api:message` and
+    `api:duration` (seconds) are `statuscode`, `message` and `duration`.
+    """
+    category: Optional[str] = None
+
+    def __init__(self, data: dict = None, *args):
+        super().__init__(data, *args)
+        self.data = data if isinstance(data, dict) else {}
+        self.statuscode: Optional[int] = self.data.get("api:statuscode")
+        self.message: Optional[str] = self.data.get("api:message")
+        self.duration: Optional[float] = parseDuration(self.data["api:duration"]) if "api:duration" in self.data else None
+
+    @property
+    def retryable(self) -> bool:
+        return self.category in RETRYABLE
 
 
 class UnknownExcepion(AminoBaseException):
-    ...
+    category = TRANSIENT
 
 
 class AccessDenied(AminoBaseException):
-    ...
+    category = PERMISSION
 
 
 class UnsupportedService(AminoBaseException):
@@ -23,23 +55,23 @@ class InvalidRequest(AminoBaseException):
 
 
 class InvalidSession(AminoBaseException):
-    ...
+    category = AUTH
 
 
 class InvalidAccountOrPassword(AminoBaseException):
-    ...
+    category = AUTH
 
 
 class InvalidDevice(AminoBaseException):
-    ...
+    category = AUTH
 
 
 class TooManyRequests(AminoBaseException):
-    ...
+    category = RATE_LIMIT
 
 
 class ActionNotAllowed(AminoBaseException):
-    ...
+    category = PERMISSION
 
 
 class FileTooLarge(AminoBaseException):
@@ -47,7 +79,7 @@ class FileTooLarge(AminoBaseException):
 
 
 class UnexistentData(AminoBaseException):
-    ...
+    category = NOT_FOUND
 
 
 class MessageNeeded(AminoBaseException):
@@ -55,7 +87,7 @@ class MessageNeeded(AminoBaseException):
 
 
 class AccountDisabled(AminoBaseException):
-    ...
+    category = AUTH
 
 
 class InvalidEmail(AminoBaseException):
@@ -63,7 +95,7 @@ class InvalidEmail(AminoBaseException):
 
 
 class InvalidPassword(AminoBaseException):
-    ...
+    category = AUTH
 
 
 class EmailAlreadyTaken(AminoBaseException):
@@ -71,7 +103,7 @@ class EmailAlreadyTaken(AminoBaseException):
 
 
 class AccountDoesntExist(AminoBaseException):
-    ...
+    category = NOT_FOUND
 
 
 class CantFollowYourself(AminoBaseException):
@@ -79,23 +111,23 @@ class CantFollowYourself(AminoBaseException):
 
 
 class UserUnavailable(AminoBaseException):
-    ...
+    category = NOT_FOUND
 
 
 class YouAreBanned(AminoBaseException):
-    ...
+    category = PERMISSION
 
 
 class UserNotMemberOfCommunity(AminoBaseException):
-    ...
+    category = PERMISSION
 
 
 class RequestRejected(AminoBaseException):
-    ...
+    category = PERMISSION
 
 
 class ActivateAccount(AminoBaseException):
-    ...
+    category = AUTH
 
 
 class CantLeaveCommunity(AminoBaseException):
@@ -111,11 +143,11 @@ class EmailFlaggedAsSpam(AminoBaseException):
 
 
 class AccountDeleted(AminoBaseException):
-    ...
+    category = AUTH
 
 
 class API_ERR_EMAIL_NO_PASSWORD(AminoBaseException):
-    ...
+    category = AUTH
 
 
 class API_ERR_COMMUNITY_USER_CREATED_COMMUNITIES_VERIFY(AminoBaseException):
@@ -127,19 +159,19 @@ class ReachedMaxTitles(AminoBaseException):
 
 
 class VerificationRequired(AminoBaseException):
-    ...
+    category = AUTH
 
 
 class API_ERR_INVALID_AUTH_NEW_DEVICE_LINK(AminoBaseException):
-    ...
+    category = AUTH
 
 
 class CommandCooldown(AminoBaseException):
-    ...
+    category = RATE_LIMIT
 
 
 class UserBannedByTeamAmino(AminoBaseException):
-    ...
+    category = PERMISSION
 
 
 class BadImage(AminoBaseException):
@@ -155,23 +187,23 @@ class InvalidVoiceNote(AminoBaseException):
 
 
 class RequestedNoLongerExist(AminoBaseException):
-    ...
+    category = NOT_FOUND
 
 
 class PageRepostedTooRecently(AminoBaseException):
-    ...
+    category = RATE_LIMIT
 
 
 class InsufficientLevel(AminoBaseException):
-    ...
+    category = PERMISSION
 
 
 class WallCommentingDisabled(AminoBaseException):
-    ...
+    category = PERMISSION
 
 
 class CommunityNoLongerExists(AminoBaseException):
-    ...
+    category = NOT_FOUND
 
 
 class InvalidCodeOrLink(AminoBaseException):
@@ -187,11 +219,11 @@ class CommunityCreateLimitReached(AminoBaseException):
 
 
 class CommunityDisabled(AminoBaseException):
-    ...
+    category = PERMISSION
 
 
 class CommunityDeleted(AminoBaseException):
-    ...
+    category = NOT_FOUND
 
 
 class ReachedMaxCategories(AminoBaseException):
@@ -219,15 +251,15 @@ class TooManyInviteUsers(AminoBaseException):
 
 
 class ChatInvitesDisabled(AminoBaseException):
-    ...
+    category = PERMISSION
 
 
 class RemovedFromChat(AminoBaseException):
-    ...
+    category = PERMISSION
 
 
 class UserNotJoined(AminoBaseException):
-    ...
+    category = PERMISSION
 
 
 class API_ERR_CHAT_VVCHAT_NO_MORE_REPUTATIONS(AminoBaseException):
@@ -235,15 +267,15 @@ class API_ERR_CHAT_VVCHAT_NO_MORE_REPUTATIONS(AminoBaseException):
 
 
 class MemberKickedByOrganizer(AminoBaseException):
-    ...
+    category = PERMISSION
 
 
 class LevelFiveRequiredToEnableProps(AminoBaseException):
-    ...
+    category = PERMISSION
 
 
 class ChatViewOnly(AminoBaseException):
-    ...
+    category = PERMISSION
 
 
 class ChatMessageTooBig(AminoBaseException):
@@ -251,7 +283,7 @@ class ChatMessageTooBig(AminoBaseException):
 
 
 class InviteCodeNotFound(AminoBaseException):
-    ...
+    category = NOT_FOUND
 
 
 class AlreadyRequestedJoinCommunity(AminoBaseException):
@@ -271,7 +303,7 @@ class API_ERR_PUSH_SERVER_LINK_NOT_IN_COMMUNITY(AminoBaseException):
 
 
 class API_ERR_PUSH_SERVER_LIMITATION_TIME(AminoBaseException):
-    ...
+    category = RATE_LIMIT
 
 
 class AlreadyCheckedIn(AminoBaseException):
@@ -287,11 +319,11 @@ class AccountAlreadyRestored(AminoBaseException):
 
 
 class IncorrectVerificationCode(AminoBaseException):
-    ...
+    category = AUTH
 
 
 class NotOwnerOfChatBubble(AminoBaseException):
-    ...
+    category = PERMISSION
 
 
 class NotEnoughCoins(AminoBaseException):
@@ -318,88 +350,98 @@ class InvalidName(AminoBaseException):
     ...
 
 
+# status code -> exception, built once
+EXCEPTIONS = MappingProxyType({
+    100: UnsupportedService,
+    102: FileTooLarge,
+    103: InvalidRequest,
+    104: InvalidRequest,
+    105: InvalidSession,
+    106: AccessDenied,
+    107: UnexistentData,
+    110: ActionNotAllowed,
+    113: MessageNeeded,
+    200: InvalidAccountOrPassword,
+    201: AccountDisabled,
+    210: AccountDisabled,
+    213: InvalidEmail,
+    214: InvalidPassword,
+    215: EmailAlreadyTaken,
+    216: AccountDoesntExist,
+    218: InvalidDevice,
+    219: TooManyRequests,
+    221: CantFollowYourself,
+    225: UserUnavailable,
+    229: YouAreBanned,
+    230: UserNotMemberOfCommunity,
+    235: RequestRejected,
+    238: ActivateAccount,
+    239: CantLeaveCommunity,
+    240: ReachedTitleLength,
+    241: EmailFlaggedAsSpam,
+    246: AccountDeleted,
+    251: API_ERR_EMAIL_NO_PASSWORD,
+    257: API_ERR_COMMUNITY_USER_CREATED_COMMUNITIES_VERIFY,
+    262: ReachedMaxTitles,
+    270: VerificationRequired,
+    271: API_ERR_INVALID_AUTH_NEW_DEVICE_LINK,
+    291: CommandCooldown,
+    293: UserBannedByTeamAmino,
+    300: BadImage,
+    313: InvalidThemepack,
+    314: InvalidVoiceNote,
+    500: RequestedNoLongerExist,
+    700: RequestedNoLongerExist,
+    1600: RequestedNoLongerExist,
+    503: PageRepostedTooRecently,
+    551: InsufficientLevel,
+    702: WallCommentingDisabled,
+    801: CommunityNoLongerExists,
+    802: InvalidCodeOrLink,
+    805: CommunityNameAlreadyTaken,
+    806: CommunityCreateLimitReached,
+    814: CommunityDisabled,
+    833: CommunityDeleted,
+    1002: ReachedMaxCategories,
+    1501: DuplicatePollOption,
+    1507: ReachedMaxPollOptions,
+    1602: TooManyChats,
+    1605: ChatFull,
+    1606: TooManyInviteUsers,
+    1611: ChatInvitesDisabled,
+    1612: RemovedFromChat,
+    1613: UserNotJoined,
+    1627: API_ERR_CHAT_VVCHAT_NO_MORE_REPUTATIONS,
+    1637: MemberKickedByOrganizer,
+    1661: LevelFiveRequiredToEnableProps,
+    1663: ChatViewOnly,
+    1664: ChatMessageTooBig,
+    1900: InviteCodeNotFound,
+    2001: AlreadyRequestedJoinCommunity,
+    2501: API_ERR_PUSH_SERVER_LIMITATION_APART,
+    2502: API_ERR_PUSH_SERVER_LIMITATION_COUNT,
+    2503: API_ERR_PUSH_SERVER_LINK_NOT_IN_COMMUNITY,
+    2504: API_ERR_PUSH_SERVER_LIMITATION_TIME,
+    2601: AlreadyCheckedIn,
+    2611: AlreadyUsedMonthlyRepair,
+    2800: AccountAlreadyRestored,
+    3102: IncorrectVerificationCode,
+    3905: NotOwnerOfChatBubble,
+    4300: NotEnoughCoins,
+    4400: AlreadyPlayedLottery,
+    4500: CannotSendCoins,
+    4501: CannotSendCoins,
+    6001: AminoIDAlreadyChanged,
+    6002: InvalidAminoID,
+    9901: InvalidName,
+})
+
+# category -> its exceptions, for except clauses
+CATEGORIES = MappingProxyType({
+    category: tuple(error for error in dict.fromkeys([UnknownExcepion, *EXCEPTIONS.values()]) if error.category == category)
+    for category in (RATE_LIMIT, AUTH, PERMISSION, NOT_FOUND, TRANSIENT)
+})
+
+
 def CheckExceptions(data: dict):
-    raise {
-            100: UnsupportedService,
-            102: FileTooLarge,
-            103: InvalidRequest,
-            104: InvalidRequest,
-            105: InvalidSession,
-            106: AccessDenied,
-            107: UnexistentData,
-            110: ActionNotAllowed,
-            113: MessageNeeded,
-            200: InvalidAccountOrPassword,
-            201: AccountDisabled,
-            210: AccountDisabled,
-            213: InvalidEmail,
-            214: InvalidPassword,
-            215: EmailAlreadyTaken,
-            216: AccountDoesntExist,
-            218: InvalidDevice,
-            219: TooManyRequests,
-            221: CantFollowYourself,
-            225: UserUnavailable,
-            229: YouAreBanned,
-            230: UserNotMemberOfCommunity,
-            235: RequestRejected,
-            238: ActivateAccount,
-            239: CantLeaveCommunity,
-            240: ReachedTitleLength,
-            241: EmailFlaggedAsSpam,
-            246: AccountDeleted,
-            251: API_ERR_EMAIL_NO_PASSWORD,
-            257: API_ERR_COMMUNITY_USER_CREATED_COMMUNITIES_VERIFY,
-            262: ReachedMaxTitles,
-            270: VerificationRequired,
-            271: API_ERR_INVALID_AUTH_NEW_DEVICE_LINK,
-            291: CommandCooldown,
-            293: UserBannedByTeamAmino,
-            300: BadImage,
-            313: InvalidThemepack,
-            314: InvalidVoiceNote,
-            500: RequestedNoLongerExist,
-            700: RequestedNoLongerExist,
-            1600: RequestedNoLongerExist,
-            503: PageRepostedTooRecently,
-            551: InsufficientLevel,
-            702: WallCommentingDisabled,
-            801: CommunityNoLongerExists,
-            802: InvalidCodeOrLink,
-            805: CommunityNameAlreadyTaken,
-            806: CommunityCreateLimitReached,
-            814: CommunityDisabled,
-            833: CommunityDeleted,
-            1002: ReachedMaxCategories,
-            1501: DuplicatePollOption,
-            1507: ReachedMaxPollOptions,
-            1602: TooManyChats,
-            1605: ChatFull,
-            1606: TooManyInviteUsers,
-            1611: ChatInvitesDisabled,
-            1612: RemovedFromChat,
-            1613: UserNotJoined,
-            1627: API_ERR_CHAT_VVCHAT_NO_MORE_REPUTATIONS,
-            1637: MemberKickedByOrganizer,
-            1661: LevelFiveRequiredToEnableProps,
-            1663: ChatViewOnly,
-            1664: ChatMessageTooBig,
-            1900: InviteCodeNotFound,
-            2001: AlreadyRequestedJoinCommunity,
-            2501: API_ERR_PUSH_SERVER_LIMITATION_APART,
-            2502: API_ERR_PUSH_SERVER_LIMITATION_COUNT,
-            2503: API_ERR_PUSH_SERVER_LINK_NOT_IN_COMMUNITY,
-            2504: API_ERR_PUSH_SERVER_LIMITATION_TIME,
-            2601: AlreadyCheckedIn,
-            2611: AlreadyUsedMonthlyRepair,
-            2800: AccountAlreadyRestored,
-            3102: IncorrectVerificationCode,
-            3905: NotOwnerOfChatBubble,
-            4300: NotEnoughCoins,
-            4400: AlreadyPlayedLottery,
-            4500: CannotSendCoins,
-            4501: CannotSendCoins,
-            6001: AminoIDAlreadyChanged,
-            6002: InvalidAminoID,
-            9901: InvalidName,
-        }.get(data.get("api:statuscode", 1000), UnknownExcepion)(data)
+    raise EXCEPTIONS.get(data.get("api:statuscode", 1000), UnknownExcepion)(data)
@@ -3,27 +3,39 @@ import os
 from binascii import hexlify
 from time import time as timestamp
 from time import timezone
-from typing import Union, BinaryIO
+from typing import Callable, Union, BinaryIO
 from uuid import UUID
 
 import aiohttp
 import ujson as json
 from json_minify import json_minify
 
+from .session import SSession
 from ..lib import *
+from ..lib.auth import Credentials
+from ..lib.cache import metadata, profiles
+from ..lib.hooks import hooks
+from ..lib.media import media
 from ..lib.objects import *
+from ..lib.checkpoint import Checkpoint, CheckpointStore
+from ..lib.bulk import abulkSend
+from ..lib.chatsync import ChatSync
+from ..lib.paging import aitems, aoffsetPages, atokenPages, nextToken, tokenParam
+from ..lib.upload import AUploadManager, InlineBody, MediaStream, isMediaValue
 
 
+@hooks.traceable
 class SLocal(Headers):
-    def __init__(self, comId: str):
+    def __init__(self, comId: str, credentials: Credentials = None):
         self.comId = comId
-        self.uid = headers.userId
+        if credentials is not None: self.credentials = credentials
 
         Headers.__init__(self)
 
-        self.session = aiohttp.ClientSession()
+        self.session = SSession(credentials=self.credentials)
         self.headers = self.app_headers
         self.web_headers = self.web_headers
+        self.uploads = AUploadManager(self.upload_media)
 
     async def __aenter__(self) -> "SLocal":
         return self
@@ -54,75 +66,101 @@ class SLocal(Headers):
     async def join_chat(self, chatId: str = None):
         async with self.session.post(api(f"/x{self.comId}/s/chat/thread/{chatId}/member/{self.uid}"), headers=self.headers) as req:
             if req.status != 200: return CheckExceptions(await req.json())
-            else: return Json((await req.json()))
+            metadata.invalidate_thread(self.comId, chatId)
+            return Json((await req.json()))
 
-    async def upload_media(self, file: BinaryIO, fileType: str):
+    async def upload_media(self, file: Union[BinaryIO, str, bytes], fileType: str):
         if fileType == "audio": type = "audio/aac"
         elif fileType == "image": type = "image/jpg"
         else: raise TypeError("Wrong fileType")
 
-        data = file.read()
-        self.headers["content-type"] = type
-        self.headers["content-length"] = str(len(data))
+        async def upload():
+            # a copy, the shared headers must not keep this content-length (uploads run concurrently, see uploads)
+            headers = {**self.headers, "content-type": type, "content-length": str(len(data))}
 
-        async with self.session.post(api("/g/s/media/upload"), data=data, headers=self.headers) as req:
-            if req.status != 200: return CheckExceptions(await req.json())
-            else: return (await req.json())["mediaValue"]
+            async with self.session.post(api("/g/s/media/upload"), data=data, headers=headers) as req:
+                if req.status != 200: return CheckExceptions(await req.json())
+                else: return (await req.json())["mediaValue"]
+
+        with MediaStream.of(file) as data:
+            return await media.aupload(data, f"upload:{type}", upload)
+
+    async def upload_medias(self, files: list, fileType: str = "image", progress: Callable[[int, int], None] = None):
+        """Uploads `files` at the same time through `self.uploads` (see AUploadManager), returns their mediaValues in order."""
+        return await self.uploads.upload_all(files, fileType, progress=progress)
+
+    async def media_list(self, media: Union[list, str, BinaryIO]):
+        """mediaList of a blog from mediaValues and files, the files uploaded at the same time."""
+        media = media if isinstance(media, list) else [media]
+        values = [value if isMediaValue(value) else self.uploads.submit(value, "image") for value in media]
+        return [[100, value if isinstance(value, str) else await value, None, "XYZ", None, {"fileName": "Amino"}]
+                for value in values]
 
     async def leave_chat(self, chatId: str = None):
         async with self.session.delete(api(f"/x{self.comId}/s/chat/thread/{chatId}/member/{self.uid}"), headers=self.headers) as req:
             if req.status != 200: return CheckExceptions(await req.json())
-            else: return Json((await req.json()))
+            metadata.invalidate_thread(self.comId, chatId)
+            return Json((await req.json()))
 
     async def get_member_following(self, userId: str = None, start: int = 0, size: int = 25):
         async with self.session.get(api(f"/x{self.comId}/s/user-profile/{userId}/joined?start={start}&size={size}"), headers=self.headers) as req:
             if req.status != 200: return CheckExceptions(await req.json())
-            else: return UserProfileList((await req.json())["userProfileList"]).UserProfileList
+            else: return UserProfileList(profiles.listed(self.comId, (await req.json())["userProfileList"])).UserProfileList
 
     async def get_member_followers(self, userId: str = None, start: int = 0, size: int = 25):
         async with self.session.get(api(f"/x{self.comId}/s/user-profile/{userId}/member?start={start}&size={size}"), headers = self.headers) as req:
             if req.status != 200: return CheckExceptions(await req.json())
-            else: return UserProfileList((await req.json())["userProfileList"]).UserProfileList
+            else: return UserProfileList(profiles.listed(self.comId, (await req.json())["userProfileList"])).UserProfileList
 
-    async def get_chat_threads(self, start: int = 0, size: int = 25):
-        async with self.session.get(api(f"/x{self.comId}/s/chat/thread?type=joined-me&start={start}&size={size}"), headers=self.headers) as req:
-            if req.status != 200: return CheckExceptions(await req.json())
-            else: return ThreadList((await req.json())["threadList"]).ThreadList
+    async def get_chat_threads(self, start: int = 0, size: int = 25, cached: bool = True):
+        async def request():
+            async with self.session.get(api(f"/x{self.comId}/s/chat/thread?type=joined-me&start={start}&size={size}"), headers=self.headers) as req:
+                if req.status != 200: return CheckExceptions(await req.json())
+                else: return (await req.json())["threadList"]
+
+        return await metadata.aget(metadata.threadsKey(self.comId, start, size, self.uid), request, lambda x: ThreadList(x).ThreadList, cached)
 
     async def get_member_visitors(self, userId: str, start: int = 0, size: int = 25):
         async with self.session.get(api(f"/x{self.comId}/s/user-profile/{userId}/visitors?start={start}&size={size}"), headers=self.headers) as req:
             if req.status != 200: return CheckExceptions(await req.json())
             return VisitorsList((await req.json())["visitors"]).VisitorsList
 
-    async def get_chat_messages(self, chatId: str, size: int = 25):
-        async with self.session.get(api(f"/x{self.comId}/s/chat/thread/{chatId}/message?v=2&pagingType=t&size={size}"), headers=self.headers) as req:
+    async def get_chat_messages(self, chatId: str, size: int = 25, pageToken: str = None):
+        async with self.session.get(api(f"/x{self.comId}/s/chat/thread/{chatId}/message?v=2&pagingType=t&size={size}{tokenParam(pageToken)}"), headers=self.headers) as req:
             if req.status != 200: return CheckExceptions(await req.json())
-            return MessageList((await req.json())["messageList"]).MessageList
+            return GetMessages(await req.json()).GetMessages
 
-    async def get_user_info(self, userId: str):
+    async def get_user_info(self, userId: str, cached: bool = True):
+        if cached and profiles.enabled:
+            profile = profiles.get(self.comId, userId)
+            if profile: return profile
         async with self.session.get(api(f"/x{self.comId}/s/user-profile/{userId}"), headers=self.headers) as req:
             if req.status != 200: return CheckExceptions(await req.json())
+            if profiles.enabled: return profiles.put(self.comId, (await req.json())["userProfile"])
             return UserProfile((await req.json())["userProfile"]).UserProfile
 
     async def get_all_users(self, type: str = "recent", start: int = 0, size: int = 25):
         async with self.session.get(api(f"/x{self.comId}/s/user-profile?type={type}&start={start}&size={size}"), headers=self.headers) as req:
             if req.status != 200: return CheckExceptions(await req.json())
-            return UserProfileList((await req.json())["userProfileList"]).UserProfileList
+            return UserProfileList(profiles.listed(self.comId, (await req.json())["userProfileList"])).UserProfileList
 
     async def get_chat_members(self, start: int = 0, size: int = 25, chatId: str = None):
         async with self.session.get(api(f"/x{self.comId}/s/chat/thread/{chatId}/member?start={start}&size={size}&type=async default&cv=1.2"), headers=self.headers) as req:
             if req.status != 200: return CheckExceptions(await req.json())
-            return UserProfileList((await req.json())["memberList"]).UserProfileList
+            return UserProfileList(profiles.listed(self.comId, (await req.json())["memberList"])).UserProfileList
 
-    async def get_chat_info(self, chatId: str):
-        async with self.session.get(api(f"/x{self.comId}/s/chat/thread/{chatId}"), headers=self.headers) as req:
-            if req.status != 200: return CheckExceptions(await req.json())
-            return Thread((await req.json())["thread"]).Thread
+    async def get_chat_info(self, chatId: str, cached: bool = True):
+        async def request():
+            async with self.session.get(api(f"/x{self.comId}/s/chat/thread/{chatId}"), headers=self.headers) as req:
+                if req.status != 200: return CheckExceptions(await req.json())
+                return (await req.json())["thread"]
+
+        return await metadata.aget(metadata.threadKey(self.comId, chatId, self.uid), request, lambda x: Thread(x).Thread, cached)
 
     async def get_online_users(self, start: int = 0, size: int = 25):
         async with self.session.get(api(f"/x{self.comId}/s/live-layer?topic=ndtopic:x{self.comId}:online-members&start={start}&size={size}"), headers=self.headers) as req:
             if req.status != 200: return CheckExceptions(await req.json())
-            return UserProfileList((await req.json())["userProfileList"]).UserProfileList
+            return UserProfileList(profiles.listed(self.comId, (await req.json())["userProfileList"])).UserProfileList
 
     async def get_public_chats(self, type: str = "recommended", start: int = 0, size: int = 50):
         async with self.session.get(api(f"/x{self.comId}/s/chat/thread?type=public-all&filterType={type}&start={start}&size={size}"), headers=self.headers) as req:
@@ -131,9 +169,9 @@ class SLocal(Headers):
 
     async def send_message(self, chatId: str, message: str = None, messageType: int = 0, file: BinaryIO = None,
                      fileType: str = None, replyTo: str = None, mentionUserIds: Union[list, str] = None, stickerId: str = None,
-                     snippetLink: str = None, ytVideo: str = None, snippetImage: BinaryIO = None, embedId: str = None,
+                     snippetLink: str = None, ytVideo: str = None, snippetImage: Union[str, BinaryIO] = None, embedId: str = None,
                      embedType: int = None, embedLink: str = None, embedTitle: str = None, embedContent: str = None,
-                     embedImage: BinaryIO = None):
+                     embedImage: Union[str, BinaryIO] = None):
 
         if message is not None and file is None: message = message.replace("[@", "‎‏").replace("@]", "‬‭")
 
@@ -143,9 +181,14 @@ class SLocal(Headers):
                 for mention_uid in mentionUserIds: mentions.append({"uid": mention_uid})
             mentions.append({"uid": mentionUserIds})
 
+        # the embed and snippet images upload at the same time through self.uploads
+        if embedImage and not isMediaValue(embedImage):
+            embedImage = self.uploads.submit(embedImage, "image")
+        if snippetLink and snippetImage and not isMediaValue(snippetImage):
+            snippetImage = self.uploads.submit(snippetImage, "image")
+
         if embedImage:
-            if type(embedImage) is not str: embedImage = [[100, self.upload_image(embedImage, "image"), None]]
-            embedImage = [[100, embedImage, None]]
+            embedImage = [[100, embedImage if isinstance(embedImage, str) else await embedImage, None]]
 
 
         data = {
@@ -176,8 +219,7 @@ class SLocal(Headers):
             data["extensions"]["linkSnippetList"] = [{
                 "link": snippetLink,
                 "mediaType": 100,
-                "mediaUploadValue": base64.b64encode(snippetImage.read()).decode(),
-                "mediaUploadValueContentType": "image/png"
+                "mediaValue": snippetImage if isinstance(snippetImage, str) else await snippetImage
             }]
 
         if ytVideo:
@@ -204,13 +246,23 @@ class SLocal(Headers):
 
             else: raise TypeError(fileType)
 
-            data["mediaUploadValue"] = base64.b64encode(file.read()).decode()
             data["attachedObject"] = None
             data["extensions"] = None
-
-        data = json.dumps(data)
-        async with self.session.post(api(f"/x{self.comId}/s/chat/thread/{chatId}/message"), headers=self.updateHeaders(data=data), data=data) as req:
+            with MediaStream(file) as raw:
+                digest = media.digest(raw) if media.enabled else None
+                known = media.get(digest, f"message:{fileType}") if digest else None
+                if known: data["mediaValue"] = known  # uploaded before, no need to inline it again
+                else: data = InlineBody(data, "mediaUploadValue", raw)  # encoded and signed in place, see lib.upload
+
+        if isinstance(data, InlineBody):
+            headers = {**self.updateHeaders(data=data, signature=data.signature), "content-length": str(len(data))}
+        else:
+            data = json.dumps(data)
+            headers = self.updateHeaders(data=data)
+        async with self.session.post(api(f"/x{self.comId}/s/chat/thread/{chatId}/message"), headers=headers, data=data) as req:
             if req.status != 200: return CheckExceptions(await req.json())
+            if file and digest and not known:
+                media.put(digest, f"message:{fileType}", (await req.json())["message"].get("mediaValue"), len(raw))
             return Json((await req.json()))
 
     async def send_web_message(self, chatId: str, message: str = None, messageType: int = 0, icon: str = None, comId: str = None):
@@ -302,7 +354,8 @@ class SLocal(Headers):
         data = json.dumps(data)
         async with self.session.post(api(f"/x{self.comId}/s/user-profile/{self.uid}"), headers=self.updateHeaders(data=data), data=data) as req:
             if req.status != 200: return CheckExceptions(await req.json())
-            else: return Json(await req.json())
+            profiles.invalidate(self.comId, self.uid)
+            return Json(await req.json())
 
     async def edit_chat(self, chatId: str, title: str = None, content: str = None, icon: str = None, background: str = None, keywords: list = None, announcement: str = None, pinAnnouncement: bool = None):
         res, data = [], {"timestamp": int(timestamp() * 1000)}
@@ -323,6 +376,7 @@ class SLocal(Headers):
         async with self.session.post(api(f"/x{self.comId}/s/chat/thread/{chatId}"), data=data, headers=self.updateHeaders(data=data), ) as req:
             if req.status != 200: return CheckExceptions(await req.json())
             res.append(Json(await req.json()))
+            metadata.invalidate_thread(self.comId, chatId)
             return res
 
     async def chat_settings(self, chatId: str, viewOnly: bool = False, doNotDisturb: bool = True, canInvite: bool = False, canTip: bool = None, pin: bool = None, coHosts: Union[str, list] = None):
@@ -710,7 +764,7 @@ class SLocal(Headers):
             if req.status != 200: return CheckExceptions(await req.json())
             return Json(await req.json())
 
-    async def post_blog(self, title: str, content: str, fansOnly: bool = False):
+    async def post_blog(self, title: str, content: str, fansOnly: bool = False, media: Union[list, str, BinaryIO] = None):
         data = {
             "extensions": {"fansOnly": fansOnly},
             "content": content,
@@ -722,6 +776,7 @@ class SLocal(Headers):
             "eventSource": "GlobalComposeMenu",
             "timestamp": int(timestamp() * 1000)
         }
+        if media: data["mediaList"] = await self.media_list(media)
         data = json.dumps(data)
 
         async with self.session.post(api(f"/x{self.comId}/s/blog"), headers=self.updateHeaders(data=data), data=data) as req:
@@ -787,14 +842,14 @@ class SLocal(Headers):
             if req.status != 200: return CheckExceptions(await req.json())
             else: return Json(await req.json())
 
-    async def edit_blog(self, title: str, content: str, blogId: str = None, wikiId: str = None, fansOnly: bool = False, backgroundColor: str = None,media: list = None):
+    async def edit_blog(self, title: str, content: str, blogId: str = None, wikiId: str = None, fansOnly: bool = False, backgroundColor: str = None, media: Union[list, str, BinaryIO] = None):
         data = {
             "title": title,
             "content": content,
             "timestamp": int(timestamp() * 1000)
         }
         
-        if media: data["mediaList"] = [[100, media, None,"XYZ",None,{"fileName": "Amino"}]]
+        if media: data["mediaList"] = await self.media_list(media)
         if fansOnly: data["extensions"]["fansOnly"] = True
         if backgroundColor: data["extensions"] = {"backgroundColor": backgroundColor}
         if blogId: url = api(f"/x{self.comId}/s/blog/{blogId}")
@@ -845,7 +900,7 @@ class SLocal(Headers):
     async def web_active_time(self):
         try:
             data = {"ndcId": self.comId}
-            async with self.session.post("https://aminoapps.com/api/community/stats/web-user-active-time", json=data, headers=self.web_headers) as req:
+            async with self.session.post(webApi("/community/stats/web-user-active-time"), json=data, headers=self.web_headers) as req:
                 try:
                     if (await req.json())["code"] != 200: return CheckExceptions(await req.json())
                     else: Json(await req.json())
@@ -959,7 +1014,7 @@ class SLocal(Headers):
     async def search_user(self, username: str, start: int = 0, size: int = 25):
         async with self.session.get(api(f"/x{self.comId}/s/user-profile?type=name&q={username}&start={start}&size={size}"),headers=self.headers) as req:
             if req.status != 200: return CheckExceptions(await req.json())
-            else: return UserProfileList((await req.json())["userProfileList"]).UserProfileList
+            else: return UserProfileList(profiles.listed(self.comId, (await req.json())["userProfileList"])).UserProfileList
 
     async def search_blog(self, words: str, start: int = 0, size: int = 25):
         async with self.session.get(api(f"/x{self.comId}/s/blog?type=keywords&q={words}&start={start}&size={size}"),headers=self.headers) as req:
@@ -1042,4 +1097,135 @@ class SLocal(Headers):
         data["adminOpValue"]["featuredType"] = featuredType
         data = json.dumps(data)
         async with self.session.post(api(f"/x{self.comId}/s/{endpoint}/admin"), headers=self.updateHeaders(data=data), data=data) as req:
-            return CheckExceptions(await req.json()) if req.status != 200 else Json(await req.json())
\ No newline at end of file
+            return CheckExceptions(await req.json()) if req.status != 200 else Json(await req.json())
+
+    async def iter_member_following(self, userId: str = None, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        """
+        Streams UserProfile objects page by page, stops on the first short page.
+
+        - limit (int, optional): Stop after this many items. Defaults to all of them.
+
+        - prefetch (int, optional): Keep this many pages in flight at once (threads, or tasks for the async clients),
+          adapting to latency and rate limits. Defaults to 0, one page at a time.
+
+        - checkpoint (Checkpoint, optional): Resume from, and keep saving to, a CheckpointStore entry.
+        """
+        async def fetch(start, size):
+            return (await self.session.getJson(f"/x{self.comId}/s/user-profile/{userId}/joined?start={start}&size={size}", self.headers))["userProfileList"]
+
+        async for item in aitems(aoffsetPages(fetch, start, size, prefetch, checkpoint), lambda x: profiles.build(self.comId, x), limit):
+            yield item
+
+    async def iter_member_followers(self, userId: str = None, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        async def fetch(start, size):
+            return (await self.session.getJson(f"/x{self.comId}/s/user-profile/{userId}/member?start={start}&size={size}", self.headers))["userProfileList"]
+
+        async for item in aitems(aoffsetPages(fetch, start, size, prefetch, checkpoint), lambda x: profiles.build(self.comId, x), limit):
+            yield item
+
+    async def iter_all_users(self, type: str = "recent", start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        async def fetch(start, size):
+            return (await self.session.getJson(f"/x{self.comId}/s/user-profile?type={type}&start={start}&size={size}", self.headers))["userProfileList"]
+
+        async for item in aitems(aoffsetPages(fetch, start, size, prefetch, checkpoint), lambda x: profiles.build(self.comId, x), limit):
+            yield item
+
+    async def iter_online_users(self, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        async def fetch(start, size):
+            return (await self.session.getJson(f"/x{self.comId}/s/live-layer?topic=ndtopic:x{self.comId}:online-members&start={start}&size={size}", self.headers))["userProfileList"]
+
+        async for item in aitems(aoffsetPages(fetch, start, size, prefetch, checkpoint), lambda x: profiles.build(self.comId, x), limit):
+            yield item
+
+    async def iter_chat_members(self, chatId: str, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        async def fetch(start, size):
+            return (await self.session.getJson(f"/x{self.comId}/s/chat/thread/{chatId}/member?start={start}&size={size}&type=default&cv=1.2", self.headers))["memberList"]
+
+        async for item in aitems(aoffsetPages(fetch, start, size, prefetch, checkpoint), lambda x: profiles.build(self.comId, x), limit):
+            yield item
+
+    async def iter_chat_threads(self, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        async def fetch(start, size):
+            return (await self.session.getJson(f"/x{self.comId}/s/chat/thread?type=joined-me&start={start}&size={size}", self.headers))["threadList"]
+
+        async for item in aitems(aoffsetPages(fetch, start, size, prefetch, checkpoint), lambda x: Thread(x).Thread, limit):
+            yield item
+
+    async def iter_user_blogs(self, userId: str, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        async def fetch(start, size):
+            return (await self.session.getJson(f"/x{self.comId}/s/blog?type=user&q={userId}&start={start}&size={size}", self.headers))["blogList"]
+
+        async for item in aitems(aoffsetPages(fetch, start, size, prefetch, checkpoint), lambda x: Blog(x).Blog, limit):
+            yield item
+
+    async def iter_recent_blogs(self, pageToken: str = None, size: int = 25, limit: int = None, checkpoint: Checkpoint = None):
+        async def fetch(pageToken, size):
+            req = await self.session.getJson(f"/x{self.comId}/s/feed/blog-all?pagingType=t&size={size}{tokenParam(pageToken)}", self.headers)
+            return req["blogList"], nextToken(req)
+
+        async for item in aitems(atokenPages(fetch, pageToken, size, checkpoint), lambda x: Blog(x).Blog, limit):
+            yield item
+
+    async def iter_chat_messages(self, chatId: str, pageToken: str = None, size: int = 25, limit: int = None, checkpoint: Checkpoint = None):
+        """Streams Message objects from the newest one backwards by following `nextPageToken`."""
+        async def fetch(pageToken, size):
+            req = await self.session.getJson(f"/x{self.comId}/s/chat/thread/{chatId}/message?v=2&pagingType=t&size={size}{tokenParam(pageToken)}", self.headers)
+            return req["messageList"], nextToken(req)
+
+        async for item in aitems(atokenPages(fetch, pageToken, size, checkpoint), lambda x: Message(x).Message, limit):
+            yield item
+
+    async def iter_notifications(self, pageToken: str = None, size: int = 25, limit: int = None, checkpoint: Checkpoint = None):
+        """Streams raw notification dicts, there is no single notification object."""
+        async def fetch(pageToken, size):
+            req = await self.session.getJson(f"/x{self.comId}/s/notification?pagingType=t&size={size}{tokenParam(pageToken)}", self.headers)
+            return req["notificationList"], nextToken(req)
+
+        async for item in aitems(atokenPages(fetch, pageToken, size, checkpoint), limit=limit):
+            yield item
+
+    async def iter_wall_comments(self, userId: str, sorting: str = 'newest', start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0, checkpoint: Checkpoint = None):
+        """Streams the raw comment dicts of a profile wall."""
+        sorting = sorting.lower()
+        if sorting == 'top': sorting = "vote"
+        if sorting not in ["newest", "oldest", "vote"]: raise TypeError("Please insert a valid sorting")
+
+        async def fetch(start, size):
+            return (await self.session.getJson(f"/x{self.comId}/s/user-profile/{userId}/comment?sort={sorting}&start={start}&size={size}", self.headers))["commentList"]
+
+        async for item in aitems(aoffsetPages(fetch, start, size, prefetch, checkpoint), limit=limit):
+            yield item
+
+    async def iter_blog_comments(self, wikiId: str = None, blogId: str = None, quizId: str = None, sorting: str = 'newest', start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0, checkpoint: Checkpoint = None):
+        """Streams the raw comment dicts of a blog, quiz or wiki."""
+        sorting = sorting.lower()
+        if sorting == 'top': sorting = "vote"
+        if sorting not in ["newest", "oldest", "vote"]: raise TypeError("Please insert a valid sorting")
+
+        if quizId: blogId = quizId
+        if blogId: link = f"/x{self.comId}/s/blog/{blogId}/comment?sort={sorting}"
+        elif wikiId: link = f"/x{self.comId}/s/item/{wikiId}/comment?sort={sorting}"
+        else: raise TypeError("Please choose a wiki or a blog")
+
+        async def fetch(start, size):
+            return (await self.session.getJson(f"{link}&start={start}&size={size}", self.headers))["commentList"]
+
+        async for item in aitems(aoffsetPages(fetch, start, size, prefetch, checkpoint), limit=limit):
+            yield item
+
+    async def sync_chat_messages(self, chatId: str, store: CheckpointStore, size: int = 100):
+        """Incrementally mirrors a chat, see `ChatSync`."""
+        async for message in ChatSync(self, chatId, store, size).arun():
+            yield message
+
+    async def send_messages(self, jobs: list, workers: int = 8, rate: float = None, retries: int = 3,
+                            stopOnError: bool = True):
+        """Sends many messages at once, see `abulkSend`. jobs are (chatId, message) pairs."""
+        return await abulkSend(self.send_message, jobs, workers, rate, retries=retries, stopOnError=stopOnError)
\ No newline at end of file
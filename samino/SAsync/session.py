@@ -0,0 +1,203 @@
+import copy
+from time import perf_counter
+
+import aiohttp
+
+from ..lib.auth import Credentials
+from ..lib.exception import CheckExceptions
+from ..lib.flight import copyError, flights
+from ..lib.hooks import hooks
+from ..lib.metrics import metrics
+from ..lib.util import api
+
+
+class SResponse:
+    """
+    aiohttp response as handed to the SAsync clients while observers or metrics are active.
+    Decodes the body once and reports the request when it is done.
+    """
+
+    def __init__(self, response: aiohttp.ClientResponse, trace, latency: float, bytesOut: int):
+        self.response = response
+        self.trace = trace
+        self.latency = latency
+        self.bytesOut = bytesOut
+        self.data = None
+        self.decoded = False
+        self.reported = False
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    async def json(self, **kwargs):
+        if not self.decoded:
+            self.data = await self.response.json(**kwargs)
+            self.decoded = True
+            if self.trace: self.trace.lap("decode")
+            self.report()
+        return self.data
+
+    def report(self):
+        if self.reported:
+            return
+        self.reported = True
+
+        if metrics.enabled:
+            metrics.record(
+                method=self.response.method,
+                url=str(self.response.url),
+                status=self.response.status,
+                apiStatus=self.data.get("api:statuscode") if isinstance(self.data, dict) else None,
+                latency=self.latency,
+                bytesOut=self.bytesOut,
+                bytesIn=self.response.content_length or 0,
+            )
+        if self.trace:
+            hooks.receive(self.trace, self.response.status, self.data)
+
+
+class SRequest:
+    def __init__(self, ses: "SSession", method: str, url: str, kwargs: dict):
+        self.ses = ses
+        self.method = method
+        self.url = url
+        self.kwargs = kwargs
+        self.response: SResponse = None
+
+    async def __aenter__(self) -> SResponse:
+        trace = hooks.start(self.method, self.url) if hooks.observers else None
+        if trace: hooks.send(trace)
+
+        data = self.kwargs.get("data")
+        started = perf_counter()
+        try:
+            response = await self.ses.session.request(self.method, self.url, **self.kwargs)
+        except Exception as error:
+            if metrics.enabled:
+                metrics.recordError(self.method, self.url, error, perf_counter() - started,
+                                    len(data) if isinstance(data, (str, bytes)) else 0)
+            if trace: hooks.error(trace, error)
+            raise
+        if trace: trace.lap("network")
+
+        self.response = SResponse(response, trace, perf_counter() - started,
+                                  len(data) if isinstance(data, (str, bytes)) else 0)
+        return self.response
+
+    async def __aexit__(self, *args) -> None:
+        self.response.report()
+        self.response.response.release()
+
+
+class SShared:
+    """
+    Buffered response of a coalesced GET, a copy (see `share`) handed to every caller
+    that asked for the same url while it was in flight. The body is decoded once for
+    all of them.
+    """
+
+    def __init__(self, response, data, error: Exception = None):
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self.url = response.url
+        self.method = response.method
+        self.content_length = response.content_length
+        self.data = data
+        self.error = error
+
+    async def json(self, **kwargs):
+        if self.error is not None:
+            raise self.error
+        return self.data
+
+    def release(self):
+        pass
+
+    def share(self) -> "SShared":
+        """The copy handed to one of the callers, with its own body and error to change."""
+        shared = copy.copy(self)
+        shared.data = copy.deepcopy(self.data)
+        if self.error is not None: shared.error = copyError(self.error)
+        return shared
+
+
+class SFlight:
+    def __init__(self, ses: "SSession", url: str, kwargs: dict):
+        self.ses = ses
+        self.url = url
+        # the clients pass their live headers dict, the fetch may only start on a later loop iteration
+        self.kwargs = {**kwargs, "headers": dict(kwargs.get("headers") or {})}
+
+    async def __aenter__(self) -> SShared:
+        auth = (self.kwargs.get("headers") or {}).get("NDCAUTH")
+        return await flights.ado((self.url, auth), self.fetch, SShared.share)
+
+    async def fetch(self) -> SShared:
+        async with self.ses.request("GET", self.url, **self.kwargs) as response:
+            try:
+                return SShared(response, await response.json())
+            except Exception as error:
+                return SShared(response, None, error)
+
+    async def __aexit__(self, *args) -> None:
+        pass
+
+
+class SSession:
+    """
+    Thin wrapper over aiohttp.ClientSession used by SClient, SLocal and SAcm.
+
+    With no observer registered and metrics disabled it hands out aiohttp's
+    own request context managers, otherwise requests go through SRequest so
+    they are traced and measured like the sync Session.
+
+    Identical GETs in flight at the same time are coalesced through SFlight,
+    see `lib.flight`.
+
+    Every request carries the sid of `credentials` as it is when the request is made,
+    whichever headers dict the client passed.
+    """
+
+    def __init__(self, credentials: Credentials = None, **kwargs):
+        self.credentials = credentials
+        self.session = aiohttp.ClientSession(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    def authorize(self, kwargs: dict) -> dict:
+        auth = self.credentials.authHeaders if self.credentials is not None else None
+        if auth:
+            kwargs = {**kwargs, "headers": {**(kwargs.get("headers") or {}), **auth}}
+        return kwargs
+
+    def request(self, method: str, url: str, **kwargs):
+        kwargs = self.authorize(kwargs)
+        if hooks.observers or metrics.enabled:
+            return SRequest(self, method, url, kwargs)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs):
+        if flights.enabled and kwargs.keys() <= {"headers"}:
+            return SFlight(self, url, self.authorize(kwargs))
+        return self.request("GET", url, **kwargs)
+
+    @hooks.wrap
+    async def getJson(self, path: str, headers: dict = None):
+        """
+        The decoded body of a GET of the api `path`, raising the api error of a failed one.
+        Scoped like the client methods, so observers see that error as `on_error`.
+        """
+        async with self.get(api(path), headers=headers) as req:
+            if req.status != 200: return CheckExceptions(await req.json())
+            return await req.json()
+
+    def post(self, url: str, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def delete(self, url: str, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    async def close(self):
+        await self.session.close()
@@ -11,6 +11,9 @@ import ujson as json
 import websockets
 
 from ..lib import *
+from ..lib.cache import metadata, profiles
+from ..lib.recorder import Recorder
+from ..lib.store import MessageStore
 
 
 class Callbacks:
@@ -95,6 +98,8 @@ class Callbacks:
         return await self.notif_methods.get(key, self.default)(data)
 
     async def _resolve_chat_message(self, data):
+        profiles.author(data)
+        metadata.event(data)
         key = f"{data['o']['chatMessage']['type']}:{data['o']['chatMessage'].get('mediaType', 0)}"
         return await self.chat_methods.get(key, self.default)(data)
 
@@ -505,12 +510,14 @@ class Wss(Callbacks, WssClient, Headers):
         WssClient.__init__(self, self)
 
         self.narvi = "https://service.narvii.com/api/v1/"
-        self.socket_url = "wss://ws1.narvii.com"
+        self.socket_url = util.socketUrl
         self.lastMessage = {}
         self.isOpened = False
         self.Trace = Trace
         self.Ran = False
         self.socket: websockets = None
+        self.recorder: Recorder = None
+        self.store: MessageStore = None
 
         self.web_headers = self.web_headers
         self.headers = self.headers
@@ -524,6 +531,8 @@ class Wss(Callbacks, WssClient, Headers):
         await self.socket.send(data)
 
     async def on_message(self, data):
+        if self.recorder: self.recorder.write(data)
+        if self.store: self.store.add_frame(data)
         self.resolve(data)
 
     async def Runner(self):
@@ -556,6 +565,23 @@ class Wss(Callbacks, WssClient, Headers):
         if self.Trace:print("[Starting][Start] Starting Socket")
         threading.Thread(target = asyncio.run, args = (self.Launch(), )).start()
 
+    def start_recording(self, path: str):
+        self.stop_recording()
+        self.recorder = Recorder(path)
+        return self.recorder
+
+    def stop_recording(self):
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+
+    def start_archiving(self, store: MessageStore):
+        self.store = store
+        return store
+
+    def stop_archiving(self):
+        self.store = None
+
     async def close(self):
         if self.Trace:print("[Closing][close] Closing Socket")
 
@@ -577,7 +603,7 @@ class Wss(Callbacks, WssClient, Headers):
         self.headers["content-type"] = typee
         self.headers["content-length"] = str(len(data))
 
-        async with self.ses.post(f"{self.narvi}/g/s/media/upload", data=data, headers=headers) as response:
+        async with self.ses.post(api("/g/s/media/upload"), data=data, headers=headers) as response:
             if await response.json()["api:statuscode"] != 0: return CheckExceptions(await response.json())
             return await response.json()["mediaValue"]
 
@@ -1,13 +1,21 @@
-from httpx import get
+import os
+
+from httpx import HTTPError, get
 
 from .SAsync import *
 from .acm import Acm
 from .client import Client
+from .lib.auth import Credentials
 from .lib.exception import CheckExceptions
 from .local import Local
+from .pool import AccountPool
 
 version = "2.6.2"
-newest = get("https://pypi.org/pypi/samino/json").json()["info"]["version"]
 
-if version != newest:
-    print(f"\033[1;31;33mSAmino New Version!: {newest} (Your Using {version})\033[1;36;33m\nJoin our discord server: \"https://discord.gg/s7qacU5YNX\"\nTtelegram Channel: \"https://t.me/amino_execution\"\033[1;0m")
+# skipped offline: against a mock server (SAMINO_API_URL) or with SAMINO_NO_VERSION_CHECK set
+if not (os.environ.get("SAMINO_API_URL") or os.environ.get("SAMINO_NO_VERSION_CHECK")):
+    try: newest = get("https://pypi.org/pypi/samino/json", timeout=3).json()["info"]["version"]
+    except (HTTPError, ValueError, KeyError): newest = version
+
+    if version != newest:
+        print(f"\033[1;31;33mSAmino New Version!: {newest} (Your Using {version})\033[1;36;33m\nJoin our discord server: \"https://discord.gg/s7qacU5YNX\"\nTtelegram Channel: \"https://t.me/amino_execution\"\033[1;0m")
@@ -1,23 +1,33 @@
 from time import time as timestamp
 
-from typing import BinaryIO
+from typing import BinaryIO, Union
+from .lib.auth import Credentials
+from .lib.cache import profiles
+from .lib.hooks import hooks
+from .lib.media import media
 from .lib.objects import *
+from .lib.checkpoint import Checkpoint
+from .lib.paging import items, offsetPages
+from .lib.proxies import ProxyPool
 from .lib.sessions import Session
+from .lib.upload import MediaStream
 
 
+@hooks.traceable
 class Acm(Session):
-    def __init__(self, comId: str, proxies: dict = None):
+    def __init__(self, comId: str, proxies: Union[dict, ProxyPool] = None, credentials: Credentials = None):
         self.comId = comId
         self.proxies = proxies
 
-        Session.__init__(self, proxies=self.proxies)
+        Session.__init__(self, proxies=self.proxies, credentials=credentials)
 
-    def upload_theme_pack(self, file: BinaryIO):
-        data = file.read()
-        newHeaders = {"content-type": "application/octet-stream", "content-length": str(len(data))}
+    def upload_theme_pack(self, file: Union[BinaryIO, str, bytes]):
+        with MediaStream.of(file) as data:
+            newHeaders = {"content-type": "application/octet-stream", "content-length": str(len(data))}
 
-        req = self.postRequest(f"/x{self.comId}/s/media/upload/target/community-theme-pack", data=data, newHeaders=newHeaders)
-        return req["mediaValue"]
+            return media.upload(data, f"upload:theme-pack:{self.comId}", lambda: self.postRequest(
+                f"/x{self.comId}/s/media/upload/target/community-theme-pack", data=data, newHeaders=newHeaders
+            )["mediaValue"])
 
     def promote(self, userId: str, rank: str):
         rank = rank.lower().replace("agent", "transfer-agent")
@@ -102,7 +112,7 @@ class Acm(Session):
         req = self.getRequest(
             f"/x{self.comId}/s/user-profile?type={usersType}&start={start}&size={size}"
         )
-        return UserProfileList(req["userProfileList"]).UserProfileList
+        return UserProfileList(profiles.listed(self.comId, req["userProfileList"])).UserProfileList
 
     def add_influencer(self, userId: str, monthlyFee: int = 50):
         data = {"monthlyFee": monthlyFee, "timestamp": int(timestamp() * 1000)}
@@ -112,3 +122,20 @@ class Acm(Session):
     def remove_influencer(self, userId: str):
         req = self.deleteRequest(f"/x{self.comId}/s/influencer/{userId}")
         return Json(req)
+
+    def iter_all_members(self, usersType: str, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        """
+        Streams UserProfile objects page by page, stops on the first short page.
+
+        - limit (int, optional): Stop after this many members. Defaults to every member.
+
+        - prefetch (int, optional): Keep this many pages in flight at once (threads, or tasks for the async clients),
+          adapting to latency and rate limits. Defaults to 0, one page at a time.
+
+        - checkpoint (Checkpoint, optional): Resume from, and keep saving to, a CheckpointStore entry.
+        """
+        usersType = usersType.lower()
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/x{self.comId}/s/user-profile?type={usersType}&start={start}&size={size}"
+        )["userProfileList"], start, size, prefetch, checkpoint), lambda x: profiles.build(self.comId, x), limit)
@@ -1,5 +1,6 @@
 import os
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from base64 import b64encode
 from binascii import hexlify
 from time import time as timestamp
@@ -7,30 +8,47 @@ from typing import BinaryIO, Union
 from uuid import UUID
 
 from .lib.objects import *
-from .lib import headers, util
+from .lib.auth import STALE, Credentials, SessionRecord, SessionStore, accountKey
+from .lib.cache import metadata, profiles
+from .lib.hooks import hooks
+from .lib.media import media
+from .lib.devices import devices
+from .lib.checkpoint import Checkpoint, CheckpointStore
+from .lib.bulk import bulkSend
+from .lib.chatsync import ChatSync
+from .lib.links import DEAD, idKey, linkKey, links
+from .lib.proxies import ProxyPool
+from .lib.paging import items, nextToken, offsetPages, tokenPages, tokenParam
 from .lib.sessions import Session
+from .lib.upload import InlineBody, MediaStream
+from .acm import Acm
+from .local import Local
 from .sockets import Wss
 
 
+@hooks.traceable
 class Client(Wss, Session):
     def __init__(
             self,
             deviceId: str = None, 
-            proxies: dict = None, 
+            proxies: Union[dict, ProxyPool] = None, 
             trace: bool = False, 
             http_proxy_port: str = None,
             http_proxy_host: str = None,
             proxy_type: str = None, 
-            http_proxy_auth: tuple = None
+            http_proxy_auth: tuple = None,
+            credentials: Credentials = None
     ):
         """
         Initializes a new client instance.
 
         Parameters:
             
-        - deviceId (str, optional): The device ID for the client.
+        - deviceId (str, optional): The device ID for the client. Without one (or credentials
+          with one) a login switches to the device of the account, see `lib.devices`.
         
-        - proxies (dict, optional): A dictionary containing proxy settings for requests.
+        - proxies (dict or ProxyPool, optional): A dictionary containing proxy settings for requests,
+          or a ProxyPool giving this account one of its proxies for requests and WSS alike.
         
         - trace (bool, optional): Indicates whether tracing should be enabled. Defaults to False.
         
@@ -41,11 +59,17 @@ class Client(Wss, Session):
         - proxy_type (str, optional): The type of proxy being used for the WSS. 
         
         - http_proxy_auth (tuple, optional): A tuple containing the username and password for WSS proxy authentication.
+
+        - credentials (Credentials, optional): The account this client acts as, shared with the
+          Local and Acm objects given the same. Defaults to the process wide account.
         """
         self.trace = trace
         self.proxies = proxies
-        self.deviceId = deviceId if deviceId else util.generateDevice()
-        headers.staticDevice = self.deviceId
+        if credentials is not None:
+            self.credentials = credentials
+        self.pinnedDevice = bool(deviceId or (credentials and credentials.deviceId))
+        self.deviceId = deviceId or (credentials and credentials.deviceId) or devices.take()
+        self.credentials.deviceId = self.deviceId
 
         Wss.__init__(
             self, self,
@@ -57,6 +81,14 @@ class Client(Wss, Session):
         )
         Session.__init__(self, proxies=self.proxies, staticDevice=self.deviceId)
 
+    def local(self, comId: str, proxies: Union[dict, ProxyPool] = None) -> Local:
+        """A Local of `comId` acting as this client's account."""
+        return Local(comId, proxies=proxies or self.proxies, credentials=self.credentials)
+
+    def acm(self, comId: str, proxies: Union[dict, ProxyPool] = None) -> Acm:
+        """An Acm of `comId` acting as this client's account."""
+        return Acm(comId, proxies=proxies or self.proxies, credentials=self.credentials)
+
     def change_lang(self, lang: str = "ar-SY"):
         self.updateHeaders(lang=lang)
 
@@ -68,17 +100,55 @@ class Client(Wss, Session):
         if socket: self.launch()
         return info
 
+    def resume(self, record: SessionRecord, socket: bool = False):
+        """
+        Comes back as the account of a stored login on the device it was made from,
+        checking the sid with get_account_info. Raises what the api answers for a dead sid.
+        """
+        if record.deviceId:
+            self.deviceId = self.credentials.deviceId = record.deviceId
+            devices.pin(record.account, record.deviceId)
+        self.settings(user_session=record.sid, user_userId=record.uid, user_secret=record.secret)
+        info = self.get_account_info()
+        if socket: self.launch()
+        return info
+
     def login(
             self,
             email: str = None,
             password: str = None,
             secret: str = None,
             socket: bool = False,
-            clientType: int = 100
+            clientType: int = 100,
+            store: SessionStore = None
     ):
+        """
+        Logs in with email and password, or a secret.
 
+        - store (SessionStore, optional): while the sid an earlier login of this account saved
+          there is valid it is reused (see `resume`) and no login is done, otherwise the new
+          session is saved for the next start. The account keeps the device saved with it.
+        """
         if not ((email and password) or secret):
             raise ValueError("Please provide VALID login info")
+
+        account = accountKey(email, secret)
+        if store:
+            record = store.load(account)
+            if record and record.deviceId:
+                # the device the account was first seen on, whatever this client was given
+                self.deviceId = self.credentials.deviceId = record.deviceId
+                devices.pin(account, record.deviceId)
+            if record and record.usable():
+                try:
+                    self.resume(record, socket=socket)
+                    return Login(record.login)
+                except STALE:
+                    store.delete(account)
+        if not self.pinnedDevice:
+            # the account logs in from its own device every time, not from whichever client it is
+            self.deviceId = self.credentials.deviceId = devices.device(account)
+
         data = {
             "email": email if email else "",
             "secret": f"0 {password}" if password else secret,
@@ -95,6 +165,11 @@ class Client(Wss, Session):
             user_session=f'sid={req["sid"]}',
             user_secret=secret if secret else req["secret"],
         )
+        if store:
+            store.save(SessionRecord(
+                account, req["sid"], uid=req["auid"], secret=self.secret, deviceId=self.deviceId,
+                nickname=req.get("account", {}).get("nickname"), aminoId=req.get("account", {}).get("aminoId")
+            ))
         if socket: self.launch()
         return Login(req)
 
@@ -106,7 +181,7 @@ class Client(Wss, Session):
         }
 
         req = self.postRequest("/g/s/auth/logout", data)
-        self.settings()  # Resets the sid and uid and secret to None in sessions.py
+        self.settings()  # clears the sid, uid and secret of the credentials
 
         if self.isOpened: self.close()
         return Json(req)
@@ -121,14 +196,20 @@ class Client(Wss, Session):
         req = self.postRequest("/g/s/device/", data)
         return Json(req)
 
-    def upload_image(self, image: BinaryIO):
-        image.seek(0)
-        newHeaders = {"content-type": "image/jpg", "content-length": str(os.fstat(image.fileno()).st_size)}
-        return self.postRequest("/g/s/media/upload", data=image, newHeaders=newHeaders)["mediaValue"]
-
-    def upload_sticker(self, image: BinaryIO):
-        newHeaders = {"content-type": "video/mp4"}
-        return self.postRequest("/g/s/media/upload/target/sticker", data=image, newHeaders=newHeaders)["mediaValue"]
+    def upload_image(self, image: Union[BinaryIO, str, bytes]):
+        if hasattr(image, "seek"): image.seek(0)
+        with MediaStream.of(image) as data:
+            newHeaders = {"content-type": "image/jpg", "content-length": str(len(data))}
+            return media.upload(data, "upload:image/jpg", lambda: self.postRequest(
+                "/g/s/media/upload", data=data, newHeaders=newHeaders
+            )["mediaValue"])
+
+    def upload_sticker(self, image: Union[BinaryIO, str, bytes]):
+        with MediaStream.of(image) as data:
+            newHeaders = {"content-type": "video/mp4", "content-length": str(len(data))}
+            return media.upload(data, "upload:sticker", lambda: self.postRequest(
+                "/g/s/media/upload/target/sticker", data=data, newHeaders=newHeaders
+            )["mediaValue"])
 
     def send_verify_code(self, email: str, deviceId: str):
         data = {
@@ -197,22 +278,30 @@ class Client(Wss, Session):
         req = self.getRequest(f"/g/s/community/joined?v=1&start={start}&size={size}")
         return CommunityList(req["communityList"]).CommunityList
 
-    def get_chat_threads(self, start: int = 0, size: int = 25):
-        req = self.getRequest(
+    def get_chat_threads(self, start: int = 0, size: int = 25, cached: bool = True):
+        """
+        - cached (bool, optional): answer from the metadata cache when it is enabled, see `lib.cache`.
+        """
+        return metadata.get(metadata.threadsKey(None, start, size, self.uid), lambda: self.getRequest(
             f"/g/s/chat/thread?type=joined-me&start={start}&size={size}"
-        )
-        return ThreadList(req["threadList"]).ThreadList
+        )["threadList"], lambda x: ThreadList(x).ThreadList, cached)
 
-    def get_chat_info(self, chatId: str):
-        req = self.getRequest(f"/g/s/chat/thread/{chatId}")
-        return Thread(req["thread"]).Thread
+    def get_chat_info(self, chatId: str, cached: bool = True):
+        """
+        - cached (bool, optional): answer from the metadata cache when it is enabled, see `lib.cache`.
+        """
+        return metadata.get(metadata.threadKey(None, chatId, self.uid), lambda: self.getRequest(
+            f"/g/s/chat/thread/{chatId}"
+        )["thread"], lambda x: Thread(x).Thread, cached)
 
     def leave_chat(self, chatId: str):
         req = self.deleteRequest(f"/g/s/chat/thread/{chatId}/member/{self.uid}")
+        metadata.invalidate_thread(None, chatId)
         return Json(req)
 
     def join_chat(self, chatId: str):
         req = self.postRequest(f"/g/s/chat/thread/{chatId}/member/{self.uid}")
+        metadata.invalidate_thread(None, chatId)
         return Json(req)
 
     def start_chat(self,
@@ -255,9 +344,28 @@ class Client(Wss, Session):
         req = self.postRequest(f"/g/s/chat/thread", data)
         return Thread(req['thread']).Thread
 
-    def get_from_link(self, link: str):
-        req = self.getRequest(f"/g/s/link-resolution?q={link}")
-        return FromCode(req["linkInfoV2"]["extensions"]).FromCode
+    def get_from_link(self, link: str, cached: bool = True):
+        """
+        - cached (bool, optional): answer from the link cache when it is enabled, see `lib.links`.
+        """
+        return FromCode(links.fetch(
+            linkKey(link), lambda: self.getRequest(f"/g/s/link-resolution?q={link}")["linkInfoV2"]["extensions"], cached
+        )).FromCode
+
+    def get_from_links(self, urls: list, workers: int = 8, cached: bool = True):
+        """
+        Resolves many links at once, `workers` requests at a time. Links already in the
+        link cache cost no request, duplicates are resolved once.
+
+        Returns {link: FromCode}, dead links map to None.
+        """
+        def resolve(link: str):
+            try: return self.get_from_link(link, cached)
+            except DEAD: return None
+
+        urls = list(dict.fromkeys(urls))
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(urls) or 1))) as pool:
+            return dict(zip(urls, pool.map(resolve, urls)))
 
     def edit_profile(
             self,
@@ -293,6 +401,7 @@ class Client(Wss, Session):
             }
 
         req = self.postRequest(f"/g/s/user-profile/{self.uid}", data)
+        profiles.invalidate(None, self.uid)
         return Json(req)
 
     def flag_community(self, comId: str, reason: str, flagType: int):
@@ -382,13 +491,13 @@ class Client(Wss, Session):
         req = self.getRequest(
             f"/g/s/user-profile/{userId}/joined?start={start}&size={size}"
         )
-        return UserProfileList(req["userProfileList"]).UserProfileList
+        return UserProfileList(profiles.listed(None, req["userProfileList"])).UserProfileList
 
     def get_member_followers(self, userId: str, start: int = 0, size: int = 25):
         req = self.getRequest(
             f"/g/s/user-profile/{userId}/member?start={start}&size={size}"
         )
-        return UserProfileList(req["userProfileList"]).UserProfileList
+        return UserProfileList(profiles.listed(None, req["userProfileList"])).UserProfileList
 
     def get_member_visitors(self, userId: str, start: int = 0, size: int = 25):
         req = self.getRequest(
@@ -537,22 +646,31 @@ class Client(Wss, Session):
             else:
                 raise TypeError(fileType)
 
-            data["mediaUploadValue"] = b64encode(file.read()).decode()
             data["attachedObject"] = None
             data["extensions"] = None
+            with MediaStream(file) as raw:
+                digest = media.digest(raw) if media.enabled else None
+                known = media.get(digest, f"message:{fileType}") if digest else None
+                if known: data["mediaValue"] = known  # uploaded before, no need to inline it again
+                else: data = InlineBody(data, "mediaUploadValue", raw)  # encoded and signed in place, see lib.upload
 
         req = self.postRequest(f"/g/s/chat/thread/{chatId}/message", data)
+        if file and digest and not known:
+            media.put(digest, f"message:{fileType}", req["message"].get("mediaValue"), len(raw))
         return Json(req)
 
-    def get_community_info(self, comId: str):
+    def get_community_info(self, comId: str, cached: bool = True):
+        """
+        - cached (bool, optional): answer from the metadata cache when it is enabled, see `lib.cache`.
+        """
         link = (
             f"/g/s-x{comId}/community/info"
             f"?withInfluencerList=1"
             f"&withTopicList=true"
             f"&influencerListOrderStrategy=fansCount"
         )
-        req = self.getRequest(link)
-        return Community(req["community"]).Community
+        return metadata.get(metadata.communityKey(comId), lambda: self.getRequest(link)["community"],
+                            lambda x: Community(x).Community, cached)
 
     def mark_as_read(self, chatId: str):
         req = self.postRequest(f"/g/s/chat/thread/{chatId}/mark-as-read")
@@ -562,11 +680,14 @@ class Client(Wss, Session):
         req = self.deleteRequest(f"/g/s/chat/thread/{chatId}/message/{messageId}")
         return Json(req)
 
-    def get_chat_messages(self, chatId: str, size: int = 25):
+    def get_chat_messages(self, chatId: str, size: int = 25, pageToken: str = None):
+        """
+        - pageToken (str, optional): `nextPageToken` of the previous page, walks the history backwards.
+        """
         req = self.getRequest(
-            f"/g/s/chat/thread/{chatId}/message?v=2&pagingType=t&size={size}"
+            f"/g/s/chat/thread/{chatId}/message?v=2&pagingType=t&size={size}{tokenParam(pageToken)}"
         )
-        return GetMessages(req["messageList"]).GetMessages
+        return GetMessages(req).GetMessages
 
     def get_message_info(self, messageId: str, chatId: str):
         req = self.getRequest(f"/g/s/chat/thread/{chatId}/message/{messageId}")
@@ -629,8 +750,15 @@ class Client(Wss, Session):
         req = self.postRequest("/g/s/auth/change-password", data)
         return Json(req)
 
-    def get_user_info(self, userId: str):
+    def get_user_info(self, userId: str, cached: bool = True):
+        """
+        - cached (bool, optional): answer from the profile cache when it is enabled, see `lib.cache`.
+        """
+        if cached and profiles.enabled:
+            profile = profiles.get(None, userId)
+            if profile: return profile
         req = self.getRequest(f"/g/s/user-profile/{userId}")
+        if profiles.enabled: return profiles.put(None, req["userProfile"])
         return UserProfile(req["userProfile"]).UserProfile
 
     def comment(self, comment: str, userId: str = None, replyTo: str = None):
@@ -754,17 +882,17 @@ class Client(Wss, Session):
         req = self.getRequest(
             f"/g/s/user-profile?type={usersType}&start={start}&size={size}"
         )
-        return UserProfileList(req["userProfileList"]).UserProfileList
+        return UserProfileList(profiles.listed(None, req["userProfileList"])).UserProfileList
 
     def get_chat_members(self, start: int = 0, size: int = 25, chatId: str = None):
         req = self.getRequest(
             f"/g/s/chat/thread/{chatId}/member?start={start}&size={size}&type=default&cv=1.2"
         )
-        return UserProfileList(req["memberList"]).UserProfileList
+        return UserProfileList(profiles.listed(None, req["memberList"])).UserProfileList
 
     def get_from_id(
-            self, objectId: str, comId: str = None, objectType: int = 2
-    ):  # never tried
+            self, objectId: str, comId: str = None, objectType: int = 2, cached: bool = True
+    ):
         data = {
             "objectId": objectId,
             "targetCode": 1,
@@ -777,8 +905,9 @@ class Client(Wss, Session):
         if comId:
             link = f"/g/s-x{comId}/link-resolution"
 
-        req = self.postRequest(link, data)
-        return FromCode(req["linkInfoV2"]["extensions"]["linkInfo"]).FromCode
+        return FromCode(links.fetch(
+            idKey(objectId, comId, objectType), lambda: self.postRequest(link, data)["linkInfoV2"]["extensions"], cached
+        )).FromCode
 
     def edit_chat(self, chatId: str, doNotDisturb: bool = None, pinChat: bool = None, title: str = None,
                   icon: str = None, backgroundImage: str = None, content: str = None, announcement: str = None,
@@ -838,6 +967,7 @@ class Client(Wss, Session):
 
         response = self.postRequest(f"/g/s/chat/thread/{chatId}", data=data)
         res.append(Json(response))
+        metadata.invalidate_thread(None, chatId)
         return res
 
     def like_comment(self, commentId: str, userId: str = None, blogId: str = None):
@@ -944,3 +1074,124 @@ class Client(Wss, Session):
             f"/x{comId}/s/chat/thread/{chatId}/vvchat-presenter/invite", data=data
         )
         return Json(req)
+
+    def iter_my_communities(self, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        """
+        Streams Community objects page by page, stops on the first short page.
+
+        - limit (int, optional): Stop after this many communities. Defaults to all of them.
+
+        - prefetch (int, optional): Keep this many pages in flight at once (threads, or tasks for the async clients),
+          adapting to latency and rate limits. Defaults to 0, one page at a time.
+
+        - checkpoint (Checkpoint, optional): Resume from, and keep saving to, a CheckpointStore entry.
+        """
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/g/s/community/joined?v=1&start={start}&size={size}"
+        )["communityList"], start, size, prefetch, checkpoint), lambda x: Community(x).Community, limit)
+
+    def iter_chat_threads(self, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/g/s/chat/thread?type=joined-me&start={start}&size={size}"
+        )["threadList"], start, size, prefetch, checkpoint), lambda x: Thread(x).Thread, limit)
+
+    def iter_public_chats(self, filterType: str = "recommended", start: int = 0, size: int = 50, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/g/s/chat/thread?type=public-all&filterType={filterType}&start={start}&size={size}"
+        )["threadList"], start, size, prefetch, checkpoint), lambda x: Thread(x).Thread, limit)
+
+    def iter_member_following(self, userId: str, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/g/s/user-profile/{userId}/joined?start={start}&size={size}"
+        )["userProfileList"], start, size, prefetch, checkpoint), lambda x: profiles.build(None, x), limit)
+
+    def iter_member_followers(self, userId: str, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/g/s/user-profile/{userId}/member?start={start}&size={size}"
+        )["userProfileList"], start, size, prefetch, checkpoint), lambda x: profiles.build(None, x), limit)
+
+    def iter_all_users(self, usersType: str = "recent", start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/g/s/user-profile?type={usersType}&start={start}&size={size}"
+        )["userProfileList"], start, size, prefetch, checkpoint), lambda x: profiles.build(None, x), limit)
+
+    def iter_chat_members(self, chatId: str, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/g/s/chat/thread/{chatId}/member?start={start}&size={size}&type=default&cv=1.2"
+        )["memberList"], start, size, prefetch, checkpoint), lambda x: profiles.build(None, x), limit)
+
+    def iter_chat_messages(self, chatId: str, pageToken: str = None, size: int = 25, limit: int = None, checkpoint: Checkpoint = None):
+        """
+        Streams Message objects from the newest one backwards by following `nextPageToken`.
+
+        - pageToken (str, optional): Resume from a token handed out by a previous listing.
+        """
+        def fetch(pageToken, size):
+            req = self.getRequest(f"/g/s/chat/thread/{chatId}/message?v=2&pagingType=t&size={size}{tokenParam(pageToken)}")
+            return req["messageList"], nextToken(req)
+
+        yield from items(tokenPages(fetch, pageToken, size, checkpoint), lambda x: Message(x).Message, limit)
+
+    def iter_notifications(self, pageToken: str = None, size: int = 25, limit: int = None, checkpoint: Checkpoint = None):
+        """Streams raw notification dicts, there is no single notification object."""
+        def fetch(pageToken, size):
+            req = self.getRequest(f"/g/s/notification?pagingType=t&size={size}{tokenParam(pageToken)}")
+            return req["notificationList"], nextToken(req)
+
+        yield from items(tokenPages(fetch, pageToken, size, checkpoint), limit=limit)
+
+    def iter_wall_comments(self, userId: str, sorting: str = "newest", start: int = 0, size: int = 25, limit: int = None,
+            prefetch: int = 0, checkpoint: Checkpoint = None):
+        """Streams the raw comment dicts of a global profile wall."""
+        sorting = sorting.lower().replace("top", "vote")
+        if sorting not in ["newest", "oldest", "vote"]:
+            raise TypeError("Please insert a valid sorting")
+
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/g/s/user-profile/{userId}/g-comment?sort={sorting}&start={start}&size={size}"
+        )["commentList"], start, size, prefetch, checkpoint), limit=limit)
+
+    def iter_blog_comments(self, wikiId: str = None, blogId: str = None, sorting: str = "newest", start: int = 0,
+            size: int = 25, limit: int = None, prefetch: int = 0, checkpoint: Checkpoint = None):
+        """Streams the raw comment dicts of a global blog or wiki."""
+        sorting = sorting.lower().replace("top", "vote")
+        if sorting not in ["newest", "oldest", "vote"]:
+            raise TypeError("Please insert a valid sorting")
+
+        if blogId:
+            link = f"/g/s/blog/{blogId}/comment?sort={sorting}"
+        elif wikiId:
+            link = f"/g/s/item/{wikiId}/comment?sort={sorting}"
+        else:
+            raise TypeError("Please choose a wiki or a blog")
+
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"{link}&start={start}&size={size}"
+        )["commentList"], start, size, prefetch, checkpoint), limit=limit)
+
+    def sync_chat_messages(self, chatId: str, store: CheckpointStore, size: int = 100):
+        """
+        Incrementally mirrors a chat, see `ChatSync`. The first call walks the whole history,
+        later calls only yield messages newer than the ones already synced.
+        """
+        yield from ChatSync(self, chatId, store, size).run()
+
+    def send_messages(self, jobs: list, workers: int = 8, rate: float = None, retries: int = 3,
+                      stopOnError: bool = True):
+        """
+        Sends many messages at once, see `bulkSend`.
+
+        - jobs (list): (chatId, message) pairs, message being the text or a dict of `send_message` arguments.
+        - workers (int, optional): how many chats are sent to at the same time.
+        - rate (float, optional): messages per second across all chats.
+
+        Returns a SendResult per job, in order, with `.result` or `.error`.
+        """
+        return bulkSend(self.send_message, jobs, workers, rate, retries=retries, stopOnError=stopOnError)
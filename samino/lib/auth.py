@@ -0,0 +1,292 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from hashlib import sha256
+from typing import Dict, Optional
+
+import ujson as json
+
+from .exception import AccountDisabled, InvalidSession, YouAreBanned
+from .util import sidPayload
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # optional, only needed for encrypted stores (pip install samino[crypto])
+    Fernet = InvalidToken = None
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, FileSessionStore is then safe for one process only
+    fcntl = None
+
+# how long a sid is trusted after it was issued, the server does not say
+SID_LIFETIME = 24 * 3600
+# a stored sid closer than this to its expiry is refreshed instead of reused
+REFRESH_MARGIN = 3600
+
+# a stored sid failing with these is dropped and a real login is done
+STALE = (InvalidSession, AccountDisabled, YouAreBanned)
+# records another key (or nothing) can read, as good as no session
+UNREADABLE = (ValueError, TypeError) + ((InvalidToken,) if InvalidToken else ())
+
+
+class Credentials:
+    """
+    The account a client acts as: its sid, uid, secret and device. Client, Local and Acm
+    objects (and their SAsync versions) given the same Credentials are the same account,
+    a login through one of them is seen by all.
+
+        account = Credentials()
+        client = Client(credentials=account)
+        client.login(email, password)
+        local = client.local(comId)  # Local(comId, credentials=account)
+
+    Objects created without one share `defaultCredentials`, one account per process as
+    samino always worked.
+    """
+
+    def __init__(self, sid: str = None, uid: str = None, secret: str = None, deviceId: str = None):
+        self.lock = threading.Lock()
+        self.sid = sid
+        self.uid = uid
+        self.secret = secret
+        self.deviceId = deviceId
+        self.auth = (None, {})
+
+    def update(self, sid: str = None, uid: str = None, secret: str = None):
+        """Replaces the session, None clearing a field."""
+        with self.lock:
+            self.sid = sid if not sid or sid.startswith("sid=") else f"sid={sid}"
+            self.uid = uid
+            self.secret = secret
+
+    def clear(self):
+        self.update()
+
+    @property
+    def authHeaders(self) -> dict:
+        """NDCAUTH and AUID of the current sid, decoded once per sid."""
+        sid = self.sid
+        decoded, headers = self.auth
+        if sid != decoded:
+            headers = {"NDCAUTH": sid, "AUID": self._auid(sid)} if sid else {}
+            self.auth = (sid, headers)
+        return headers
+
+    def _auid(self, sid: str) -> str:
+        try:
+            return sidPayload(sid)["2"]
+        except (ValueError, KeyError, TypeError):
+            return self.uid
+
+    def __repr__(self):
+        return f"Credentials(uid={self.uid!r}, deviceId={self.deviceId!r}, loggedIn={bool(self.sid)})"
+
+
+defaultCredentials = Credentials()
+
+
+def accountKey(email: str = None, secret: str = None) -> str:
+    """Store key of an account: its email, or a hash of the secret it logs in with."""
+    return email.lower() if email else "secret:" + sha256(secret.encode()).hexdigest()[:32]
+
+
+class SessionRecord:
+    """What a login produced, enough to come back as the same account on the same device."""
+
+    def __init__(self, account: str, sid: str, uid: str = None, secret: str = None, deviceId: str = None,
+                 expires: float = None, nickname: str = None, aminoId: str = None, updated: float = None):
+        self.account = account
+        self.sid = sid if sid.startswith("sid=") else f"sid={sid}"
+        self.uid = uid
+        self.secret = secret
+        self.deviceId = deviceId
+        self.expires = expires if expires is not None else sidExpiry(self.sid)
+        self.nickname = nickname
+        self.aminoId = aminoId
+        self.updated = updated if updated is not None else time.time()
+
+    def usable(self, margin: float = REFRESH_MARGIN) -> bool:
+        return self.expires is not None and time.time() < self.expires - margin
+
+    @property
+    def login(self) -> dict:
+        """The record as a `/g/s/auth/login` response, for `Login`."""
+        return {
+            "sid": self.sid.replace("sid=", ""),
+            "auid": self.uid,
+            "secret": self.secret,
+            "account": {"uid": self.uid, "nickname": self.nickname, "aminoId": self.aminoId},
+        }
+
+    @property
+    def json(self):
+        return {
+            "account": self.account,
+            "sid": self.sid,
+            "uid": self.uid,
+            "secret": self.secret,
+            "deviceId": self.deviceId,
+            "expires": self.expires,
+            "nickname": self.nickname,
+            "aminoId": self.aminoId,
+            "updated": self.updated,
+        }
+
+
+def sidExpiry(sid: str, lifetime: float = SID_LIFETIME) -> Optional[float]:
+    try:
+        issued = sidPayload(sid).get("5")
+    except (ValueError, TypeError):
+        return None
+    return issued + lifetime if issued else None
+
+
+def private(path: str, flags: int) -> int:
+    """`os.open` of a file that, when it has to be created, only its owner can read and write."""
+    return os.open(path, flags, 0o600)
+
+
+class SessionStore:
+    """
+    Where `Client.login(store=...)` keeps sessions between runs, one SessionRecord per
+    account. A restarted worker finds its sid here and reuses it instead of logging in.
+
+        store = FileSessionStore("sessions.json", key=key)
+        client.login(email, password, store=store)
+
+    This base class keeps them in memory, FileSessionStore and SQLiteSessionStore on
+    disk. With a `key` (a Fernet key, see `generateKey`) every record is encrypted at
+    rest, which needs the `cryptography` package. The disk stores refuse to write sids
+    and secrets in clear unless given `plaintext=True`, and create their files readable
+    by their owner only.
+    """
+
+    # whether records are on disk, and so need a key or an explicit plaintext=True
+    persistent = False
+
+    def __init__(self, key: bytes = None, plaintext: bool = False):
+        if key and Fernet is None:
+            raise ImportError("encrypted session stores need the cryptography package: pip install cryptography")
+        if self.persistent and not key and not plaintext:
+            raise ValueError(f"{type(self).__name__} needs a key (see generateKey) to encrypt the sessions, "
+                             "or plaintext=True to store them in clear")
+        self.cipher = Fernet(key) if key else None
+        self.lock = threading.Lock()
+        self.records: Dict[str, str] = {}
+
+    @staticmethod
+    def generateKey() -> bytes:
+        if Fernet is None:
+            raise ImportError("encrypted session stores need the cryptography package: pip install cryptography")
+        return Fernet.generate_key()
+
+    def encode(self, record: SessionRecord) -> str:
+        text = json.dumps(record.json)
+        return self.cipher.encrypt(text.encode()).decode() if self.cipher else text
+
+    def decode(self, blob: str) -> Optional[SessionRecord]:
+        try:
+            text = self.cipher.decrypt(blob.encode()).decode() if self.cipher else blob
+            return SessionRecord(**json.loads(text))
+        except UNREADABLE:
+            return None
+
+    def load(self, account: str) -> Optional[SessionRecord]:
+        with self.lock:
+            blob = self._read(account)
+        return self.decode(blob) if blob else None
+
+    def save(self, record: SessionRecord):
+        with self.lock:
+            self._write(record.account, self.encode(record))
+
+    def delete(self, account: str):
+        with self.lock:
+            self._write(account, None)
+
+    def _read(self, account: str) -> Optional[str]:
+        return self.records.get(account)
+
+    def _write(self, account: str, blob: Optional[str]):
+        if blob is None: self.records.pop(account, None)
+        else: self.records[account] = blob
+
+
+class FileSessionStore(SessionStore):
+    """
+    Sessions in one json file, read again on every lookup and rewritten atomically on
+    every change, so processes sharing it see each other's logins. Changes hold an
+    exclusive lock on `<path>.lock` for the whole read-modify-write, so processes
+    saving at once (a fleet restarting) do not drop each other's records.
+
+    Without `fcntl` (Windows) there is no lock between processes, use
+    SQLiteSessionStore to share sessions there.
+    """
+
+    persistent = True
+
+    def __init__(self, path: str, key: bytes = None, plaintext: bool = False):
+        SessionStore.__init__(self, key, plaintext)
+        self.path = path
+
+    @contextmanager
+    def _locked(self):
+        if fcntl is None:
+            yield
+            return
+        with open(private(f"{self.path}.lock", os.O_RDWR | os.O_CREAT)) as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self):
+        try:
+            with open(self.path) as file:
+                self.records = json.load(file)
+        except (OSError, ValueError):
+            self.records = {}
+
+    def _read(self, account: str) -> Optional[str]:
+        self._load()
+        return SessionStore._read(self, account)
+
+    def _write(self, account: str, blob: Optional[str]):
+        with self._locked():
+            self._load()
+            SessionStore._write(self, account, blob)
+            temp = f"{self.path}.{os.getpid()}.tmp"
+            with open(private(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC), "w") as file:
+                json.dump(self.records, file)
+            os.replace(temp, self.path)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a SQLite file, several worker processes can share it."""
+
+    persistent = True
+
+    def __init__(self, path: str, key: bytes = None, plaintext: bool = False):
+        SessionStore.__init__(self, key, plaintext)
+        os.close(private(path, os.O_RDWR | os.O_CREAT))  # sqlite gives its -wal and -shm files the same mode
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS sessions (account TEXT PRIMARY KEY, record TEXT NOT NULL, updated REAL)")
+
+    def _read(self, account: str) -> Optional[str]:
+        row = self.db.execute("SELECT record FROM sessions WHERE account = ?", (account,)).fetchone()
+        return row[0] if row else None
+
+    def _write(self, account: str, blob: Optional[str]):
+        if blob is None:
+            self.db.execute("DELETE FROM sessions WHERE account = ?", (account,))
+        else:
+            self.db.execute("INSERT OR REPLACE INTO sessions (account, record, updated) VALUES (?, ?, ?)",
+                            (account, blob, time.time()))
+
+    def close(self):
+        self.db.close()
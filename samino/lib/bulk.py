@@ -0,0 +1,152 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, sleep
+from typing import Callable, Iterable, List, Tuple, Union
+
+from .hooks import hooks
+from .paging import THROTTLED, backoff
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every worker of a bulk job: `rate` requests per second on
+    average, bursts of up to `burst` requests.
+    """
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.tokens = float(self.burst)
+        self.stamp = monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Takes a token, returns how long to wait before using it."""
+        with self.lock:
+            now = monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait: sleep(wait)
+
+    async def aacquire(self):
+        wait = self._reserve()
+        if wait: await asyncio.sleep(wait)
+
+
+class SendResult:
+    def __init__(self, index: int, chatId: str, spec, result=None, error: Exception = None):
+        self.index = index
+        self.chatId = chatId
+        self.spec = spec
+        self.result = result
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        return f"SendResult({self.index}, {self.chatId!r}, {'ok' if self.ok else repr(self.error)})"
+
+
+def specKwargs(spec: Union[str, dict]) -> dict:
+    """A message spec is the text of the message, or the keyword arguments of `send_message`."""
+    return {"message": spec} if isinstance(spec, str) else dict(spec)
+
+
+def _byChat(jobs: Iterable[Tuple[str, Union[str, dict]]]) -> Tuple[list, "OrderedDict[str, list]"]:
+    results, chats = [], OrderedDict()
+    for index, (chatId, spec) in enumerate(jobs):
+        results.append(SendResult(index, chatId, spec))
+        chats.setdefault(chatId, []).append(results[-1])
+    return results, chats
+
+
+def bulkSend(send: Callable, jobs: Iterable[Tuple[str, Union[str, dict]]], workers: int = 8, rate: float = None,
+             burst: int = None, retries: int = 3, delay: float = 1.0, stopOnError: bool = True) -> List[SendResult]:
+    """
+    Sends (chatId, spec) jobs with `send(chatId, **specKwargs(spec))`, up to `workers` chats at a time.
+
+    Messages to the same chat go out one after the other, in the order they were given.
+    With `rate`, all workers together stay under `rate` messages per second. A message
+    answered with a rate limit is retried after an exponential backoff, up to `retries`
+    times. With `stopOnError`, a chat whose message failed gets none of its later messages,
+    they are reported with the same error.
+
+    Returns one SendResult per job, in the order of `jobs`.
+    """
+    results, chats = _byChat(jobs)
+    limiter = RateLimiter(rate, burst) if rate else None
+
+    def run(queue: list):
+        failed = None
+        for item in queue:
+            if failed is not None:
+                item.error = failed
+                continue
+            for attempt in range(retries + 1):
+                if limiter: limiter.acquire()
+                try:
+                    item.result = send(item.chatId, **specKwargs(item.spec))
+                    item.error = None
+                    break
+                except THROTTLED as error:
+                    item.error = error
+                    if attempt < retries:
+                        wait = backoff(attempt, delay)
+                        hooks.retrying(error, wait)
+                        sleep(wait)
+                except Exception as error:
+                    item.error = error
+                    break
+            if item.error is not None and stopOnError:
+                failed = item.error
+
+    if chats:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(chats))), thread_name_prefix="samino-bulk") as pool:
+            for future in [pool.submit(run, queue) for queue in chats.values()]:
+                future.result()
+    return results
+
+
+async def abulkSend(send: Callable, jobs: Iterable[Tuple[str, Union[str, dict]]], workers: int = 8, rate: float = None,
+                    burst: int = None, retries: int = 3, delay: float = 1.0, stopOnError: bool = True) -> List[SendResult]:
+    """Async `bulkSend`, `send` being a coroutine function. Chats are tasks, at most `workers` sending at once."""
+    results, chats = _byChat(jobs)
+    limiter = RateLimiter(rate, burst) if rate else None
+    slots = asyncio.Semaphore(max(1, workers))
+
+    async def run(queue: list):
+        failed = None
+        async with slots:
+            for item in queue:
+                if failed is not None:
+                    item.error = failed
+                    continue
+                for attempt in range(retries + 1):
+                    if limiter: await limiter.aacquire()
+                    try:
+                        item.result = await send(item.chatId, **specKwargs(item.spec))
+                        item.error = None
+                        break
+                    except THROTTLED as error:
+                        item.error = error
+                        if attempt < retries:
+                            wait = backoff(attempt, delay)
+                            hooks.retrying(error, wait)
+                            await asyncio.sleep(wait)
+                    except Exception as error:
+                        item.error = error
+                        break
+                if item.error is not None and stopOnError:
+                    failed = item.error
+
+    await asyncio.gather(*[run(queue) for queue in chats.values()])
+    return results
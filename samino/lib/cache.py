@@ -0,0 +1,404 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, Optional, Union
+
+from .objects import UserProfile
+
+
+def comKey(comId: Union[str, int, None]) -> int:
+    """comIds come as str from users and as int from the api, 0 stands for global profiles."""
+    return int(comId) if comId else 0
+
+
+class ProfileEntry:
+    __slots__ = ("data", "profile", "full", "expires")
+
+    def __init__(self, data: dict, full: bool, expires: float):
+        self.data = data
+        self.profile = None
+        self.full = full
+        self.expires = expires
+
+
+class ProfileCache:
+    """
+    Opt-in TTL + LRU cache of user profiles keyed by (comId, userId).
+
+        from samino.lib.cache import profiles
+        profiles.enable(maxsize=20000, ttl=600)
+
+    While enabled, `get_user_info` answers from the cache and stores what it fetches.
+    Author blocks of socket chat messages and the profiles in member listings are
+    merged into it for free: they refresh the fields they carry (nickname, level,
+    role, icon ...) of a cached full profile, or sit in the cache as partial entries
+    that `peek` returns but `get_user_info` does not.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0):
+        self.enabled = False
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.reset_stats()
+
+    def enable(self, maxsize: int = None, ttl: float = None):
+        if maxsize is not None: self.maxsize = maxsize
+        if ttl is not None: self.ttl = ttl
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self.clear()
+
+    def reset_stats(self):
+        self.hits = self.misses = self.expired = self.merges = self.evictions = 0
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, comId, userId: str) -> Optional[UserProfile]:
+        """The cached full profile, None on a miss, a partial entry or an expired one."""
+        key = (comKey(comId), userId)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or not entry.full:
+                self.misses += 1
+                return None
+            if entry.expires < time.monotonic():
+                self.expired += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            if entry.profile is None:
+                entry.profile = UserProfile(entry.data).UserProfile
+            return entry.profile
+
+    def peek(self, comId, userId: str) -> Optional[dict]:
+        """Raw cached data, full or partial, expired or not. Does not count as a hit or miss."""
+        entry = self.entries.get((comKey(comId), userId))
+        return entry.data if entry else None
+
+    def put(self, comId, data: dict) -> Optional[UserProfile]:
+        """Store a full profile (the `userProfile` of a response) and return it built."""
+        if not data or not data.get("uid"):
+            return None
+        key = (comKey(comId), data["uid"])
+        entry = ProfileEntry(data, True, time.monotonic() + self.ttl)
+        entry.profile = UserProfile(data).UserProfile
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            self._evict()
+        return entry.profile
+
+    def merge(self, comId, data: dict):
+        """Fold a partial profile (a message author, a listing entry) into the cache."""
+        if not data or not data.get("uid"):
+            return
+        key = (comKey(comId), data["uid"])
+        with self.lock:
+            self.merges += 1
+            entry = self.entries.get(key)
+            if entry is None:
+                self.entries[key] = ProfileEntry(dict(data), False, time.monotonic() + self.ttl)
+                self._evict()
+                return
+            entry.data = {**entry.data, **data}
+            entry.profile = None
+            if not entry.full:
+                entry.expires = time.monotonic() + self.ttl
+            self.entries.move_to_end(key)
+
+    def merge_many(self, comId, profiles: Iterable[dict]):
+        for data in profiles or ():
+            self.merge(comId, data)
+
+    def listed(self, comId, profiles: list) -> list:
+        """Passes a raw `userProfileList` through, merging it first while the cache is enabled."""
+        if self.enabled: self.merge_many(comId, profiles)
+        return profiles
+
+    def build(self, comId, data: dict) -> UserProfile:
+        """`UserProfile(data).UserProfile`, merging `data` first while the cache is enabled."""
+        if self.enabled: self.merge(comId, data)
+        return UserProfile(data).UserProfile
+
+    def author(self, data: dict):
+        """Merges the author of the chat message in a parsed socket frame."""
+        if not self.enabled:
+            return
+        payload = data.get("o") or {}
+        self.merge(payload.get("ndcId"), (payload.get("chatMessage") or {}).get("author"))
+
+    def invalidate(self, comId, userId: str):
+        with self.lock:
+            self.entries.pop((comKey(comId), userId), None)
+
+    def _evict(self):
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "merges": self.merges,
+            "evictions": self.evictions,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# chat message types carrying a change to the thread they are posted in
+MEMBER_JOINED, MEMBER_LEFT, TITLE_CHANGED = 101, 102, 105
+THREAD_CHANGED = (104, 106, 113, 116, 121, 127)  # background, icon, description, host, announcement pin / unpin
+
+
+class MetaEntry:
+    __slots__ = ("data", "built", "fetched", "refreshing")
+
+    def __init__(self, data, fetched: float):
+        self.data = data
+        self.built = None
+        self.fetched = fetched
+        self.refreshing = False
+
+
+class MetadataCache:
+    """
+    Opt-in stale-while-revalidate cache for community and chat thread metadata
+    (`get_community_info`, `get_chat_info`, `get_chat_threads`).
+
+        from samino.lib.cache import metadata
+        metadata.enable(ttl=60, maxStale=3600)
+
+    Entries younger than `ttl` are served as they are. Older ones, up to `maxStale`, are
+    still served at once while a single background refresh fetches the new version, so
+    only the first lookup of a key ever waits on the api.
+
+    Socket chat messages keep threads current in between: member join / leave update
+    `membersCount`, a title change sets the new title, and the other thread changes (icon,
+    background, host, announcement) mark the thread stale so the next read refreshes it.
+    """
+
+    def __init__(self, ttl: float = 60.0, maxStale: float = 3600.0, maxsize: int = 5000):
+        self.enabled = False
+        self.ttl = ttl
+        self.maxStale = maxStale
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = self.stale = self.misses = self.refreshes = 0
+        self.tasks = set()
+
+    def enable(self, ttl: float = None, maxStale: float = None, maxsize: int = None):
+        if ttl is not None: self.ttl = ttl
+        if maxStale is not None: self.maxStale = maxStale
+        if maxsize is not None: self.maxsize = maxsize
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    # ------------------------------------------------------------------ keys
+
+    @staticmethod
+    def communityKey(comId) -> tuple:
+        return "community", comKey(comId)
+
+    # threads carry per-member fields and the lists are the joined ones, so both are
+    # kept apart per account (`uid`) when several accounts share the process
+
+    @staticmethod
+    def threadKey(comId, chatId: str, uid: str = None) -> tuple:
+        return "thread", comKey(comId), chatId, uid
+
+    @staticmethod
+    def threadsKey(comId, start: int, size: int, uid: str = None) -> tuple:
+        return "threads", comKey(comId), start, size, uid
+
+    # ------------------------------------------------------------------ storage
+
+    def put(self, key: tuple, data):
+        with self.lock:
+            self._put(key, data)
+            if key[0] == "threads":
+                # every listed thread doubles as a get_chat_info answer
+                for thread in data:
+                    if thread.get("threadId"):
+                        self._put(self.threadKey(key[1], thread["threadId"], key[4]), dict(thread))
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def _put(self, key: tuple, data):
+        self.entries[key] = MetaEntry(data, time.monotonic())
+        self.entries.move_to_end(key)
+
+    def invalidate(self, key: tuple):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def invalidate_thread(self, comId, chatId: str):
+        """Drops a thread and every cached thread list of its community, for every account (after joining, leaving, editing)."""
+        comId = comKey(comId)
+        with self.lock:
+            for key in [key for key in self.entries if self._ofThread(key, comId, chatId)]:
+                del self.entries[key]
+
+    @staticmethod
+    def _ofThread(key: tuple, comId: int, chatId: str) -> bool:
+        """Whether `key` is the thread `chatId` or a thread list of `comId`, under any account."""
+        return key[1] == comId and (key[0] == "threads" or (key[0] == "thread" and key[2] == chatId))
+
+    def _lookup(self, key: tuple):
+        """(entry, refresh), the entry being None when there is nothing usable and a fetch has to wait."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            age = time.monotonic() - entry.fetched
+            if age < self.ttl:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return entry, False
+            if age < self.maxStale:
+                self.stale += 1
+                self.entries.move_to_end(key)
+                refresh = not entry.refreshing
+                entry.refreshing = True
+                return entry, refresh
+            self.misses += 1
+            return None, False
+
+    def _stored(self, key: tuple, data, build: Callable):
+        self.put(key, data)
+        entry = self.entries.get(key)
+        if entry is None or entry.data is not data:
+            return build(data)
+        return self._built(entry, build)
+
+    @staticmethod
+    def _built(entry: MetaEntry, build: Callable):
+        if entry.built is None:
+            entry.built = build(entry.data)
+        return entry.built
+
+    def _refreshed(self, key: tuple, entry: MetaEntry, data):
+        with self.lock:
+            entry.refreshing = False
+            self.refreshes += 1
+        self.put(key, data)
+
+    def _failed(self, entry: MetaEntry):
+        with self.lock:
+            entry.refreshing = False
+
+    # ------------------------------------------------------------------ lookups
+
+    def get(self, key: tuple, fetch: Callable[[], object], build: Callable, cached: bool = True):
+        """`build(fetch())` through the cache, stale entries being refreshed on a background thread."""
+        if not self.enabled:
+            return build(fetch())
+        if cached:
+            entry, refresh = self._lookup(key)
+            if entry is not None:
+                if refresh:
+                    threading.Thread(target=self._refresh, args=(key, entry, fetch), daemon=True,
+                                     name="samino-metadata-refresh").start()
+                return self._built(entry, build)
+        data = fetch()
+        return self._stored(key, data, build)
+
+    def _refresh(self, key: tuple, entry: MetaEntry, fetch: Callable):
+        try: data = fetch()
+        except Exception: return self._failed(entry)
+        self._refreshed(key, entry, data)
+
+    async def aget(self, key: tuple, fetch: Callable[[], Awaitable], build: Callable, cached: bool = True):
+        """`get` for a coroutine function, the refresh being a task on the running loop."""
+        if not self.enabled:
+            return build(await fetch())
+        if cached:
+            entry, refresh = self._lookup(key)
+            if entry is not None:
+                if refresh:
+                    task = asyncio.ensure_future(self._arefresh(key, entry, fetch))
+                    self.tasks.add(task)
+                    task.add_done_callback(self.tasks.discard)
+                return self._built(entry, build)
+        data = await fetch()
+        return self._stored(key, data, build)
+
+    async def _arefresh(self, key: tuple, entry: MetaEntry, fetch: Callable):
+        try: data = await fetch()
+        except Exception: return self._failed(entry)
+        self._refreshed(key, entry, data)
+
+    # ------------------------------------------------------------------ socket deltas
+
+    def event(self, data: dict):
+        """Applies the thread change carried by the chat message of a parsed socket frame."""
+        if not self.enabled:
+            return
+        payload = data.get("o") or {}
+        message = payload.get("chatMessage") or {}
+        kind, chatId = message.get("type"), message.get("threadId")
+        if not chatId or kind not in (MEMBER_JOINED, MEMBER_LEFT, TITLE_CHANGED, *THREAD_CHANGED):
+            return
+
+        comId = comKey(payload.get("ndcId"))
+        with self.lock:
+            for key, entry in self.entries.items():
+                if key[0] == "thread" and key[1] == comId and key[2] == chatId:
+                    threads = [entry.data]
+                elif key[0] == "threads" and key[1] == comId:
+                    threads = [thread for thread in entry.data if thread.get("threadId") == chatId]
+                else:
+                    continue
+                for thread in threads:
+                    self._apply(thread, kind, message)
+                    entry.built = None
+                if threads and kind in THREAD_CHANGED:
+                    entry.fetched -= self.ttl
+
+    @staticmethod
+    def _apply(thread: dict, kind: int, message: dict):
+        if kind in (MEMBER_JOINED, MEMBER_LEFT) and isinstance(thread.get("membersCount"), int):
+            thread["membersCount"] = max(0, thread["membersCount"] + (1 if kind == MEMBER_JOINED else -1))
+        elif kind == TITLE_CHANGED and message.get("content"):
+            thread["title"] = message["content"]
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.stale + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "stale": self.stale,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "hitRate": (self.hits + self.stale) / lookups if lookups else 0.0,
+        }
+
+
+profiles = ProfileCache()
+metadata = MetadataCache()
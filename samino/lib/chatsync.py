@@ -0,0 +1,146 @@
+from typing import AsyncIterator, Iterator, Optional, Tuple
+
+from .checkpoint import CheckpointStore
+from .objects import Message
+
+
+class ChatSync:
+    """
+    Incremental mirror of one chat's history, for Local, Client and the SAsync clients
+    (anything with `iter_chat_messages`).
+
+        store = CheckpointStore("mirror.db")
+        sync = ChatSync(local, chatId, store)
+        for message in sync.run():        # `async for message in sync.arun()` with SLocal / SClient
+            archive(message)
+
+    The first run walks the whole history backwards with page tokens. Later runs only
+    fetch messages newer than the newest one already synced (by `createdTime`, or its
+    `messageId`), then carry on with the backwards walk if an earlier run was cut short.
+    Both walks resume from their own checkpoint, so an interrupted run loses nothing.
+
+    Messages are yielded newest first within each walk.
+    """
+
+    def __init__(self, client, chatId: str, store: CheckpointStore, size: int = 100, key: str = None):
+        self.client = client
+        self.chatId = chatId
+        self.store = store
+        self.size = size
+        self.key = key or f"chat:{getattr(client, 'comId', 'g')}:{chatId}"
+
+        with self.store.lock:
+            self.store.db.execute(
+                "CREATE TABLE IF NOT EXISTS chat_sync ("
+                "key TEXT PRIMARY KEY, headTime TEXT, headId TEXT, pendingTime TEXT, pendingId TEXT)"
+            )
+
+    # ------------------------------------------------------------------ state
+
+    def _state(self) -> Tuple[Optional[tuple], Optional[tuple]]:
+        with self.store.lock:
+            row = self.store.db.execute(
+                "SELECT headTime, headId, pendingTime, pendingId FROM chat_sync WHERE key = ?", (self.key,)
+            ).fetchone()
+        if row is None:
+            return None, None
+        return (row[0], row[1]) if row[1] else None, (row[2], row[3]) if row[3] else None
+
+    def _save(self, head: Optional[tuple], pending: Optional[tuple]):
+        head, pending = head or (None, None), pending or (None, None)
+        with self.store.lock:
+            self.store.db.execute(
+                "INSERT OR REPLACE INTO chat_sync (key, headTime, headId, pendingTime, pendingId) VALUES (?, ?, ?, ?, ?)",
+                (self.key, *head, *pending)
+            )
+
+    @property
+    def head(self) -> Optional[dict]:
+        """createdTime and messageId of the newest message synced so far."""
+        head, _ = self._state()
+        return {"createdTime": head[0], "messageId": head[1]} if head else None
+
+    def reset(self):
+        """Forget everything, the next run starts over from the newest message."""
+        with self.store.lock:
+            self.store.db.execute("DELETE FROM chat_sync WHERE key = ?", (self.key,))
+        self.store.delete(f"{self.key}:catchup")
+        self.store.delete(f"{self.key}:backfill")
+
+    @staticmethod
+    def _reached(message: Message, head: tuple) -> bool:
+        return message.messageId == head[1] or bool(message.createdTime and head[0] and message.createdTime < head[0])
+
+    @staticmethod
+    def _mark(message: Message) -> tuple:
+        return message.createdTime, message.messageId
+
+    # ------------------------------------------------------------------ sync
+
+    def run(self) -> Iterator[Message]:
+        head, pending = self._state()
+        if head:
+            yield from self._catchUp(head, pending)
+            if pending:
+                # an interrupted catch-up was just finished, fetch what arrived in the meantime too
+                head, _ = self._state()
+                yield from self._catchUp(head, None)
+
+        backfill = self.store.checkpoint(f"{self.key}:backfill")
+        for message in self.client.iter_chat_messages(self.chatId, size=self.size, checkpoint=backfill):
+            if head is None:
+                head = self._mark(message)
+                self._save(head, None)
+            yield message
+
+    def _catchUp(self, head: tuple, pending: Optional[tuple]) -> Iterator[Message]:
+        catchup = self.store.checkpoint(f"{self.key}:catchup")
+        messages = self.client.iter_chat_messages(self.chatId, size=self.size, checkpoint=catchup)
+        try:
+            for message in messages:
+                if self._reached(message, head):
+                    break
+                if pending is None:
+                    pending = self._mark(message)
+                    self._save(head, pending)
+                yield message
+        finally:
+            messages.close()
+
+        self._save(pending or head, None)
+        self.store.delete(catchup.key)
+
+    async def arun(self) -> AsyncIterator[Message]:
+        """`run` for SLocal / SClient."""
+        head, pending = self._state()
+        if head:
+            async for message in self._acatchUp(head, pending):
+                yield message
+            if pending:
+                head, _ = self._state()
+                async for message in self._acatchUp(head, None):
+                    yield message
+
+        backfill = self.store.checkpoint(f"{self.key}:backfill")
+        async for message in self.client.iter_chat_messages(self.chatId, size=self.size, checkpoint=backfill):
+            if head is None:
+                head = self._mark(message)
+                self._save(head, None)
+            yield message
+
+    async def _acatchUp(self, head: tuple, pending: Optional[tuple]) -> AsyncIterator[Message]:
+        catchup = self.store.checkpoint(f"{self.key}:catchup")
+        messages = self.client.iter_chat_messages(self.chatId, size=self.size, checkpoint=catchup)
+        try:
+            async for message in messages:
+                if self._reached(message, head):
+                    break
+                if pending is None:
+                    pending = self._mark(message)
+                    self._save(head, pending)
+                yield message
+        finally:
+            await messages.aclose()
+
+        self._save(pending or head, None)
+        self.store.delete(catchup.key)
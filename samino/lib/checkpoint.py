@@ -0,0 +1,123 @@
+import sqlite3
+import threading
+import time
+from typing import Optional, Union
+
+# keys tried, in order, to tell listing items apart
+ID_KEYS = ("messageId", "commentId", "blogId", "itemId", "threadId", "uid", "ndcId", "notificationId", "objectId")
+
+
+def itemId(item) -> Optional[str]:
+    if not isinstance(item, dict):
+        return None
+    for key in ID_KEYS:
+        if item.get(key) is not None:
+            return str(item[key])
+    return None
+
+
+class Checkpoint:
+    """
+    Where a crawl stopped: the cursor of the page it was reading (an offset, or the
+    pageToken it was fetched with) and the id of the last item handed to the caller.
+
+    On resume the page at `cursor` is fetched again and everything up to and including
+    `watermark` is skipped, so no item is yielded twice even when the listing shifted
+    a little (new members, new messages) while the crawl was down.
+
+    An item counts as handled once the caller asks for the next one, so the item a
+    crawl stopped on (an exception, a `break`) is handed out again on resume.
+    """
+
+    def __init__(self, store: "CheckpointStore", key: str, cursor: Union[int, str] = None, watermark: str = None,
+                 count: int = 0, done: bool = False, updated: float = None):
+        self.store = store
+        self.key = key
+        self.cursor = cursor
+        self.watermark = watermark
+        self.count = count
+        self.done = done
+        self.updated = updated
+
+    def save(self):
+        self.updated = time.time()
+        self.store.save(self)
+
+    def reset(self):
+        self.cursor, self.watermark, self.count, self.done = None, None, 0, False
+        self.save()
+
+    @property
+    def json(self):
+        return {
+            "key": self.key,
+            "cursor": self.cursor,
+            "watermark": self.watermark,
+            "count": self.count,
+            "done": self.done,
+            "updated": self.updated,
+        }
+
+
+class CheckpointStore:
+    """
+    Small SQLite file holding crawl checkpoints, one row per crawl key.
+
+        store = CheckpointStore("crawl.db")
+        for user in acm.iter_all_members("recent", checkpoint=store.checkpoint(f"members-{comId}")):
+            ...
+
+    Run the same code again after a crash and the crawl continues where it stopped,
+    once it is finished the iterator yields nothing until the checkpoint is `reset`.
+    """
+
+    def __init__(self, path: str = "samino-checkpoints.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "key TEXT PRIMARY KEY, offset INTEGER, token TEXT, watermark TEXT, "
+            "count INTEGER NOT NULL DEFAULT 0, done INTEGER NOT NULL DEFAULT 0, updated REAL)"
+        )
+
+    def __enter__(self) -> "CheckpointStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def checkpoint(self, key: str) -> Checkpoint:
+        """The saved checkpoint for `key`, or a fresh one starting from the top."""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT offset, token, watermark, count, done, updated FROM checkpoints WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return Checkpoint(self, key)
+
+        offset, token, watermark, count, done, updated = row
+        return Checkpoint(self, key, offset if offset is not None else token, watermark, count, bool(done), updated)
+
+    def save(self, checkpoint: Checkpoint):
+        cursor = checkpoint.cursor
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO checkpoints (key, offset, token, watermark, count, done, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (checkpoint.key, cursor if isinstance(cursor, int) else None, cursor if isinstance(cursor, str) else None,
+                 checkpoint.watermark, checkpoint.count, int(checkpoint.done), checkpoint.updated)
+            )
+
+    def delete(self, key: str):
+        with self.lock:
+            self.db.execute("DELETE FROM checkpoints WHERE key = ?", (key,))
+
+    def keys(self):
+        with self.lock:
+            return [row[0] for row in self.db.execute("SELECT key FROM checkpoints ORDER BY key")]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
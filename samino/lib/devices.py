@@ -0,0 +1,73 @@
+import hashlib
+import hmac
+import threading
+from collections import deque
+from typing import Dict
+
+from .util import deviceFor, generateDevice
+
+
+class DeviceRegistry:
+    """
+    The device id every account uses, so an account keeps showing up from the same
+    device instead of a new one per client or per request (which the api answers with
+    InvalidDevice and verification prompts).
+
+    - `device(account)` is the device pinned to the account: the one its stored
+      session was made with (`Client.login(store=...)` pins it, and saves the device
+      with the session it makes), else a random one pinned for the life of the process.
+      With a `seed` it is derived from the account key and the seed instead, the same
+      in every process that shares the seed, for accounts logging in without a store.
+    - `take()` hands out devices generated ahead in batches of `poolSize`, for clients
+      that are not (yet) logged in as an account.
+
+        from samino.lib.devices import devices
+        devices.seed = os.environ["DEVICE_SEED"].encode()  # a secret, never the default
+        devices.fill(100)  # before starting many clients
+
+    Headers built from the registry carry a fixed device, no device is generated while
+    a request is made.
+    """
+
+    def __init__(self, seed: bytes = None, poolSize: int = 16):
+        self.seed = seed
+        self.poolSize = poolSize
+        self.lock = threading.Lock()
+        self.pool = deque()
+        self.pinned: Dict[str, str] = {}
+
+    def fill(self, count: int = None):
+        """Generates `count` devices (`poolSize` by default) for `take`."""
+        fresh = [generateDevice() for _ in range(count or self.poolSize)]
+        with self.lock:
+            self.pool.extend(fresh)
+
+    def take(self) -> str:
+        """A device used by nothing else yet."""
+        with self.lock:
+            if self.pool:
+                return self.pool.popleft()
+        self.fill()
+        with self.lock:
+            return self.pool.popleft() if self.pool else generateDevice()
+
+    def derive(self, account: str) -> str:
+        """The device of `account` under `seed`, anyone knowing the seed and the email can compute it."""
+        return deviceFor(hmac.new(self.seed, account.encode(), hashlib.sha256).digest()[:16])
+
+    def device(self, account: str) -> str:
+        with self.lock:
+            device = self.pinned.get(account)
+        if device is not None:
+            return device
+        fresh = self.derive(account) if self.seed else self.take()
+        with self.lock:
+            return self.pinned.setdefault(account, fresh)
+
+    def pin(self, account: str, device: str):
+        """Makes `device` the device of `account`, e.g. the one a stored session was made with."""
+        with self.lock:
+            self.pinned[account] = device
+
+
+devices = DeviceRegistry()
@@ -0,0 +1,114 @@
+import asyncio
+import copy
+import threading
+from typing import Awaitable, Callable, Hashable
+
+
+def copyError(error: BaseException) -> BaseException:
+    """A copy of `error` without its traceback, so each waiting thread raises its own. The original if it cannot be copied."""
+    try:
+        return copy.copy(error).with_traceback(None)
+    except Exception:
+        return error
+
+
+class Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical requests made at the same time: the first caller for a key does
+    the work, everyone arriving while it is in flight waits for it and gets a copy of its
+    result (`share`, a deep copy by default) or of its exception, so callers changing
+    what they got do not change it for the others. Nothing is kept once the call is done,
+    so this is not a cache, a GET started after the previous one finished goes out again.
+
+    Used by Session and SSession for GETs, keyed by url and session id. Disable it with
+    `flights.enabled = False`.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.tasks = {}
+        self.led = self.shared = 0
+
+    def do(self, key: Hashable, fetch: Callable, share: Callable = copy.deepcopy):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+                self.led += 1
+            else:
+                call.waiters += 1
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise copyError(call.error)
+            return share(call.result)
+
+        try:
+            result = fetch()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            if call.waiters and call.error is None:
+                # the waiters copy a snapshot the leader cannot change under them
+                call.result = share(result)
+            call.done.set()
+        return result
+
+    async def ado(self, key: Hashable, fetch: Callable[[], Awaitable], share: Callable = copy.deepcopy):
+        """
+        `do` for a coroutine function. The call runs as its own task, so a caller being
+        cancelled does not cancel it for the others.
+        """
+        loop = asyncio.get_running_loop()
+        key = (loop, key)
+        with self.lock:
+            task = self.tasks.get(key)
+            leader = task is None
+            if leader:
+                task = self.tasks[key] = loop.create_task(fetch())
+                task.add_done_callback(lambda done: self._finished(key, done))
+                task.followers = 0
+                self.led += 1
+            else:
+                task.followers += 1
+                self.shared += 1
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as error:
+            if leader: raise
+            raise copyError(error)
+        # everyone, the leader too, gets a copy once the result is shared
+        return share(result) if task.followers else result
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        with self.lock:
+            self.tasks.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved, even if every caller was cancelled meanwhile
+
+    @property
+    def stats(self):
+        return {"inFlight": len(self.calls) + len(self.tasks), "led": self.led, "shared": self.shared}
+
+
+flights = SingleFlight()
@@ -1,17 +1,20 @@
-import base64
-import json
+from urllib.parse import urlparse
 
-from .util import generateDevice, generateSig, uuidString
+from . import util
+from .auth import Credentials, defaultCredentials
+from .devices import devices as deviceRegistry  # not `devices`, the star import of lib would shadow the module
+from .util import generateSig, uuidString
 
-# Not Required for normal samino only for async (for now at least)
-# IDK if async version works either so ima leave it for later :eyes:
-userId = None
+# device of every request whose credentials have none, else each instance keeps one from lib.devices
 staticDevice = None
 
 
 class Headers:
+    # the account these headers authenticate, set per instance to run several (see lib.auth.Credentials)
+    credentials: Credentials = defaultCredentials
+
     def __init__(self, header_device: str = None):
-        self.header_device = header_device if header_device else generateDevice()
+        self.header_device = header_device or self.credentials.deviceId or staticDevice or deviceRegistry.take()
 
         self.app_headers = {
             "NDCDEVICEID": self.header_device,
@@ -19,7 +22,7 @@ class Headers:
             "Accept-Language": "en-US",
             "Content-Type": "application/x-www-form-urlencoded",
             "User-Agent": "Apple iPhoneXS iOS v16.7.2 Main/3.22.0",
-            "Host": "service.aminoapps.com",
+            "Host": urlparse(util.apiUrl).netloc,
             "Connection": "Keep-Alive",
             "Accept-Encoding": "gzip",
         }
@@ -33,31 +36,59 @@ class Headers:
             "x-requested-with": "xmlhttprequest"
         }
 
-    def updateHeaders(self, data=None, lang=None, updateDevice=None, sid=None):
+    def updateHeaders(self, data=None, lang=None, updateDevice=None, sid=None, signature=None):
         self.app_headers.update({
             "SMDEVICEID": uuidString(),
-            "NDCDEVICEID": staticDevice if staticDevice else generateDevice(),
+            "NDCDEVICEID": self.credentials.deviceId or staticDevice or self.header_device,
             "Content-Type": "application/x-www-form-urlencoded"
         })
 
         if data: self.app_headers.update(
-            {"NDC-MSG-SIG": generateSig(data), "Content-Type": "application/json; charset=utf-8"})
+            {"NDC-MSG-SIG": signature or generateSig(data), "Content-Type": "application/json; charset=utf-8"})
         if updateDevice: self.app_headers.update({"NDCDEVICEID": updateDevice})
         if lang: self.app_headers.update({"NDCLANG": lang[:lang.index("-")], "Accept-Language": lang})
 
-        if sid:
+        if sid and sid != self.credentials.sid:
+            # some other sid, the credentials are left alone
             self.web_headers.update({"cookie": sid})
-            self.app_headers.update({"NDCAUTH": sid})
-            decoded_sid = base64.b64decode(
-                (sid.replace("sid=", "").encode() + b'=' * (-len(sid) % 4)).decode().replace('-', '+').replace('_',
-                                                                                                               '/'))
-            self.app_headers.update(
-                {
-                    "AUID":
-                        json.loads(decoded_sid[decoded_sid.index(b"{"):decoded_sid.index(b"}") + 1].decode("utf-8"))[
-                            "2"]
-                }
-            )
+            self.app_headers.update({"NDCAUTH": sid, "AUID": util.sidPayload(sid)["2"]})
+        else:
+            self.authenticate()
 
         self.headers_device = self.app_headers.get("NDCDEVICEID", None)
         return self.app_headers
+
+    def authenticate(self):
+        """Puts the sid of `credentials` in the headers, or takes it out after a logout."""
+        auth = self.credentials.authHeaders
+        if auth:
+            self.app_headers.update(auth)
+            self.web_headers["cookie"] = auth["NDCAUTH"]
+        else:
+            self.app_headers.pop("NDCAUTH", None)
+            self.app_headers.pop("AUID", None)
+            self.web_headers.pop("cookie", None)
+
+    @property
+    def sid(self):
+        return self.credentials.sid
+
+    @sid.setter
+    def sid(self, value):
+        self.credentials.sid = value
+
+    @property
+    def uid(self):
+        return self.credentials.uid
+
+    @uid.setter
+    def uid(self, value):
+        self.credentials.uid = value
+
+    @property
+    def secret(self):
+        return self.credentials.secret
+
+    @secret.setter
+    def secret(self, value):
+        self.credentials.secret = value
@@ -0,0 +1,201 @@
+import contextvars
+from functools import wraps
+from inspect import isasyncgenfunction, iscoroutinefunction, isfunction, isgeneratorfunction
+from time import perf_counter
+
+from .metrics import endpointTemplate
+
+
+class RequestTrace:
+    """
+    One API call as seen by the observers.
+
+    `timings` holds seconds spent per phase: prepare (the calling method
+    building its payload), encode, sign, headers, network, decode and objects
+    (building the returned object). The async clients encode and sign inline,
+    so for them those phases are all part of `prepare`.
+    """
+
+    def __init__(self, method: str, url: str, call: str = None):
+        self.method = method
+        self.url = url
+        self.call = call
+        self.attempt = 1
+        self.started = self.last = perf_counter()
+        self.timings = {}
+        self.status = None
+        self.apiStatus = None
+        self.data = None
+        self.error = None
+
+    def lap(self, phase: str):
+        now = perf_counter()
+        self.timings[phase] = self.timings.get(phase, 0.0) + now - self.last
+        self.last = now
+
+    @property
+    def endpoint(self):
+        return endpointTemplate(self.url)
+
+    @property
+    def elapsed(self):
+        return self.last - self.started
+
+
+class RequestObserver:
+    """Base class for observers, override the hooks you need."""
+
+    def before_send(self, trace: RequestTrace):
+        pass
+
+    def after_receive(self, trace: RequestTrace):
+        pass
+
+    def on_error(self, trace: RequestTrace, error: Exception):
+        pass
+
+    def on_retry(self, trace: RequestTrace, error: Exception, delay: float):
+        pass
+
+
+class CallScope:
+    def __init__(self, name: str, started: float):
+        self.name = name
+        self.started = started
+        self.requests = 0
+        self.traces = []
+
+
+_scope = contextvars.ContextVar("samino_call_scope", default=None)
+
+
+class Hooks:
+    """
+    Registry of request observers.
+
+    The public methods of every `traceable` class are wrapped once, when the
+    class is defined. While no observer is registered the wrappers only check
+    `hooks.observers` and call through, as does the request path. Once one is,
+    they scope each call so the time spent building the returned objects can be
+    attributed to the request.
+    """
+
+    def __init__(self):
+        self.observers = []
+
+    def register(self, observer: RequestObserver):
+        self.observers = self.observers + [observer]
+        return observer
+
+    def unregister(self, observer: RequestObserver):
+        self.observers = [registered for registered in self.observers if registered is not observer]
+
+    def traceable(self, cls):
+        """Class decorator marking a client class whose API methods can be timed."""
+        for name, attr in list(vars(cls).items()):
+            if name.startswith("_") or not isfunction(attr):
+                continue
+            if isgeneratorfunction(attr) or isasyncgenfunction(attr):
+                continue
+            setattr(cls, name, self.wrap(attr))
+        return cls
+
+    def wrap(self, func):
+        name = func.__qualname__
+
+        if iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                if not self.observers:
+                    return await func(*args, **kwargs)
+                token, scope = self.enter(name)
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as error:
+                    self.exit(token, scope, error)
+                    raise
+                self.exit(token, scope)
+                return result
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.observers:
+                    return func(*args, **kwargs)
+                token, scope = self.enter(name)
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as error:
+                    self.exit(token, scope, error)
+                    raise
+                self.exit(token, scope)
+                return result
+
+        return wrapper
+
+    def enter(self, name: str):
+        scope = CallScope(name, perf_counter())
+        return _scope.set(scope), scope
+
+    def exit(self, token, scope: CallScope, error: Exception = None):
+        _scope.reset(token)
+        if error is not None and scope.traces and getattr(error, "trace", None) is None:
+            error.trace = scope.traces[-1]
+        for trace in scope.traces:
+            if trace is scope.traces[-1]:
+                trace.lap("objects")
+            if error is None:
+                self._emit("after_receive", trace)
+            else:
+                trace.error = error
+                self._emit("on_error", trace, error)
+
+    # ------------------------------------------------------------------ used by the request path
+
+    def start(self, method: str, url: str):
+        scope = _scope.get()
+        trace = RequestTrace(method, url, scope.name if scope else None)
+        if scope is not None:
+            if not scope.requests:
+                # the time the method spent before its first request shows up as `prepare`
+                trace.started = trace.last = scope.started
+            scope.requests += 1
+        trace.lap("prepare")
+        return trace
+
+    def send(self, trace: RequestTrace):
+        self._emit("before_send", trace)
+
+    def receive(self, trace: RequestTrace, status: int, data):
+        trace.status = status
+        trace.data = data
+        trace.apiStatus = data.get("api:statuscode") if isinstance(data, dict) else None
+
+        scope = _scope.get()
+        if scope is not None:
+            scope.traces.append(trace)  # reported once the method built its return value
+        else:
+            self._emit("after_receive", trace)
+
+    def error(self, trace: RequestTrace, error: Exception):
+        trace.error = error
+        error.trace = trace
+        self._emit("on_error", trace, error)
+
+    def retry(self, trace: RequestTrace, error: Exception, delay: float = 0.0):
+        self._emit("on_retry", trace, error, delay)
+        trace.attempt += 1
+
+    # ------------------------------------------------------------------ used by the retry loops
+
+    def retrying(self, error: Exception, delay: float = 0.0):
+        """Reports the retry of the request that failed with `error`, when a trace was attached to it."""
+        trace = getattr(error, "trace", None)
+        if trace is not None and self.observers:
+            self.retry(trace, error, delay)
+
+    def _emit(self, event: str, *args):
+        for observer in self.observers:
+            getattr(observer, event)(*args)
+
+
+hooks = Hooks()
@@ -0,0 +1,164 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+import ujson as json
+
+from .exception import (CheckExceptions, CommunityDeleted, CommunityNoLongerExists, InvalidCodeOrLink,
+                        InviteCodeNotFound, UnexistentData)
+
+# answers that mean the link itself is dead, anything else (network, rate limits ...) is never cached
+DEAD = (UnexistentData, InvalidCodeOrLink, InviteCodeNotFound, CommunityNoLongerExists, CommunityDeleted)
+
+
+def linkKey(link: str) -> str:
+    return "link:" + link.strip().rstrip("/")
+
+
+def idKey(objectId: str, comId=None, objectType: int = 2) -> str:
+    return f"id:{comId or 'g'}:{objectType}:{objectId}"
+
+
+class LinkCache:
+    """
+    Opt-in cache of link resolutions (`get_from_link`, `get_from_id`), in memory and,
+    with a `path`, in a small SQLite file shared by every run of the bot.
+
+        from samino.lib.links import links
+        links.enable(path="links.db")
+
+    Links map to the same comId / objectId for as long as they exist, so answers are kept
+    for `ttl` seconds (a week by default). Dead links (unexistent data, invalid code ...)
+    are cached for `deadTtl` seconds and raise the same exception again on a hit.
+    """
+
+    def __init__(self, ttl: float = 7 * 86400, deadTtl: float = 3600, maxsize: int = 10000):
+        self.enabled = False
+        self.ttl = ttl
+        self.deadTtl = deadTtl
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.db = None
+        self.hits = self.misses = 0
+
+    def enable(self, path: str = None, ttl: float = None, deadTtl: float = None):
+        if ttl is not None: self.ttl = ttl
+        if deadTtl is not None: self.deadTtl = deadTtl
+        if path and self.db is None:
+            self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS links (key TEXT PRIMARY KEY, json TEXT, error TEXT, expires REAL)"
+            )
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self.clear()
+        if self.db is not None:
+            with self.lock:
+                self.db.close()
+                self.db = None
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM links")
+
+    def invalidate(self, key: str):
+        with self.lock:
+            self.entries.pop(key, None)
+            if self.db is not None:
+                self.db.execute("DELETE FROM links WHERE key = ?", (key,))
+
+    def _load(self, key: str) -> Optional[tuple]:
+        entry = self.entries.get(key)
+        if entry is None and self.db is not None:
+            row = self.db.execute("SELECT json, error, expires FROM links WHERE key = ?", (key,)).fetchone()
+            if row:
+                entry = (json.loads(row[0]) if row[0] else None, json.loads(row[1]) if row[1] else None, row[2])
+                self.entries[key] = entry
+        return entry
+
+    def _store(self, key: str, data: Optional[dict], error: Optional[dict], ttl: float):
+        expires = time.time() + ttl
+        with self.lock:
+            self.entries[key] = (data, error, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO links (key, json, error, expires) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(data) if data is not None else None,
+                     json.dumps(error) if error is not None else None, expires)
+                )
+
+    def get(self, key: str) -> Optional[dict]:
+        """The cached resolution, None on a miss. Raises the cached exception of a dead link."""
+        with self.lock:
+            entry = self._load(key)
+            if entry is None or entry[2] < time.time():
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        if entry[1] is not None:
+            CheckExceptions(entry[1])
+        return entry[0]
+
+    def put(self, key: str, data: dict):
+        self._store(key, data, None, self.ttl)
+
+    def dead(self, key: str, error: Exception):
+        data = error.args[0] if error.args and isinstance(error.args[0], dict) else {}
+        self._store(key, None, data, self.deadTtl)
+
+    def fetch(self, key: str, request: Callable[[], dict], cached: bool = True) -> dict:
+        """`request()` through the cache."""
+        if not self.enabled:
+            return request()
+        if cached:
+            data = self.get(key)
+            if data is not None:
+                return data
+        try:
+            data = request()
+        except DEAD as error:
+            self.dead(key, error)
+            raise
+        self.put(key, data)
+        return data
+
+    async def afetch(self, key: str, request: Callable[[], Awaitable[dict]], cached: bool = True) -> dict:
+        """`fetch` for a coroutine function."""
+        if not self.enabled:
+            return await request()
+        if cached:
+            data = self.get(key)
+            if data is not None:
+                return data
+        try:
+            data = await request()
+        except DEAD as error:
+            self.dead(key, error)
+            raise
+        self.put(key, data)
+        return data
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+links = LinkCache()
@@ -0,0 +1,123 @@
+import sqlite3
+import threading
+import time
+from hashlib import sha256
+from typing import Awaitable, Callable, Optional
+
+
+class MediaCache:
+    """
+    Opt-in cache of uploaded media, mapping a content hash to the `mediaValue` url
+    the api handed out for it. Kept in memory and, with a `path`, in a SQLite file
+    that several bot processes can share.
+
+        from samino.lib.media import media
+        media.enable(path="media.db")
+
+    While enabled, `upload_media`, `upload_image`, `upload_sticker` and `upload_theme_pack`
+    only upload bytes they have not uploaded before. `send_message(file=...)` sends a
+    known file as its `mediaValue` instead of inlining it as base64 again.
+
+    Entries are per target (`upload:image`, `message:audio` ...), the same bytes uploaded
+    for another purpose are uploaded again.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.db = None
+        self.hits = self.misses = 0
+
+    def enable(self, path: str = None):
+        if path and self.db is None:
+            self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS media ("
+                "hash TEXT NOT NULL, target TEXT NOT NULL, mediaValue TEXT NOT NULL, size INTEGER, created REAL, "
+                "PRIMARY KEY (hash, target))"
+            )
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        with self.lock:
+            self.entries.clear()
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+    @staticmethod
+    def digest(data) -> str:
+        """sha256 of bytes, or of a MediaStream read chunk by chunk."""
+        return data.sha256() if hasattr(data, "sha256") else sha256(data).hexdigest()
+
+    def get(self, digest: str, target: str) -> Optional[str]:
+        key = (digest, target)
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None and self.db is not None:
+                # another process may have uploaded it since
+                row = self.db.execute(
+                    "SELECT mediaValue FROM media WHERE hash = ? AND target = ?", key
+                ).fetchone()
+                if row:
+                    value = self.entries[key] = row[0]
+            if value is None: self.misses += 1
+            else: self.hits += 1
+        return value
+
+    def put(self, digest: str, target: str, mediaValue: Optional[str], size: int = None):
+        if not mediaValue:
+            return
+        with self.lock:
+            self.entries[(digest, target)] = mediaValue
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO media (hash, target, mediaValue, size, created) VALUES (?, ?, ?, ?, ?)",
+                    (digest, target, mediaValue, size, time.time())
+                )
+
+    def invalidate(self, digest: str, target: str = None):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == digest and target in (None, key[1])]:
+                del self.entries[key]
+            if self.db is not None:
+                if target is None: self.db.execute("DELETE FROM media WHERE hash = ?", (digest,))
+                else: self.db.execute("DELETE FROM media WHERE hash = ? AND target = ?", (digest, target))
+
+    def upload(self, data: bytes, target: str, upload: Callable[[], str]) -> str:
+        """`upload()` unless `data` was uploaded to `target` before, returns the mediaValue."""
+        if not self.enabled:
+            return upload()
+        digest = self.digest(data)
+        mediaValue = self.get(digest, target)
+        if mediaValue is None:
+            mediaValue = upload()
+            self.put(digest, target, mediaValue, len(data))
+        return mediaValue
+
+    async def aupload(self, data: bytes, target: str, upload: Callable[[], Awaitable[str]]) -> str:
+        """`upload` for a coroutine function."""
+        if not self.enabled:
+            return await upload()
+        digest = self.digest(data)
+        mediaValue = self.get(digest, target)
+        if mediaValue is None:
+            mediaValue = await upload()
+            self.put(digest, target, mediaValue, len(data))
+        return mediaValue
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+media = MediaCache()
@@ -0,0 +1,227 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# latency histogram upper bounds in seconds, the last bucket catches everything slower
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+# name given to an id, by the path segment right before it
+ID_NAMES = {
+    "thread": "chatId",
+    "message": "messageId",
+    "user-profile": "userId",
+    "member": "userId",
+    "co-host": "userId",
+    "block": "userId",
+    "influencer": "userId",
+    "blog": "blogId",
+    "item": "wikiId",
+    "comment": "commentId",
+    "g-comment": "commentId",
+    "quiz": "quizId",
+    "notice": "requestId",
+    "transfer-organizer": "requestId",
+    "membership-request": "userId",
+    "chat-bubble": "bubbleId",
+    "option": "optionId",
+    "files": "folderId",
+}
+
+COMMUNITY = re.compile(r"^(?:s-)?x\d+$")
+# uuid shaped ids, numeric ids and long hex tokens
+IDENTIFIER = re.compile(r"^(?:\w{8}-\w{4}-\w{4}-\w{4}-\w{12}|\d+|[0-9a-fA-F]{24,})$")
+
+
+def endpointTemplate(url: str):
+    """
+    Turn a request url into its endpoint template, e.g.
+    `https://.../api/v1/x123/s/chat/thread/<uuid>/message?v=2` -> `/x{comId}/s/chat/thread/{chatId}/message`
+    """
+    path = urlsplit(url).path
+    if "/api/v1/" in path:
+        path = path[path.index("/api/v1/") + 7:]
+    elif path.startswith("/api/"):
+        path = path[4:]
+
+    segments = path.split("/")
+    for index in range(1, len(segments)):
+        segment = segments[index]
+        if COMMUNITY.match(segment):
+            segments[index] = re.sub(r"x\d+", "x{comId}", segment)
+        elif IDENTIFIER.match(segment):
+            segments[index] = "{%s}" % ID_NAMES.get(segments[index - 1], "id")
+    return "/".join(segments)
+
+
+class EndpointStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.latencySum = 0.0
+        self.latencyMax = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.bytesIn = 0
+        self.bytesOut = 0
+        self.statusCodes = Counter()
+        self.apiStatusCodes = Counter()
+        self.networkErrors = Counter()
+
+    def quantile(self, q: float):
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for index, amount in enumerate(self.buckets):
+            seen += amount
+            if seen >= rank:
+                return BUCKETS[index] if index < len(BUCKETS) - 1 else self.latencyMax
+
+    @property
+    def json(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "latencyMean": self.latencySum / self.count if self.count else None,
+            "latencyMax": self.latencyMax,
+            "latencyP50": self.quantile(0.5),
+            "latencyP99": self.quantile(0.99),
+            "buckets": dict(zip(map(str, BUCKETS), self.buckets)),
+            "bytesIn": self.bytesIn,
+            "bytesOut": self.bytesOut,
+            "statusCodes": dict(self.statusCodes),
+            "apiStatusCodes": dict(self.apiStatusCodes),
+            "networkErrors": dict(self.networkErrors),
+        }
+
+
+class Metrics:
+    """
+    Per-endpoint request metrics. Disabled by default, in which case the
+    request path only pays for one attribute check.
+
+        from samino.lib.metrics import metrics
+        metrics.enable()
+        ...
+        metrics.snapshot()     # pull api
+        metrics.prometheus()   # text exposition format
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.server: ThreadingHTTPServer = None
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+
+    def record(self, method: str, url: str, status: int, apiStatus: int = None, latency: float = 0.0,
+               bytesOut: int = 0, bytesIn: int = 0, error: Exception = None):
+        """
+        One request. Requests that got no response (timeouts, connection and proxy errors)
+        are recorded with status 0 and the `error` they failed with.
+        """
+        key = (method, endpointTemplate(url))
+
+        with self.lock:
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = self.endpoints[key] = EndpointStats()
+
+            stats.count += 1
+            stats.latencySum += latency
+            stats.latencyMax = max(stats.latencyMax, latency)
+            stats.buckets[bisect_left(BUCKETS, latency)] += 1
+            stats.bytesIn += bytesIn
+            stats.bytesOut += bytesOut
+            stats.statusCodes[status] += 1
+            if apiStatus is not None:
+                stats.apiStatusCodes[apiStatus] += 1
+            if error is not None:
+                stats.networkErrors[type(error).__name__] += 1
+            if status != 200:
+                stats.errors += 1
+
+    def recordResponse(self, response, data: dict):
+        """Record an httpx response, `data` being its decoded json."""
+        request = response.request
+        self.record(
+            method=request.method,
+            url=str(request.url),
+            status=response.status_code,
+            apiStatus=data.get("api:statuscode") if isinstance(data, dict) else None,
+            latency=response.elapsed.total_seconds(),
+            bytesOut=int(request.headers.get("content-length") or 0),
+            bytesIn=response.num_bytes_downloaded,
+        )
+
+    def recordError(self, method: str, url: str, error: Exception, latency: float = 0.0, bytesOut: int = 0):
+        """Record a request that failed before any response came back."""
+        self.record(method, url, 0, latency=latency, bytesOut=bytesOut, error=error)
+
+    def snapshot(self):
+        with self.lock:
+            return {f"{method} {template}": stats.json for (method, template), stats in self.endpoints.items()}
+
+    def prometheus(self, prefix: str = "samino"):
+        lines = [
+            f"# TYPE {prefix}_request_duration_seconds histogram",
+            f"# TYPE {prefix}_request_bytes_total counter",
+            f"# TYPE {prefix}_response_bytes_total counter",
+            f"# TYPE {prefix}_responses_total counter",
+            f"# TYPE {prefix}_api_status_total counter",
+            f"# TYPE {prefix}_network_errors_total counter",
+        ]
+
+        with self.lock:
+            for (method, template), stats in self.endpoints.items():
+                labels = f'method="{method}",endpoint="{template}"'
+                seen = 0
+                for bound, amount in zip(BUCKETS, stats.buckets):
+                    seen += amount
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{prefix}_request_duration_seconds_bucket{{{labels},le="{le}"}} {seen}')
+                lines.append(f"{prefix}_request_duration_seconds_sum{{{labels}}} {stats.latencySum}")
+                lines.append(f"{prefix}_request_duration_seconds_count{{{labels}}} {stats.count}")
+                lines.append(f"{prefix}_request_bytes_total{{{labels}}} {stats.bytesOut}")
+                lines.append(f"{prefix}_response_bytes_total{{{labels}}} {stats.bytesIn}")
+                for status, amount in stats.statusCodes.items():
+                    lines.append(f'{prefix}_responses_total{{{labels},status="{status}"}} {amount}')
+                for apiStatus, amount in stats.apiStatusCodes.items():
+                    lines.append(f'{prefix}_api_status_total{{{labels},api_status="{apiStatus}"}} {amount}')
+                for error, amount in stats.networkErrors.items():
+                    lines.append(f'{prefix}_network_errors_total{{{labels},error="{error}"}} {amount}')
+
+        return "\n".join(lines) + "\n"
+
+    def serve_prometheus(self, port: int = 9464, host: str = "0.0.0.0"):
+        """Expose `prometheus()` on http://host:port/metrics from a background thread."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                payload = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server
+
+
+metrics = Metrics()
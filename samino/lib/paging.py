@@ -0,0 +1,332 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+from typing import AsyncIterator, Callable, Iterator, Optional, Tuple
+
+from .checkpoint import Checkpoint, itemId
+from .exception import CommandCooldown, TooManyRequests
+from .hooks import hooks
+
+# responses that mean "slow down" rather than "give up"
+THROTTLED = (TooManyRequests, CommandCooldown)
+
+
+def nextToken(data: dict) -> Optional[str]:
+    """The `nextPageToken` of a response, None once the listing is exhausted."""
+    try: return data["paging"]["nextPageToken"] or None
+    except (KeyError, TypeError): return None
+
+
+def tokenParam(pageToken: Optional[str]) -> str:
+    return f"&pageToken={pageToken}" if pageToken else ""
+
+
+class Page(list):
+    """
+    Raw items of one page, with the cursor (offset or pageToken) it was fetched with
+    and the cursor of the page after it.
+    """
+
+    def __init__(self, data: list, cursor=None, next=None):
+        list.__init__(self, data)
+        self.cursor = cursor
+        self.next = next
+        self.checkpoint: Checkpoint = None
+
+
+def _skipSeen(page: Page, checkpoint: Checkpoint, watermark: Optional[str]):
+    """Drops the items of the first resumed page up to and including the last one handed out before."""
+    if watermark is not None:
+        ids = [itemId(item) for item in page]
+        if watermark in ids:
+            del page[:ids.index(watermark) + 1]
+    page.checkpoint = checkpoint
+    return page
+
+
+def _resumed(pages: Iterator[Page], checkpoint: Checkpoint) -> Iterator[Page]:
+    watermark = checkpoint.watermark
+    for page in pages:
+        yield _skipSeen(page, checkpoint, watermark)
+        watermark = None
+    checkpoint.done = True
+    checkpoint.save()
+
+
+def offsetPages(fetch: Callable[[int, int], list], start: int = 0, size: int = 25, prefetch: int = 0,
+                checkpoint: Checkpoint = None) -> Iterator[Page]:
+    """
+    Pages of a start/size listing. `fetch(start, size)` returns the raw item list of one page.
+    Stops after the first short page, so the last request is never an empty one unless the
+    listing size is an exact multiple of `size`.
+
+    With `prefetch` set, that many pages are requested ahead in parallel, see `prefetchPages`.
+    With a `checkpoint` the listing starts where it stopped last time, `items` keeps it up to date.
+    """
+    if checkpoint is not None:
+        if not checkpoint.done:
+            start = checkpoint.cursor if checkpoint.cursor is not None else start
+            yield from _resumed(offsetPages(fetch, start, size, prefetch), checkpoint)
+        return
+    if prefetch:
+        yield from prefetchPages(fetch, start, size, prefetch)
+        return
+    while True:
+        page = fetch(start, size)
+        if page:
+            yield Page(page, start, start + len(page))
+        if len(page) < size:
+            return
+        start += len(page)
+
+
+def tokenPages(fetch: Callable[[Optional[str], int], Tuple[list, Optional[str]]], pageToken: str = None,
+               size: int = 25, checkpoint: Checkpoint = None) -> Iterator[Page]:
+    """
+    Pages of a pageToken listing. `fetch(pageToken, size)` returns (items, nextPageToken).
+    Stops when the server stops handing out a token, repeats the one it was given, or sends an empty page.
+    """
+    if checkpoint is not None:
+        if not checkpoint.done:
+            pageToken = checkpoint.cursor if checkpoint.cursor is not None else pageToken
+            yield from _resumed(tokenPages(fetch, pageToken, size), checkpoint)
+        return
+    while True:
+        page, token = fetch(pageToken, size)
+        if page:
+            yield Page(page, pageToken, token)
+        if not page or not token or token == pageToken:
+            return
+        pageToken = token
+
+
+class Window:
+    """
+    How many pages to keep in flight. Grows by one page per response while latency
+    stays close to the best seen, shrinks by one when it degrades, and halves on a
+    rate limit response.
+    """
+
+    def __init__(self, size: int = 4, maximum: int = 16, slowdown: float = 2.0):
+        self.maximum = max(1, maximum)
+        self.size = min(max(1, size), self.maximum)
+        self.slowdown = slowdown
+        self.best = None
+
+    def success(self, latency: float):
+        self.best = latency if self.best is None else min(self.best, latency)
+        if latency > self.best * self.slowdown:
+            self.size = max(1, self.size - 1)
+        else:
+            self.size = min(self.maximum, self.size + 1)
+
+    def throttled(self):
+        self.size = max(1, self.size // 2)
+
+
+def backoff(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    return min(cap, base * 2 ** attempt)
+
+
+def _timed(fetch: Callable, start: int, size: int):
+    began = perf_counter()
+    return fetch(start, size), perf_counter() - began
+
+
+def prefetchPages(fetch: Callable[[int, int], list], start: int = 0, size: int = 25, window: int = 4,
+                  maxWindow: int = 16, retries: int = 5, delay: float = 1.0) -> Iterator[Page]:
+    """
+    Same pages as `offsetPages`, in the same order, but with up to `window` requests in flight
+    on a thread pool. The window adapts as described in `Window`. A page answered with a rate
+    limit is retried after an exponential backoff, up to `retries` times.
+
+    Pages requested past the end of the listing are dropped, nothing more is requested after
+    the first short page.
+    """
+    control = Window(window, maxWindow)
+    pool = ThreadPoolExecutor(max_workers=control.maximum, thread_name_prefix="samino-prefetch")
+    pending, attempts = {}, {}
+    ahead = start
+
+    try:
+        while True:
+            while len(pending) < control.size:
+                pending[ahead] = pool.submit(_timed, fetch, ahead, size)
+                ahead += size
+
+            try:
+                page, latency = pending.pop(start).result()
+            except THROTTLED as error:
+                attempts[start] = attempts.get(start, 0) + 1
+                if attempts[start] > retries:
+                    raise
+                control.throttled()
+                wait = backoff(attempts[start] - 1, delay)
+                hooks.retrying(error, wait)
+                sleep(wait)
+                pending[start] = pool.submit(_timed, fetch, start, size)
+                continue
+
+            control.success(latency)
+            attempts.pop(start, None)
+            if page:
+                yield Page(page, start, start + len(page))
+            if len(page) < size:
+                return
+            start += size
+    finally:
+        for future in pending.values():
+            future.cancel()
+        pool.shutdown(wait=False)
+
+
+async def _atimed(fetch: Callable, start: int, size: int):
+    began = perf_counter()
+    return await fetch(start, size), perf_counter() - began
+
+
+async def aprefetchPages(fetch: Callable, start: int = 0, size: int = 25, window: int = 4, maxWindow: int = 16,
+                         retries: int = 5, delay: float = 1.0) -> AsyncIterator[Page]:
+    """Async `prefetchPages`, the pages in flight being tasks on the running loop."""
+    control = Window(window, maxWindow)
+    pending, attempts = {}, {}
+    ahead = start
+
+    try:
+        while True:
+            while len(pending) < control.size:
+                pending[ahead] = asyncio.ensure_future(_atimed(fetch, ahead, size))
+                ahead += size
+
+            try:
+                page, latency = await pending.pop(start)
+            except THROTTLED as error:
+                attempts[start] = attempts.get(start, 0) + 1
+                if attempts[start] > retries:
+                    raise
+                control.throttled()
+                wait = backoff(attempts[start] - 1, delay)
+                hooks.retrying(error, wait)
+                await asyncio.sleep(wait)
+                pending[start] = asyncio.ensure_future(_atimed(fetch, start, size))
+                continue
+
+            control.success(latency)
+            attempts.pop(start, None)
+            if page:
+                yield Page(page, start, start + len(page))
+            if len(page) < size:
+                return
+            start += size
+    finally:
+        for task in pending.values():
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending.values(), return_exceptions=True)
+
+
+def _consumed(page: Page, item):
+    checkpoint = page.checkpoint
+    checkpoint.watermark = itemId(item)
+    checkpoint.count += 1
+
+
+def _finished(page: Page):
+    checkpoint = page.checkpoint
+    checkpoint.cursor = page.next
+    checkpoint.save()
+
+
+def items(pages: Iterator[Page], build: Callable = None, limit: int = None) -> Iterator:
+    """
+    Flattens `pages` into single items, building each one with `build` (e.g. `lambda x: UserProfile(x).UserProfile`)
+    as it is consumed. Only the current page is ever held in memory.
+
+    Pages carrying a checkpoint get it moved forward item by item and saved after every
+    page, and once more when the caller stops early or an error ends the crawl.
+    """
+    if limit is not None and limit <= 0:
+        return
+    count, page = 0, None
+    try:
+        for page in pages:
+            if page.checkpoint: page.checkpoint.cursor = page.cursor
+            for item in page:
+                yield build(item) if build else item
+                if page.checkpoint: _consumed(page, item)
+                count += 1
+                if limit is not None and count >= limit:
+                    pages.close()
+                    return
+            if page.checkpoint: _finished(page)
+    finally:
+        if page is not None and page.checkpoint and not page.checkpoint.done: page.checkpoint.save()
+
+
+async def _aresumed(pages: AsyncIterator[Page], checkpoint: Checkpoint) -> AsyncIterator[Page]:
+    watermark = checkpoint.watermark
+    async for page in pages:
+        yield _skipSeen(page, checkpoint, watermark)
+        watermark = None
+    checkpoint.done = True
+    checkpoint.save()
+
+
+async def aoffsetPages(fetch: Callable, start: int = 0, size: int = 25, prefetch: int = 0,
+                       checkpoint: Checkpoint = None) -> AsyncIterator[Page]:
+    """Async `offsetPages`, `fetch` being a coroutine function."""
+    if checkpoint is not None:
+        if not checkpoint.done:
+            start = checkpoint.cursor if checkpoint.cursor is not None else start
+            async for page in _aresumed(aoffsetPages(fetch, start, size, prefetch), checkpoint):
+                yield page
+        return
+    if prefetch:
+        async for page in aprefetchPages(fetch, start, size, prefetch):
+            yield page
+        return
+    while True:
+        page = await fetch(start, size)
+        if page:
+            yield Page(page, start, start + len(page))
+        if len(page) < size:
+            return
+        start += len(page)
+
+
+async def atokenPages(fetch: Callable, pageToken: str = None, size: int = 25,
+                      checkpoint: Checkpoint = None) -> AsyncIterator[Page]:
+    """Async `tokenPages`, `fetch` being a coroutine function."""
+    if checkpoint is not None:
+        if not checkpoint.done:
+            pageToken = checkpoint.cursor if checkpoint.cursor is not None else pageToken
+            async for page in _aresumed(atokenPages(fetch, pageToken, size), checkpoint):
+                yield page
+        return
+    while True:
+        page, token = await fetch(pageToken, size)
+        if page:
+            yield Page(page, pageToken, token)
+        if not page or not token or token == pageToken:
+            return
+        pageToken = token
+
+
+async def aitems(pages: AsyncIterator[Page], build: Callable = None, limit: int = None) -> AsyncIterator:
+    """Async `items`."""
+    if limit is not None and limit <= 0:
+        return
+    count, page = 0, None
+    try:
+        async for page in pages:
+            if page.checkpoint: page.checkpoint.cursor = page.cursor
+            for item in page:
+                yield build(item) if build else item
+                if page.checkpoint: _consumed(page, item)
+                count += 1
+                if limit is not None and count >= limit:
+                    await pages.aclose()
+                    return
+            if page.checkpoint: _finished(page)
+    finally:
+        if page is not None and page.checkpoint and not page.checkpoint.done: page.checkpoint.save()
@@ -0,0 +1,177 @@
+import random
+import threading
+import weakref
+from time import monotonic
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import unquote, urlparse
+
+from httpx import Client
+
+# websocket-client proxy types by url scheme
+SOCKET_TYPES = {"http": "http", "https": "http", "socks4": "socks4", "socks4a": "socks4a", "socks5": "socks5", "socks5h": "socks5h"}
+
+
+class Proxy:
+    """
+    One egress of a ProxyPool, `url` being `scheme://[user:password@]host:port`, and how
+    it has been doing: the average latency of its requests and its errors in a row.
+    """
+
+    def __init__(self, url: str, weight: float = 1.0):
+        parts = urlparse(url if "://" in url else f"http://{url}")
+        if not parts.hostname or not parts.port:
+            raise ValueError(f"proxy url needs a host and a port: {url!r}")
+        self.url = parts.geturl()
+        self.weight = weight
+        self.host = parts.hostname
+        self.port = parts.port
+        self.type = SOCKET_TYPES.get(parts.scheme, "http")
+        self.auth = (unquote(parts.username), unquote(parts.password or "")) if parts.username else None
+
+        self.latency: Optional[float] = None
+        self.requests = 0
+        self.errors = 0
+        self.failures = 0  # errors in a row
+        self.ejections = 0
+        self.ejectedUntil = 0.0
+
+    @property
+    def websocket(self) -> dict:
+        """The proxy options of websocket-client's `run_forever`."""
+        return {"http_proxy_host": self.host, "http_proxy_port": self.port,
+                "proxy_type": self.type, "http_proxy_auth": self.auth}
+
+    def ejected(self, now: float = None) -> bool:
+        return self.ejectedUntil > (monotonic() if now is None else now)
+
+    @property
+    def score(self) -> float:
+        """`weight` scaled down by the share of failed requests and by a latency over 100ms."""
+        success = (self.requests - self.errors + 1) / (self.requests + 2)
+        return self.weight * success / max(self.latency or 0.1, 0.1)
+
+    @property
+    def health(self) -> dict:
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "score": self.score,
+            "latency": self.latency,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ejected": max(0.0, self.ejectedUntil - monotonic()),
+        }
+
+    def __repr__(self):
+        return f"Proxy({self.url!r}, weight={self.weight})"
+
+
+class ProxyPool:
+    """
+    Egress proxies shared by clients, given as `proxies=` to Client, Local and Acm (and
+    to AccountPool) in place of a single proxy.
+
+        pool = ProxyPool(["http://user:pw@10.0.0.1:8080", ("socks5://10.0.0.2:1080", 3)])
+        client = Client(proxies=pool)
+
+    - Every account sticks to one proxy: its Client, Locals, Acms and websocket all go
+      out through the proxy its Credentials were assigned, so the api sees one ip per
+      account.
+    - New accounts are assigned by weighted random choice, the weight of a proxy being
+      its score (see Proxy.score) shared by the accounts already on it.
+    - `ejectAfter` network errors in a row eject a proxy for `ejectFor` seconds, doubling
+      each time it is ejected again, up to `maxEject`. Accounts on it move to another
+      one on their next request. It comes back with its errors forgotten, one more
+      failure ejects it again.
+
+    - Sessions on the same proxy share one httpx client (and its connection pool), see
+      `client`. `close` closes them once the pool is no longer used.
+
+    With every proxy ejected the one coming back first is still used.
+    """
+
+    def __init__(self, proxies: Iterable[Union[str, Tuple[str, float], Proxy]], ejectAfter: int = 3,
+                 ejectFor: float = 30.0, maxEject: float = 600.0, smoothing: float = 0.2):
+        self.proxies: List[Proxy] = [self._proxy(proxy) for proxy in proxies]
+        if not self.proxies:
+            raise ValueError("a ProxyPool needs at least one proxy")
+        self.ejectAfter = ejectAfter
+        self.ejectFor = ejectFor
+        self.maxEject = maxEject
+        self.smoothing = smoothing
+        self.lock = threading.Lock()
+        self.assigned = weakref.WeakKeyDictionary()
+        self.clients: Dict[Proxy, Client] = {}
+        self.random = random.Random()
+
+    @staticmethod
+    def _proxy(proxy) -> Proxy:
+        if isinstance(proxy, Proxy): return proxy
+        if isinstance(proxy, str): return Proxy(proxy)
+        return Proxy(*proxy)
+
+    def __len__(self) -> int:
+        return len(self.proxies)
+
+    def pick(self, exclude: Proxy = None) -> Proxy:
+        """A proxy by weighted random choice among those not ejected."""
+        with self.lock:
+            return self._pick(exclude)
+
+    def _pick(self, exclude: Proxy = None) -> Proxy:
+        now = monotonic()
+        healthy = [proxy for proxy in self.proxies if not proxy.ejected(now) and proxy is not exclude]
+        if not healthy:
+            return min(self.proxies, key=lambda proxy: proxy.ejectedUntil)
+
+        load = {}
+        for proxy in self.assigned.values():
+            load[proxy] = load.get(proxy, 0) + 1
+        weights = [proxy.score / (1 + load.get(proxy, 0)) for proxy in healthy]
+        return self.random.choices(healthy, weights)[0]
+
+    def assign(self, account) -> Proxy:
+        """The proxy of `account` (its Credentials), a new one when it has none yet or its own was ejected."""
+        with self.lock:
+            proxy = self.assigned.get(account)
+            if proxy is None or proxy.ejected():
+                proxy = self.assigned[account] = self._pick(exclude=proxy)
+            return proxy
+
+    def client(self, proxy: Proxy) -> Client:
+        """The httpx client going out through `proxy`, made on first use and kept for every account on it."""
+        with self.lock:
+            client = self.clients.get(proxy)
+            if client is None:
+                client = self.clients[proxy] = Client(proxies=proxy.url, timeout=20)
+            return client
+
+    def close(self):
+        with self.lock:
+            clients, self.clients = list(self.clients.values()), {}
+        for client in clients:
+            client.close()
+
+    def report(self, proxy: Proxy, latency: float = None, error: Exception = None):
+        """Records how a request through `proxy` went: its latency, or the network error it failed with."""
+        with self.lock:
+            proxy.requests += 1
+            if error is None:
+                proxy.failures = 0
+                if latency is not None:
+                    proxy.latency = latency if proxy.latency is None else \
+                        proxy.latency + self.smoothing * (latency - proxy.latency)
+                return
+
+            proxy.errors += 1
+            proxy.failures += 1
+            # a proxy back from an ejection is ejected again at its first failure
+            if proxy.failures >= (1 if proxy.ejections and proxy.requests == proxy.errors else self.ejectAfter):
+                proxy.ejections += 1
+                proxy.ejectedUntil = monotonic() + min(self.maxEject, self.ejectFor * 2 ** (proxy.ejections - 1))
+                proxy.requests = proxy.errors = proxy.failures = 0
+
+    @property
+    def health(self) -> List[dict]:
+        with self.lock:
+            return [proxy.health for proxy in self.proxies]
@@ -0,0 +1,216 @@
+import asyncio
+import struct
+import threading
+import time
+import tracemalloc
+from typing import Iterator, Tuple, Union
+
+import ujson as json
+
+# file layout: MAGIC then repeated [timestamp: float64][length: uint32][raw frame]
+MAGIC = b"SAWR1\n"
+FRAME_HEADER = struct.Struct("<dI")
+
+
+class Recorder:
+    """
+    Append-only writer for raw socket frames.
+
+    Every frame is stored as it came from the wire together with the
+    time it was received, so a recording can be replayed later with the
+    original pacing.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.frames = 0
+        self.lock = threading.Lock()
+
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+
+    def __enter__(self) -> "Recorder":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(self, data: Union[str, bytes], stamp: float = None):
+        if isinstance(data, str):
+            data = data.encode()
+        header = FRAME_HEADER.pack(stamp if stamp is not None else time.time(), len(data))
+
+        with self.lock:
+            self.file.write(header + data)
+            self.frames += 1
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+def readFrames(path: str) -> Iterator[Tuple[float, bytes]]:
+    """Yields (timestamp, frame) pairs from a recording, one frame at a time."""
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a samino socket recording")
+
+        while True:
+            header = file.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return
+
+            stamp, length = FRAME_HEADER.unpack(header)
+            frame = file.read(length)
+            if len(frame) < length:
+                return  # truncated tail from a crashed recorder
+            yield stamp, frame
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+class ReplayReport:
+    def __init__(self, frames: int, elapsed: float, handlers: dict, allocations: bool):
+        self.frames = frames
+        self.elapsed = elapsed
+        self.framesPerSecond = frames / elapsed if elapsed else 0.0
+        self.handlers = {}
+
+        for name, stats in handlers.items():
+            latency = stats["latency"]
+            self.handlers[name] = {
+                "count": len(latency),
+                "p50": percentile(latency, 50),
+                "p90": percentile(latency, 90),
+                "p99": percentile(latency, 99),
+                "max": max(latency),
+            }
+            if allocations:
+                self.handlers[name]["allocatedAvg"] = sum(stats["allocated"]) // len(stats["allocated"])
+                self.handlers[name]["allocatedMax"] = max(stats["allocated"])
+
+    @property
+    def json(self):
+        return {
+            "frames": self.frames,
+            "elapsed": self.elapsed,
+            "framesPerSecond": self.framesPerSecond,
+            "handlers": self.handlers,
+        }
+
+
+class Replay:
+    """
+    Feeds a recording through the `resolve` path of a Callbacks instance
+    (a Client, or any Wss subclass with handlers registered) and measures
+    how long each event type takes to dispatch, object parsing included.
+
+    Latencies are reported in seconds, allocations in bytes.
+    """
+
+    def __init__(self, callbacks, path: str):
+        self.callbacks = callbacks
+        self.path = path
+
+    def _frames(self, realtime: bool, speed: float):
+        first = started = None
+        for stamp, frame in readFrames(self.path):
+            if realtime:
+                if first is None:
+                    first, started = stamp, time.perf_counter()
+                delay = (stamp - first) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            yield frame
+
+    def _instrument(self, current: list):
+        original = self.callbacks.call
+
+        def call(callType, data):
+            current.append(callType)
+            return original(callType, data)
+
+        return call
+
+    def run(self, realtime: bool = False, speed: float = 1.0, allocations: bool = False) -> ReplayReport:
+        """
+        Replay the recording.
+
+        - realtime (bool, optional): Keep the original gaps between frames (divided by `speed`).
+          Defaults to False, which replays as fast as possible.
+
+        - allocations (bool, optional): Track memory allocated per frame with tracemalloc. Slows the replay down.
+        """
+        handlers, current = {}, []
+        self.callbacks.call = self._instrument(current)
+        if allocations:
+            tracemalloc.start()
+
+        frames = 0
+        started = time.perf_counter()
+        try:
+            for frame in self._frames(realtime, speed):
+                current.clear()
+                if allocations:
+                    base = tracemalloc.get_traced_memory()[0]
+                    tracemalloc.reset_peak()
+
+                begin = time.perf_counter()
+                self.callbacks.resolve(frame)
+                latency = time.perf_counter() - begin
+                frames += 1
+
+                stats = handlers.setdefault(current[0] if current else "unhandled", {"latency": [], "allocated": []})
+                stats["latency"].append(latency)
+                if allocations:
+                    stats["allocated"].append(tracemalloc.get_traced_memory()[1] - base)
+        finally:
+            elapsed = time.perf_counter() - started
+            del self.callbacks.call
+            if allocations:
+                tracemalloc.stop()
+
+        return ReplayReport(frames, elapsed, handlers, allocations)
+
+    async def arun(self, realtime: bool = False, speed: float = 1.0) -> ReplayReport:
+        """Same as `run` for the SAsync Callbacks, awaiting each dispatch instead of scheduling a task."""
+        handlers, current = {}, []
+        original = self.callbacks.call
+
+        async def call(callType, data):
+            current.append(callType)
+            return await original(callType, data)
+
+        self.callbacks.call = call
+        frames, first, started = 0, None, time.perf_counter()
+        try:
+            for stamp, frame in readFrames(self.path):
+                if realtime:
+                    first = stamp if first is None else first
+                    delay = (stamp - first) / speed - (time.perf_counter() - started)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+
+                current.clear()
+                data = json.loads(frame)
+                begin = time.perf_counter()
+                await self.callbacks.methods.get(data["t"], self.callbacks.default)(data)
+                handlers.setdefault(current[0] if current else "unhandled", {"latency": []})["latency"].append(
+                    time.perf_counter() - begin)
+                frames += 1
+        finally:
+            elapsed = time.perf_counter() - started
+            del self.callbacks.call
+
+        return ReplayReport(frames, elapsed, handlers, False)
@@ -1,31 +1,33 @@
-from typing import BinaryIO, Union
+from threading import Lock
+from time import perf_counter
+from typing import BinaryIO, Optional, Tuple, Union
 
 from httpx import Client
 from json_minify import json_minify
 from ujson import dumps
 
+from .auth import Credentials
 from .exception import CheckExceptions
+from .flight import flights
 from .headers import Headers
+from .hooks import hooks
+from .metrics import metrics
+from .proxies import Proxy, ProxyPool
+from .upload import InlineBody, MediaStream
 from .util import *
 
-user_settings = {
-    "sid": None,
-    "userId": None,
-    "secret": None
-}
-
-
 class Session(Headers):
-    def __init__(self, proxies: Union[dict, str] = None, staticDevice: str = None):
+    def __init__(self, proxies: Union[dict, str, ProxyPool] = None, staticDevice: str = None, credentials: Credentials = None):
         self.proxy = proxies
+        self.proxyPool = proxies if isinstance(proxies, ProxyPool) else None
+        self.egress: Proxy = None
         self.staticDevice = staticDevice
-
-        self.sid = user_settings["sid"]
-        self.uid = user_settings["userId"]
-        self.secret = user_settings["secret"]
+        if credentials is not None: self.credentials = credentials
 
         Headers.__init__(self, header_device=self.staticDevice)
-        self.session = Client(proxies=self.proxy, timeout=20)
+        self.session = None if self.proxyPool else Client(proxies=self.proxy, timeout=20)
+        self.headersLock = Lock()
+        self.connect()
 
         self.deviceId = self.header_device
         self.sidInit()
@@ -33,44 +35,131 @@ class Session(Headers):
     def sidInit(self):
         if self.sid: self.updateHeaders(sid=self.sid)
 
-    def settings(self, user_session: str = None, user_userId: str = None, user_secret: str = None):
-        user_settings.update({
-            "sid": user_session,
-            "userId": user_userId,
-            "secret": user_secret
-        })
+    def connect(self) -> Client:
+        """
+        The httpx client. With a ProxyPool it is the pool's client of the proxy the account
+        is on (see ProxyPool.client), so it follows the account when it moves.
+        """
+        return self._route()[0]
+
+    def _route(self) -> Tuple[Client, Optional[Proxy]]:
+        if self.proxyPool is None:
+            return self.session, None
+        proxy = self.proxyPool.assign(self.credentials)
+        self.session, self.egress = self.proxyPool.client(proxy), proxy
+        return self.session, proxy
+
+    def roundTrip(self, method: str, url: str, **kwargs):
+        """One round trip, its latency or network error reported to the ProxyPool, and its network error to the metrics."""
+        session, proxy = self._route()
+        if proxy is None and not metrics.enabled:
+            return session.request(method, url=url, **kwargs)
+        began = perf_counter()
+        try:
+            req = session.request(method, url=url, **kwargs)
+        except Exception as error:
+            if proxy is not None: self.proxyPool.report(proxy, error=error)
+            if metrics.enabled:
+                data = kwargs.get("data")
+                metrics.recordError(method, url, error, perf_counter() - began,
+                                    len(data) if isinstance(data, (str, bytes)) else 0)
+            raise
+        if proxy is not None: self.proxyPool.report(proxy, perf_counter() - began)
+        return req
 
-        self.sid = user_settings["sid"]
-        self.uid = user_settings["userId"]
-        self.secret = user_settings["secret"]
-
-        self.sidInit()
+    def settings(self, user_session: str = None, user_userId: str = None, user_secret: str = None):
+        """Sets the session of `credentials`, shared with every client using them. No arguments log out."""
+        self.credentials.update(sid=user_session, uid=user_userId, secret=user_secret)
+        self.authenticate()
 
-    def postRequest(self, url: str, data: Union[str, dict, BinaryIO, bytes] = None, newHeaders: dict = None,
+    def postRequest(self, url: str, data: Union[str, dict, BinaryIO, bytes, MediaStream] = None, newHeaders: dict = None,
                     webRequest: bool = False, minify: bool = False, deviceId: str = None):
-        if newHeaders: self.app_headers.update(newHeaders)
+        url = webApi(url) if webRequest else api(url)
+        trace = hooks.start("POST", url) if hooks.observers else None
 
+        signature = None
         if isinstance(data, dict):
             data = json_minify(dumps(data)) if minify else dumps(data)
-            head = self.updateHeaders(data=data, sid=self.sid)
-        elif isinstance(data, BinaryIO):
-            head = self.updateHeaders(data=data, sid=self.sid)
-        else:
-            head = self.updateHeaders(data=None, sid=self.sid)
-
-        req = self.session.post(
-            url=webApi(url) if webRequest else api(url),
-            data=data,
-            files={"file": data} if isinstance(data, BinaryIO) else None,
-            headers=head
-        )
-        if newHeaders: self.app_headers.pop("content-length")
-        return CheckExceptions(req.json()) if req.status_code != 200 else req.json()
+            if trace: trace.lap("encode")
+            signature = generateSig(data)
+            if trace: trace.lap("sign")
+        elif isinstance(data, InlineBody):
+            signature = data.signature  # signed while it was encoded
+            newHeaders = {**(newHeaders or {}), "content-length": str(len(data))}
+
+        with self.headersLock:
+            # the signature belongs to this body only, concurrent posts (send_messages) must not swap them
+            if newHeaders: self.app_headers.update(newHeaders)
+            head = dict(self.updateHeaders(data=data if signature or isinstance(data, BinaryIO) else None,
+                                           sid=self.sid, signature=signature))
+            if newHeaders: self.app_headers.pop("content-length", None)
+
+        if trace:
+            trace.lap("headers")
+            hooks.send(trace)
+        try:
+            if isinstance(data, MediaStream):
+                # sent chunk by chunk with the content-length given in newHeaders
+                req = self.roundTrip("POST", url, content=iter(data), headers=head)
+            else:
+                req = self.roundTrip(
+                    "POST", url,
+                    data=data,
+                    files={"file": data} if isinstance(data, BinaryIO) else None,
+                    headers=head
+                )
+        except Exception as error:
+            if trace: hooks.error(trace, error)
+            raise
+
+        if trace: trace.lap("network")
+        return self.response(req, trace)
 
     def getRequest(self, url: str):
-        req = self.session.get(url=api(url), headers=self.updateHeaders())
-        return CheckExceptions(req.json()) if req.status_code != 200 else req.json()
+        return self.request("GET", url)
 
     def deleteRequest(self, url: str):
-        req = self.session.delete(url=api(url), headers=self.updateHeaders())
-        return CheckExceptions(req.json()) if req.status_code != 200 else req.json()
+        return self.request("DELETE", url)
+
+    def request(self, method: str, url: str):
+        url = api(url)
+        if method == "GET" and flights.enabled:
+            # identical GETs running at the same time share one round trip and its decoded response
+            return flights.do((url, self.sid), lambda: self.sendRequest(method, url))
+        return self.sendRequest(method, url)
+
+    def sendRequest(self, method: str, url: str):
+        trace = hooks.start(method, url) if hooks.observers else None
+        with self.headersLock:
+            # a private copy, the shared dict is rewritten by every request and GETs may run from several threads
+            head = dict(self.updateHeaders())
+
+        if trace:
+            trace.lap("headers")
+            hooks.send(trace)
+        try:
+            req = self.roundTrip(method, url, headers=head)
+        except Exception as error:
+            if trace: hooks.error(trace, error)
+            raise
+
+        if trace: trace.lap("network")
+        return self.response(req, trace)
+
+    def response(self, req, trace=None):
+        data = req.json()
+        if metrics.enabled: metrics.recordResponse(req, data)
+        if trace: trace.lap("decode")
+
+        if req.status_code == 200:
+            if trace: hooks.receive(trace, req.status_code, data)
+            return data
+        if not trace:
+            return CheckExceptions(data)
+
+        trace.status, trace.data, trace.apiStatus = req.status_code, data, data.get("api:statuscode")
+        try:
+            CheckExceptions(data)
+        except Exception as error:
+            hooks.error(trace, error)
+            raise
@@ -0,0 +1,313 @@
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional, Union
+
+import ujson as json
+
+from .objects import Message
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS messages ("
+    "messageId TEXT PRIMARY KEY, chatId TEXT NOT NULL, comId INTEGER, authorId TEXT, type INTEGER, "
+    "mediaType INTEGER, content TEXT, mediaValue TEXT, createdTime TEXT, json TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS messages_chat_time ON messages (chatId, createdTime)",
+    "CREATE INDEX IF NOT EXISTS messages_author ON messages (authorId, createdTime)",
+    "CREATE TABLE IF NOT EXISTS users ("
+    "uid TEXT NOT NULL, comId INTEGER NOT NULL DEFAULT 0, nickname TEXT, icon TEXT, level INTEGER, "
+    "reputation INTEGER, role INTEGER, updated REAL, PRIMARY KEY (uid, comId))",
+    "CREATE INDEX IF NOT EXISTS users_nickname ON users (nickname)",
+    "CREATE TABLE IF NOT EXISTS threads ("
+    "chatId TEXT PRIMARY KEY, comId INTEGER, title TEXT, type INTEGER, membersCount INTEGER, "
+    "json TEXT NOT NULL, updated REAL)",
+)
+
+FTS_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(content, content='messages', content_rowid='rowid')",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts (rowid, content) VALUES (new.rowid, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN "
+    "INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content); "
+    "INSERT INTO messages_fts (rowid, content) VALUES (new.rowid, new.content); END",
+)
+
+INSERT_MESSAGE = (
+    "INSERT INTO messages (messageId, chatId, comId, authorId, type, mediaType, content, mediaValue, createdTime, json) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (messageId) DO UPDATE SET "
+    "type = excluded.type, content = excluded.content, mediaValue = excluded.mediaValue, json = excluded.json, "
+    "comId = COALESCE(excluded.comId, messages.comId)"
+)
+INSERT_USER = (
+    "INSERT OR REPLACE INTO users (uid, comId, nickname, icon, level, reputation, role, updated) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+INSERT_THREAD = (
+    "INSERT OR REPLACE INTO threads (chatId, comId, title, type, membersCount, json, updated) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def isoTime(value: Union[str, float, int, None]) -> Optional[str]:
+    """createdTime strings pass through, unix timestamps become the same ISO format."""
+    if value is None or isinstance(value, str):
+        return value
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(value))
+
+
+def _raw(item) -> dict:
+    return item.json if hasattr(item, "json") else item
+
+
+class MessageStore:
+    """
+    Local SQLite archive of chat messages, their authors and threads, fed from socket
+    events and REST history. Writes are batched and flushed from a background thread
+    every `interval` seconds (or as soon as `batchSize` rows are waiting).
+
+        store = MessageStore("archive.db")
+        client.start_archiving(store)                                  # live traffic
+        store.add_messages(local.iter_chat_messages(chatId), comId)    # history
+
+        store.messages(chatId, since="2024-01-01T00:00:00Z")
+        store.messages(authorId=userId, limit=20)
+        store.search("giveaway", chatId=chatId)
+
+    Lookups use the (chatId, createdTime) and (authorId, createdTime) indexes and an
+    FTS5 index on the message content. Without FTS5 in the sqlite build, `search`
+    falls back to a LIKE scan.
+
+    The writer thread outlives failed flushes: each one is counted in `failures`
+    and its error kept in `error`, see `flush` for what happens to the rows.
+    """
+
+    def __init__(self, path: str = "samino-messages.db", batchSize: int = 500, interval: float = 1.0):
+        self.path = path
+        self.batchSize = batchSize
+        self.interval = interval
+
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self.db.execute(statement)
+        try:
+            for statement in FTS_SCHEMA:
+                self.db.execute(statement)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+
+        self.dbLock = threading.Lock()
+        self.lock = threading.Lock()
+        self.messagesQueue, self.usersQueue, self.threadsQueue = [], {}, {}
+        self.written = 0
+        self.dropped = 0
+        self.failures = 0
+        self.error: Exception = None
+
+        self.closed = False
+        self.wake = threading.Event()
+        self.writer = threading.Thread(target=self._writer, name="samino-message-store", daemon=True)
+        self.writer.start()
+
+    def __enter__(self) -> "MessageStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    # ------------------------------------------------------------------ writing
+
+    def add_message(self, message: Union[Message, dict], comId: int = None, chatId: str = None):
+        """Queue a message (a Message object or the raw dict) and its author."""
+        data = _raw(message)
+        chatId = data.get("threadId") or chatId if data else None
+        if not chatId or not data.get("messageId"):
+            return
+        author = data.get("author") or {}
+        extensions = data.get("extensions") or {}
+        comId = comId if comId is not None else data.get("ndcId")
+
+        row = (
+            data["messageId"], chatId, comId, data.get("uid") or author.get("uid"),
+            data.get("type"), data.get("mediaType"), data.get("content"),
+            data.get("mediaValue") or extensions.get("mediaValue"), data.get("createdTime"), json.dumps(data),
+        )
+        with self.lock:
+            self.messagesQueue.append(row)
+            if author.get("uid"):
+                self._queueUser(author, comId)
+            waiting = len(self.messagesQueue)
+        if waiting >= self.batchSize:
+            self.wake.set()
+
+    def add_messages(self, messages: Iterable, comId: int = None, chatId: str = None) -> int:
+        """Queue every message of an iterable, e.g. `iter_chat_messages` or `sync_chat_messages`."""
+        count = 0
+        for message in messages:
+            self.add_message(message, comId, chatId)
+            count += 1
+        return count
+
+    def add_event(self, data: dict):
+        """Queue the chat message carried by a parsed socket frame, anything else is ignored."""
+        if data.get("t") != 1000:
+            return
+        payload = data.get("o") or {}
+        message = payload.get("chatMessage")
+        if message:
+            self.add_message(message, payload.get("ndcId"))
+
+    def add_frame(self, frame: Union[str, bytes]):
+        """`add_event` for a raw frame, frames that cannot be chat messages are not parsed."""
+        if (b"1000" if isinstance(frame, bytes) else "1000") in frame:
+            self.add_event(json.loads(frame))
+
+    def add_user(self, profile, comId: int = None):
+        data = _raw(profile)
+        if data and data.get("uid"):
+            with self.lock:
+                self._queueUser(data, comId if comId is not None else data.get("ndcId"))
+
+    def add_thread(self, thread, comId: int = None):
+        data = _raw(thread)
+        if not data or not data.get("threadId"):
+            return
+        comId = comId if comId is not None else data.get("ndcId")
+        with self.lock:
+            self.threadsQueue[data["threadId"]] = (
+                data["threadId"], comId, data.get("title"), data.get("type"), data.get("membersCount"),
+                json.dumps(data), time.time(),
+            )
+
+    def _queueUser(self, data: dict, comId: Optional[int]):
+        self.usersQueue[(data["uid"], comId or 0)] = (
+            data["uid"], comId or 0, data.get("nickname"), data.get("icon"), data.get("level"),
+            data.get("reputation"), data.get("role"), time.time(),
+        )
+
+    def flush(self):
+        """
+        Write everything queued so far in one transaction. When the database is busy or
+        full (OperationalError) the rows go back in the queue for the next flush, rows
+        sqlite refuses for any other reason are dropped and counted in `dropped`.
+        """
+        with self.lock:
+            messages, self.messagesQueue = self.messagesQueue, []
+            users, self.usersQueue = list(self.usersQueue.values()), {}
+            threads, self.threadsQueue = list(self.threadsQueue.values()), {}
+        if not (messages or users or threads):
+            return
+
+        with self.dbLock:
+            try:
+                self.db.execute("BEGIN")
+                try:
+                    if messages: self.db.executemany(INSERT_MESSAGE, messages)
+                    if users: self.db.executemany(INSERT_USER, users)
+                    if threads: self.db.executemany(INSERT_THREAD, threads)
+                except Exception:
+                    self.db.execute("ROLLBACK")
+                    raise
+                self.db.execute("COMMIT")
+            except sqlite3.OperationalError:
+                self._requeue(messages, users, threads)
+                raise
+            except Exception:
+                self.dropped += len(messages) + len(users) + len(threads)
+                raise
+            self.written += len(messages)
+
+    def _requeue(self, messages: list, users: list, threads: list):
+        with self.lock:
+            self.messagesQueue[:0] = messages
+            # rows queued since the swap are newer, they win
+            self.usersQueue = {**{(row[0], row[1]): row for row in users}, **self.usersQueue}
+            self.threadsQueue = {**{row[0]: row for row in threads}, **self.threadsQueue}
+
+    def _writer(self):
+        while not self.closed:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            if not self.closed:
+                try:
+                    self.flush()
+                except Exception as error:
+                    # kept for the caller to inspect, the next round tries again
+                    self.failures += 1
+                    self.error = error
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.wake.set()
+        self.writer.join()
+        self.flush()
+        with self.dbLock:
+            self.db.close()
+
+    # ------------------------------------------------------------------ reading
+
+    def _query(self, sql: str, args: tuple = ()) -> list:
+        self.flush()
+        with self.dbLock:
+            return self.db.execute(sql, args).fetchall()
+
+    def messages(self, chatId: str = None, authorId: str = None, since: Union[str, float] = None,
+                 until: Union[str, float] = None, limit: int = 100, newestFirst: bool = True) -> List[Message]:
+        """
+        Stored messages, filtered by any combination of chat, author and time range.
+
+        - since / until (str or float, optional): createdTime bounds, as ISO strings or unix timestamps.
+        """
+        where, args = [], []
+        if chatId is not None: where.append("chatId = ?"); args.append(chatId)
+        if authorId is not None: where.append("authorId = ?"); args.append(authorId)
+        if since is not None: where.append("createdTime >= ?"); args.append(isoTime(since))
+        if until is not None: where.append("createdTime < ?"); args.append(isoTime(until))
+
+        sql = "SELECT json FROM messages"
+        if where: sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY createdTime {'DESC' if newestFirst else 'ASC'} LIMIT ?"
+        return [Message(json.loads(row[0])).Message for row in self._query(sql, (*args, limit))]
+
+    def search(self, query: str, chatId: str = None, authorId: str = None, limit: int = 50) -> List[Message]:
+        """
+        Full-text search over message content, newest first. `query` uses the FTS5 syntax
+        (`"exact phrase"`, `word*`, `a OR b`) when FTS5 is available.
+        """
+        where, args = [], []
+        if self.fts:
+            sql = "SELECT m.json FROM messages_fts JOIN messages m ON m.rowid = messages_fts.rowid WHERE messages_fts MATCH ?"
+        else:
+            sql = "SELECT m.json FROM messages m WHERE m.content LIKE ?"
+            query = f"%{query}%"
+        if chatId is not None: where.append("m.chatId = ?"); args.append(chatId)
+        if authorId is not None: where.append("m.authorId = ?"); args.append(authorId)
+
+        for condition in where: sql += " AND " + condition
+        sql += " ORDER BY m.createdTime DESC LIMIT ?"
+        return [Message(json.loads(row[0])).Message for row in self._query(sql, (query, *args, limit))]
+
+    def count(self, chatId: str = None) -> int:
+        if chatId is None:
+            return self._query("SELECT COUNT(*) FROM messages")[0][0]
+        return self._query("SELECT COUNT(*) FROM messages WHERE chatId = ?", (chatId,))[0][0]
+
+    def user(self, uid: str, comId: int = None) -> Optional[dict]:
+        """Latest author info seen for `uid`, in `comId` when given."""
+        sql = "SELECT uid, comId, nickname, icon, level, reputation, role, updated FROM users WHERE uid = ?"
+        args = (uid,)
+        if comId is not None:
+            sql, args = sql + " AND comId = ?", (uid, comId)
+        rows = self._query(sql + " ORDER BY updated DESC LIMIT 1", args)
+        if not rows:
+            return None
+        return dict(zip(("uid", "comId", "nickname", "icon", "level", "reputation", "role", "updated"), rows[0]))
+
+    def thread(self, chatId: str) -> Optional[dict]:
+        rows = self._query("SELECT json FROM threads WHERE chatId = ?", (chatId,))
+        return json.loads(rows[0][0]) if rows else None
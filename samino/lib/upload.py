@@ -0,0 +1,378 @@
+import asyncio
+import heapq
+import itertools
+import mmap
+import os
+import threading
+from binascii import b2a_base64
+from concurrent.futures import Future, ThreadPoolExecutor
+from hashlib import sha256
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable, Iterator, List, Tuple, Union
+
+from ujson import dumps
+
+from .util import generateStreamSig
+
+MediaSource = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+CHUNK = 64 * 1024
+
+# upload priorities, lower starts first
+INTERACTIVE = 0
+BULK = 10
+SMALL = 256 * 1024
+
+
+class MediaStream:
+    """
+    Upload body read in `chunkSize` pieces from a path, a file object or a bytes-like
+    object, with its length known upfront so it is sent with a content-length instead
+    of being buffered whole.
+
+        with MediaStream("pack.zip") as stream:
+            session.postRequest(url, data=stream, newHeaders={"content-length": str(len(stream))})
+
+    Local files (paths and real file objects) are memory-mapped with `useMmap`, so
+    parallel uploads of the same file share the page cache instead of each holding a
+    copy. File objects are read from their current position.
+    """
+
+    def __init__(self, source: MediaSource, chunkSize: int = CHUNK, useMmap: bool = True):
+        self.chunkSize = chunkSize
+        self.progress: Callable[[int, int], None] = None
+        self.file = None
+        self.owned = False
+        self.map = None
+        self.view = None
+
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self.view = memoryview(source)
+        else:
+            if isinstance(source, (str, os.PathLike)):
+                self.file, self.owned = open(source, "rb"), True
+            else:
+                self.file = source
+            self.start = self.file.tell() if hasattr(self.file, "tell") else 0
+            self.view = self._mapped() if useMmap else None
+
+        if self.view is not None:
+            self.length = len(self.view)
+        else:
+            self.length = self._size()
+
+    @classmethod
+    def of(cls, source: Union[MediaSource, "MediaStream"]) -> "MediaStream":
+        """`source` itself if it is already a MediaStream (see UploadManager), else a new one."""
+        return source if isinstance(source, MediaStream) else cls(source)
+
+    def _fileno(self):
+        try: return self.file.fileno()
+        except (AttributeError, OSError, ValueError): return None
+
+    def _mapped(self):
+        fileno = self._fileno()
+        if fileno is None or os.fstat(fileno).st_size <= self.start:
+            return None
+        try: self.map = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError): return None
+        return memoryview(self.map)[self.start:]
+
+    def _size(self) -> int:
+        fileno = self._fileno()
+        if fileno is not None:
+            return os.fstat(fileno).st_size - self.start
+        end = self.file.seek(0, os.SEEK_END)
+        self.file.seek(self.start)
+        return end - self.start
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self.progress is None:
+            yield from self._chunks()
+            return
+        sent = 0
+        for chunk in self._chunks():
+            yield chunk
+            sent += len(chunk)
+            self.progress(sent, self.length)
+
+    def _chunks(self) -> Iterator[bytes]:
+        if self.view is not None:
+            for offset in range(0, self.length, self.chunkSize):
+                yield self.view[offset:offset + self.chunkSize]
+            return
+        self.file.seek(self.start)
+        while True:
+            chunk = self.file.read(self.chunkSize)
+            if not chunk:
+                return
+            yield chunk
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for chunk in self:
+            yield chunk
+
+    def sha256(self) -> str:
+        """Content hash computed chunk by chunk, see `lib.media`."""
+        digest = sha256()
+        for chunk in self._chunks():
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def close(self):
+        if self.map is not None:
+            try:
+                self.view.release()
+                self.map.close()
+            except BufferError:
+                pass  # a chunk is still referenced somewhere, the map is closed once it is collected
+            self.map = None
+        if self.owned:
+            self.file.close()
+
+    def __enter__(self) -> "MediaStream":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+
+class InlineBody(MediaStream):
+    """
+    JSON body of a message whose `field` is a MediaStream sent inline as base64
+    (`send_message(file=...)`).
+
+    The base64 text is encoded chunk by chunk straight into one preallocated buffer,
+    and the NDC-MSG-SIG signature is computed over the same chunks as they are
+    written. The body is then the only copy held (about 4/3 of the file) instead of
+    the raw bytes, the base64 bytes, its str and the dumped json, and it is sent
+    like any other MediaStream. The base64 is written as is, without the `\\/` ujson
+    would escape its slashes with, both being the same json.
+    """
+
+    placeholder = "samino:inline-media"
+
+    def __init__(self, data: dict, field: str, media: MediaStream, chunkSize: int = CHUNK):
+        text = dumps({**data, field: self.placeholder}).encode()
+        head, _, tail = text.rpartition(b'"%s"' % self.placeholder.encode())
+
+        self.body = bytearray(len(head) + 4 * ((len(media) + 2) // 3) + len(tail) + 2)
+        self.signature = generateStreamSig(self._write(self._pieces(head, media, tail)))
+        MediaStream.__init__(self, self.body, chunkSize)
+
+    @staticmethod
+    def _pieces(head: bytes, media: MediaStream, tail: bytes) -> Iterator[bytes]:
+        yield head + b'"'
+        carry = b""
+        for chunk in media:
+            # base64 pads every call, only whole 3 byte groups are encoded until the end
+            if carry: chunk = carry + chunk
+            cut = len(chunk) - len(chunk) % 3
+            yield b2a_base64(chunk[:cut], newline=False)
+            carry = bytes(chunk[cut:])
+        if carry: yield b2a_base64(carry, newline=False)
+        yield b'"' + tail
+
+    def _write(self, pieces: Iterator[bytes]) -> Iterator[bytes]:
+        offset = 0
+        for piece in pieces:
+            self.body[offset:offset + len(piece)] = piece
+            offset += len(piece)
+            yield piece
+
+
+def isMediaValue(value) -> bool:
+    """Whether `value` is the url of something uploaded already rather than something to upload."""
+    return isinstance(value, str) and value.startswith(("http://", "https://"))
+
+
+def uploadKey(source: MediaSource, fileType: str) -> Tuple[tuple, int]:
+    """Identity of an upload (the content hash) and its size. File objects are left where they were."""
+    position = source.tell() if hasattr(source, "seek") else None
+    with MediaStream(source) as stream:
+        key = (fileType, stream.sha256())
+        size = len(stream)
+    if position is not None: source.seek(position)
+    return key, size
+
+
+class UploadJob:
+    def __init__(self, source: MediaSource, fileType: str, future):
+        self.source = source
+        self.fileType = fileType
+        self.future = future
+        self.callbacks = []
+
+    @property
+    def failed(self) -> bool:
+        return self.future.done() and (self.future.cancelled() or self.future.exception() is not None)
+
+    def report(self, sent: int, total: int):
+        for callback in self.callbacks:
+            callback(sent, total)
+
+    def stream(self) -> MediaStream:
+        stream = MediaStream(self.source)
+        stream.progress = self.report
+        return stream
+
+
+class UploadQueue:
+    """Queued uploads of UploadManager and AUploadManager, by priority, identical inputs sharing one job."""
+
+    def __init__(self, upload: Callable, workers: int = 4, smallSize: int = SMALL):
+        self.upload = upload
+        self.workers = workers
+        self.smallSize = smallSize
+        self.lock = threading.Lock()
+        self.pending = []
+        self.jobs = {}
+        self.order = itertools.count()
+
+    def _queue(self, source: MediaSource, fileType: str, priority: int, progress, future,
+               identity: Tuple[tuple, int] = None) -> Tuple[UploadJob, bool]:
+        """The job for `source`, queued unless an identical one exists, and whether it is new."""
+        key, size = identity or uploadKey(source, fileType)
+        with self.lock:
+            job = self.jobs.get(key)
+            new = job is None or job.failed
+            if new:
+                job = self.jobs[key] = UploadJob(source, fileType, future())
+                job.future.add_done_callback(lambda _, key=key, job=job: self._forget(key, job))
+                if priority is None: priority = INTERACTIVE if size <= self.smallSize else BULK
+                heapq.heappush(self.pending, (priority, next(self.order), job))
+            if progress: job.callbacks.append(progress)
+        return job, new
+
+    def _next(self) -> UploadJob:
+        with self.lock:
+            return heapq.heappop(self.pending)[2]
+
+    def _forget(self, key: tuple, job: UploadJob):
+        """Finished jobs let go of their source, `lib.media` is what remembers past uploads."""
+        with self.lock:
+            if self.jobs.get(key) is job:
+                del self.jobs[key]
+
+
+class UploadManager(UploadQueue):
+    """
+    Runs media uploads on `workers` threads, so a post with several images waits for
+    the slowest upload instead of the sum of them.
+
+        uploads = UploadManager(local.upload_media)
+        pages = [uploads.submit(path, priority=BULK) for path in paths]
+        icon = uploads.submit("icon.png").result()  # starts before the queued pages
+
+    - `upload(stream, fileType)` does one upload and returns its mediaValue.
+    - The same bytes submitted again for the same fileType while the first upload is
+      queued or running share it and its future. Finished uploads are forgotten along
+      with their input, the clients' upload functions remember them in `lib.media`.
+    - Queued uploads start lowest priority first. Without a priority, inputs up to
+      `smallSize` bytes are INTERACTIVE and larger ones BULK.
+    - `progress(sent, total)` is called as the chunks go out.
+
+    File objects are read when their upload starts and must stay open until then.
+    """
+
+    def __init__(self, upload: Callable[[MediaStream, str], str], workers: int = 4, smallSize: int = SMALL):
+        UploadQueue.__init__(self, upload, workers, smallSize)
+        self.pool = None
+
+    def submit(self, source: MediaSource, fileType: str = "image", priority: int = None,
+               progress: Callable[[int, int], None] = None) -> Future:
+        job, new = self._queue(source, fileType, priority, progress, Future)
+        if new:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="samino-upload")
+            # each run takes whichever queued job comes first, not necessarily this one
+            self.pool.submit(self._run)
+        return job.future
+
+    def upload_all(self, sources: List[MediaSource], fileType: str = "image", priority: int = None,
+                   progress: Callable[[int, int], None] = None) -> List[str]:
+        """Uploads `sources` at the same time, returns their mediaValues in order."""
+        futures = [self.submit(source, fileType, priority, progress) for source in sources]
+        return [future.result() for future in futures]
+
+    def _run(self):
+        job = self._next()
+        if not job.future.set_running_or_notify_cancel():
+            return
+        try:
+            with job.stream() as stream:
+                job.future.set_result(self.upload(stream, job.fileType))
+        except Exception as error:
+            job.future.set_exception(error)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+
+    def __enter__(self) -> "UploadManager":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class AUploadManager(UploadQueue):
+    """UploadManager for coroutine `upload` functions, at most `workers` uploads run as tasks at once."""
+
+    def __init__(self, upload: Callable[[MediaStream, str], Awaitable[str]], workers: int = 4, smallSize: int = SMALL):
+        UploadQueue.__init__(self, upload, workers, smallSize)
+        self.slots: asyncio.Semaphore = None
+        self.tasks = set()
+
+    def submit(self, source: MediaSource, fileType: str = "image", priority: int = None,
+               progress: Callable[[int, int], None] = None) -> asyncio.Future:
+        return self._task(self._submit(source, fileType, priority, progress))
+
+    async def _submit(self, source: MediaSource, fileType: str, priority: int, progress) -> str:
+        loop = asyncio.get_running_loop()
+        # hashing reads the whole input, off the loop
+        identity = await loop.run_in_executor(None, uploadKey, source, fileType)
+        job, new = self._queue(source, fileType, priority, progress, loop.create_future, identity)
+        if new:
+            if self.slots is None: self.slots = asyncio.Semaphore(self.workers)
+            self._task(self._run())
+        # shared with identical submits, one caller giving up must not cancel it for the others
+        return await asyncio.shield(job.future)
+
+    def _task(self, coroutine) -> asyncio.Task:
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def upload_all(self, sources: List[MediaSource], fileType: str = "image", priority: int = None,
+                         progress: Callable[[int, int], None] = None) -> List[str]:
+        """Uploads `sources` at the same time, returns their mediaValues in order."""
+        return list(await asyncio.gather(*[self.submit(source, fileType, priority, progress) for source in sources]))
+
+    async def _run(self):
+        async with self.slots:
+            job = self._next()
+            if job.future.done():
+                return
+            try:
+                with job.stream() as stream:
+                    result = await self.upload(stream, job.fileType)
+            except Exception as error:
+                if not job.future.done(): job.future.set_exception(error)
+            else:
+                if not job.future.done(): job.future.set_result(result)
+
+    async def close(self):
+        while self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def __aenter__(self) -> "AUploadManager":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
@@ -1,22 +1,52 @@
 import base64
 import hashlib
 import hmac
+import json
+import os
 from uuid import uuid4
 
 # tapjoy = "https://ads.tapdaq.com/v4/analytics/reward"
-webApi = "https://aminoapps.com/api{}".format
-api = "https://service.aminoapps.com/api/v1{}".format
+# base urls can be pointed somewhere else (e.g. samino.mock.MockServer) with setBaseUrls or the env vars
+apiUrl = os.environ.get("SAMINO_API_URL", "https://service.aminoapps.com/api/v1")
+webUrl = os.environ.get("SAMINO_WEB_URL", "https://aminoapps.com/api")
+socketUrl = os.environ.get("SAMINO_SOCKET_URL", "wss://ws1.narvii.com")
 
 
+def api(url: str):
+    return f"{apiUrl}{url}"
+
+def webApi(url: str):
+    return f"{webUrl}{url}"
+
+def setBaseUrls(api: str = None, web: str = None, socket: str = None):
+    global apiUrl, webUrl, socketUrl
+
+    if api: apiUrl = api.rstrip("/")
+    if web: webUrl = web.rstrip("/")
+    if socket: socketUrl = socket.rstrip("/")
+
+
+sigKey = bytes.fromhex("dfa5ed192dda6e88a12fe12130dc6206b1251e44")
+
 def generateSig(data: str):
     return base64.b64encode(
-        bytes.fromhex("19") + hmac.new(bytes.fromhex("dfa5ed192dda6e88a12fe12130dc6206b1251e44"),
+        bytes.fromhex("19") + hmac.new(sigKey,
         data.encode(),
         hashlib.sha1).digest()
     ).decode()
 
+def generateStreamSig(chunks):
+    """generateSig of a body given as an iterable of bytes-like chunks."""
+    mac = hmac.new(sigKey, digestmod=hashlib.sha1)
+    for chunk in chunks:
+        mac.update(chunk)
+    return base64.b64encode(bytes.fromhex("19") + mac.digest()).decode()
+
 def generateDevice():
-    data = uuid4().bytes
+    return deviceFor(uuid4().bytes)
+
+def deviceFor(data: bytes):
+    """The device id of a 16 byte identifier, see `lib.devices`."""
     return (
         "19" + data.hex() +
         hmac.new(bytes.fromhex("e7309ecc0953c6fa60005b2765f99dbbc965c8e9"),
@@ -26,3 +56,10 @@ def generateDevice():
 
 def uuidString():
     return str(uuid4())
+
+def sidPayload(sid: str) -> dict:
+    """The json inside a sid: "2" is the account uid, "5" the unix time it was issued."""
+    sid = sid.replace("sid=", "")
+    decoded = base64.b64decode(
+        (sid.encode() + b'=' * (-len(sid) % 4)).decode().replace('-', '+').replace('_', '/'))
+    return json.loads(decoded[decoded.index(b"{"):decoded.index(b"}") + 1].decode("utf-8"))
@@ -1,21 +1,32 @@
 import os
-from base64 import b64encode
 from binascii import hexlify
 from time import time as timestamp
 from time import timezone as timezones
-from typing import Union, BinaryIO
+from typing import Callable, Union, BinaryIO
 from uuid import UUID
 
+from .lib.auth import Credentials
+from .lib.cache import metadata, profiles
+from .lib.hooks import hooks
+from .lib.media import media
 from .lib.objects import *
+from .lib.checkpoint import Checkpoint, CheckpointStore
+from .lib.bulk import bulkSend
+from .lib.chatsync import ChatSync
+from .lib.paging import items, nextToken, offsetPages, tokenPages, tokenParam
+from .lib.proxies import ProxyPool
 from .lib.sessions import Session
+from .lib.upload import InlineBody, MediaStream, UploadManager, isMediaValue
 
 
+@hooks.traceable
 class Local(Session):
-    def __init__(self, comId: str, proxies: dict = None):
+    def __init__(self, comId: str, proxies: Union[dict, ProxyPool] = None, credentials: Credentials = None):
         self.proxies = proxies
         self.comId = comId
 
-        Session.__init__(self, proxies=self.proxies)
+        Session.__init__(self, proxies=self.proxies, credentials=credentials)
+        self.uploads = UploadManager(self.upload_media)
 
     def get_video_rep_info(self, chatId: str):
         req = self.getRequest(
@@ -33,9 +44,10 @@ class Local(Session):
         req = self.postRequest(
             f"/x{self.comId}/s/chat/thread/{chatId}/member/{self.uid}"
         )
+        metadata.invalidate_thread(self.comId, chatId)
         return Json(req)
 
-    def upload_media(self, file: BinaryIO, fileType: str):
+    def upload_media(self, file: Union[BinaryIO, str, bytes], fileType: str):
         if fileType == "audio":
             fileType = "audio/aac"
         elif fileType == "image":
@@ -43,16 +55,35 @@ class Local(Session):
         else:
             raise TypeError(fileType)
 
-        data = file.read()
-        newHeaders = {"content-type": fileType, "content-length": str(len(data))}
+        with MediaStream.of(file) as data:
+            newHeaders = {"content-type": fileType, "content-length": str(len(data))}
 
-        req = self.postRequest("/g/s/media/upload", data=data, newHeaders=newHeaders)
-        return req["mediaValue"]
+            return media.upload(data, f"upload:{fileType}", lambda: self.postRequest(
+                "/g/s/media/upload", data=data, newHeaders=newHeaders
+            )["mediaValue"])
+
+    def upload_medias(self, files: list, fileType: str = "image", progress: Callable[[int, int], None] = None):
+        """
+        Uploads `files` at the same time through `self.uploads` (see UploadManager).
+
+        - progress (Callable, optional): called with (sent, total) bytes of each upload.
+
+        Returns their mediaValues, in order.
+        """
+        return self.uploads.upload_all(files, fileType, progress=progress)
+
+    def media_list(self, media: Union[list, str, BinaryIO]):
+        """mediaList of a blog from mediaValues and files, the files uploaded at the same time."""
+        media = media if isinstance(media, list) else [media]
+        values = [value if isMediaValue(value) else self.uploads.submit(value, "image") for value in media]
+        return [[100, value if isinstance(value, str) else value.result(), None, "XYZ", None, {"fileName": "Amino"}]
+                for value in values]
 
     def leave_chat(self, chatId: str = None):
         req = self.deleteRequest(
             f"/x{self.comId}/s/chat/thread/{chatId}/member/{self.uid}"
         )
+        metadata.invalidate_thread(self.comId, chatId)
         return Json(req)
 
     def leave_chats(self, chatIds: Union[str, list]):
@@ -65,19 +96,21 @@ class Local(Session):
         req = self.getRequest(
             f"/x{self.comId}/s/user-profile/{userId}/joined?start={start}&size={size}"
         )
-        return UserProfileList(req["userProfileList"]).UserProfileList
+        return UserProfileList(profiles.listed(self.comId, req["userProfileList"])).UserProfileList
 
     def get_member_followers(self, userId: str = None, start: int = 0, size: int = 25):
         req = self.getRequest(
             f"/x{self.comId}/s/user-profile/{userId}/member?start={start}&size={size}"
         )
-        return UserProfileList(req["userProfileList"]).UserProfileList
+        return UserProfileList(profiles.listed(self.comId, req["userProfileList"])).UserProfileList
 
-    def get_chat_threads(self, start: int = 0, size: int = 25):
-        req = self.getRequest(
+    def get_chat_threads(self, start: int = 0, size: int = 25, cached: bool = True):
+        """
+        - cached (bool, optional): answer from the metadata cache when it is enabled, see `lib.cache`.
+        """
+        return metadata.get(metadata.threadsKey(self.comId, start, size, self.uid), lambda: self.getRequest(
             f"/x{self.comId}/s/chat/thread?type=joined-me&start={start}&size={size}"
-        )
-        return ThreadList(req["threadList"]).ThreadList
+        )["threadList"], lambda x: ThreadList(x).ThreadList, cached)
 
     def get_member_visitors(self, userId: str, start: int = 0, size: int = 25):
         req = self.getRequest(
@@ -85,14 +118,24 @@ class Local(Session):
         )
         return VisitorsList(req["visitors"]).VisitorsList
 
-    def get_chat_messages(self, chatId: str, size: int = 25):
+    def get_chat_messages(self, chatId: str, size: int = 25, pageToken: str = None):
+        """
+        - pageToken (str, optional): `nextPageToken` of the previous page, walks the history backwards.
+        """
         req = self.getRequest(
-            f"/x{self.comId}/s/chat/thread/{chatId}/message?v=2&pagingType=t&size={size}"
+            f"/x{self.comId}/s/chat/thread/{chatId}/message?v=2&pagingType=t&size={size}{tokenParam(pageToken)}"
         )
-        return MessageList(req["messageList"]).MessageList
-
-    def get_user_info(self, userId: str):
+        return GetMessages(req).GetMessages
+
+    def get_user_info(self, userId: str, cached: bool = True):
+        """
+        - cached (bool, optional): answer from the profile cache when it is enabled, see `lib.cache`.
+        """
+        if cached and profiles.enabled:
+            profile = profiles.get(self.comId, userId)
+            if profile: return profile
         req = self.getRequest(f"/x{self.comId}/s/user-profile/{userId}")
+        if profiles.enabled: return profiles.put(self.comId, req["userProfile"])
         return UserProfile(req["userProfile"]).UserProfile
 
     def get_user_blogs(self, userId: str, start: int = 0, size: int = 25):
@@ -111,23 +154,27 @@ class Local(Session):
         req = self.getRequest(
             f"/x{self.comId}/s/user-profile?type={usersType}&start={start}&size={size}"
         )
-        return UserProfileList(req["userProfileList"]).UserProfileList
+        return UserProfileList(profiles.listed(self.comId, req["userProfileList"])).UserProfileList
 
     def get_chat_members(self, start: int = 0, size: int = 25, chatId: str = None):
         req = self.getRequest(
             f"/x{self.comId}/s/chat/thread/{chatId}/member?start={start}&size={size}&type=default&cv=1.2"
         )
-        return UserProfileList(req["memberList"]).UserProfileList
+        return UserProfileList(profiles.listed(self.comId, req["memberList"])).UserProfileList
 
-    def get_chat_info(self, chatId: str):
-        req = self.getRequest(f"/x{self.comId}/s/chat/thread/{chatId}")
-        return Thread(req["thread"]).Thread
+    def get_chat_info(self, chatId: str, cached: bool = True):
+        """
+        - cached (bool, optional): answer from the metadata cache when it is enabled, see `lib.cache`.
+        """
+        return metadata.get(metadata.threadKey(self.comId, chatId, self.uid), lambda: self.getRequest(
+            f"/x{self.comId}/s/chat/thread/{chatId}"
+        )["thread"], lambda x: Thread(x).Thread, cached)
 
     def get_online_users(self, start: int = 0, size: int = 25):
         req = self.getRequest(
             f"/x{self.comId}/s/live-layer?topic=ndtopic:x{self.comId}:online-members&start={start}&size={size}"
         )
-        return UserProfileList(req["userProfileList"]).UserProfileList
+        return UserProfileList(profiles.listed(self.comId, req["userProfileList"])).UserProfileList
 
     def get_public_chats(
             self, filterType: str = "recommended", start: int = 0, size: int = 50
@@ -149,13 +196,13 @@ class Local(Session):
             stickerId: str = None,
             snippetLink: str = None,
             ytVideo: str = None,
-            snippetImage: BinaryIO = None,
+            snippetImage: Union[str, BinaryIO] = None,
             embedId: str = None,
             embedType: int = None,
             embedLink: str = None,
             embedTitle: str = None,
             embedContent: str = None,
-            embedImage: BinaryIO = None,
+            embedImage: Union[str, BinaryIO] = None,
     ):
 
         data = {
@@ -179,9 +226,14 @@ class Local(Session):
                 mentions.append({"uid": mentionUserIds})
         data["extensions"] = {"mentionedArray": mentions}
 
+        # the embed and snippet images upload at the same time through self.uploads
+        if embedImage and not isMediaValue(embedImage):
+            embedImage = self.uploads.submit(embedImage, "image")
+        if snippetLink and snippetImage and not isMediaValue(snippetImage):
+            snippetImage = self.uploads.submit(snippetImage, "image")
+
         if embedImage:
-            embedImage = [[100, embedImage, None]] if not isinstance(embedImage, str) else [
-                [100, self.upload_media(embedImage, "image"), None]]
+            embedImage = [[100, embedImage if isinstance(embedImage, str) else embedImage.result(), None]]
             data["attachedObject"] = {
                 "objectId": embedId,
                 "objectType": embedType,
@@ -202,8 +254,7 @@ class Local(Session):
                 {
                     "link": snippetLink,
                     "mediaType": 100,
-                    "mediaUploadValue": b64encode(snippetImage.read()).decode(),
-                    "mediaUploadValueContentType": "image/png",
+                    "mediaValue": snippetImage if isinstance(snippetImage, str) else snippetImage.result(),
                 }
             ]}})
 
@@ -219,10 +270,16 @@ class Local(Session):
                     {"mediaType": 100, "mediaUploadValueContentType": f"image/{fileType}", "mediaUhqEnabled": False})
             else:
                 raise TypeError(fileType)
-            data.update(
-                {"mediaUploadValue": b64encode(file.read()).decode(), "attachedObject": None, "extensions": None})
+            data.update({"attachedObject": None, "extensions": None})
+            with MediaStream(file) as raw:
+                digest = media.digest(raw) if media.enabled else None
+                known = media.get(digest, f"message:{fileType}") if digest else None
+                if known: data["mediaValue"] = known  # uploaded before, no need to inline it again
+                else: data = InlineBody(data, "mediaUploadValue", raw)  # encoded and signed in place, see lib.upload
 
         req = self.postRequest(f"/x{self.comId}/s/chat/thread/{chatId}/message", data)
+        if file and digest and not known:
+            media.put(digest, f"message:{fileType}", req["message"].get("mediaValue"), len(raw))
         return Json(req)
 
     def send_web_message(
@@ -345,6 +402,7 @@ class Local(Session):
             data["extensions"]["style"]["backgroundMediaList"].append([100, backgroundImage, None, None, None])
 
         req = self.postRequest(f"/x{self.comId}/s/user-profile/{self.uid}", data)
+        profiles.invalidate(self.comId, self.uid)
         return Json(req)
 
     def edit_chat(self, chatId: str, doNotDisturb: bool = None, pinChat: bool = None, title: str = None,
@@ -407,6 +465,7 @@ class Local(Session):
 
         response = self.postRequest(f"/x{self.comId}/s/chat/thread/{chatId}", data=data)
         res.append(Json(response))
+        metadata.invalidate_thread(self.comId, chatId)
         return res
 
     def like_blog(self, blogId: str = None, wikiId: str = None):
@@ -868,7 +927,7 @@ class Local(Session):
         )
         return Json(req)
 
-    def post_blog(self, title: str, content: str, fansOnly: bool = False):
+    def post_blog(self, title: str, content: str, fansOnly: bool = False, media: Union[list, str, BinaryIO] = None):
         data = {
             "extensions": {"fansOnly": fansOnly},
             "content": content,
@@ -880,6 +939,8 @@ class Local(Session):
             "eventSource": "GlobalComposeMenu",
             "timestamp": int(timestamp() * 1000),
         }
+        if media:
+            data["mediaList"] = self.media_list(media)
 
         req = self.postRequest(f"/x{self.comId}/s/blog", data)
         return Json(req)
@@ -974,7 +1035,7 @@ class Local(Session):
             wikiId: str = None,
             fansOnly: bool = False,
             backgroundColor: str = None,
-            media: list = None,
+            media: Union[list, str, BinaryIO] = None,
     ):
         data = {
             "title": title,
@@ -986,7 +1047,7 @@ class Local(Session):
         }
 
         if media:
-            data["mediaList"] = [[100, media, None, "XYZ", None, {"fileName": "Amino"}]]
+            data["mediaList"] = self.media_list(media)
         if fansOnly:
             data["extensions"]["fansOnly"] = True
         if backgroundColor:
@@ -1165,7 +1226,7 @@ class Local(Session):
         req = self.getRequest(
             f"/x{self.comId}/s/user-profile?type=name&q={username}&start={start}&size={size}"
         )
-        return UserProfileList(req["userProfileList"]).UserProfileList
+        return UserProfileList(profiles.listed(self.comId, req["userProfileList"])).UserProfileList
 
     def search_blog(self, words: str, start: int = 0, size: int = 25):
         req = self.getRequest(
@@ -1207,7 +1268,7 @@ class Local(Session):
 
     def get_recent_blogs(self, pageToken: str = None, start: int = 0, size: int = 25):
         req = self.getRequest(
-            f"/x{self.comId}/s/feed/blog-all?pagingType=t&start={start}&size={size}"
+            f"/x{self.comId}/s/feed/blog-all?pagingType=t&start={start}&size={size}{tokenParam(pageToken)}"
         )
         return RecentBlogs(req["blogList"]).RecentBlogs
 
@@ -1278,3 +1339,160 @@ class Local(Session):
             f"/x{self.comId}/s/user-profile/{self.uid}/achievements"
         )
         return Achievements(req)
+
+    def iter_member_following(self, userId: str = None, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        """
+        Streams UserProfile objects page by page, stops on the first short page.
+
+        - limit (int, optional): Stop after this many users. Defaults to every user.
+
+        - prefetch (int, optional): Keep this many pages in flight at once (threads, or tasks for the async clients),
+          adapting to latency and rate limits. Defaults to 0, one page at a time.
+
+        - checkpoint (Checkpoint, optional): Resume from, and keep saving to, a CheckpointStore entry.
+        """
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/x{self.comId}/s/user-profile/{userId}/joined?start={start}&size={size}"
+        )["userProfileList"], start, size, prefetch, checkpoint), lambda x: profiles.build(self.comId, x), limit)
+
+    def iter_member_followers(self, userId: str = None, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/x{self.comId}/s/user-profile/{userId}/member?start={start}&size={size}"
+        )["userProfileList"], start, size, prefetch, checkpoint), lambda x: profiles.build(self.comId, x), limit)
+
+    def iter_all_users(self, usersType: str = "recent", start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/x{self.comId}/s/user-profile?type={usersType}&start={start}&size={size}"
+        )["userProfileList"], start, size, prefetch, checkpoint), lambda x: profiles.build(self.comId, x), limit)
+
+    def iter_online_users(self, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/x{self.comId}/s/live-layer?topic=ndtopic:x{self.comId}:online-members&start={start}&size={size}"
+        )["userProfileList"], start, size, prefetch, checkpoint), lambda x: profiles.build(self.comId, x), limit)
+
+    def iter_search_user(self, username: str, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/x{self.comId}/s/user-profile?type=name&q={username}&start={start}&size={size}"
+        )["userProfileList"], start, size, prefetch, checkpoint), lambda x: profiles.build(self.comId, x), limit)
+
+    def iter_chat_members(self, chatId: str, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/x{self.comId}/s/chat/thread/{chatId}/member?start={start}&size={size}&type=default&cv=1.2"
+        )["memberList"], start, size, prefetch, checkpoint), lambda x: profiles.build(self.comId, x), limit)
+
+    def iter_chat_threads(self, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/x{self.comId}/s/chat/thread?type=joined-me&start={start}&size={size}"
+        )["threadList"], start, size, prefetch, checkpoint), lambda x: Thread(x).Thread, limit)
+
+    def iter_public_chats(self, filterType: str = "recommended", start: int = 0, size: int = 50, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/x{self.comId}/s/chat/thread?type=public-all&filterType={filterType}&start={start}&size={size}"
+        )["threadList"], start, size, prefetch, checkpoint), lambda x: Thread(x).Thread, limit)
+
+    def iter_user_blogs(self, userId: str, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/x{self.comId}/s/blog?type=user&q={userId}&start={start}&size={size}"
+        )["blogList"], start, size, prefetch, checkpoint), lambda x: Blog(x).Blog, limit)
+
+    def iter_user_wikis(self, userId: str, start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/x{self.comId}/s/item?type=user-all&start={start}&size={size}&cv=1.2&uid={userId}"
+        )["itemList"], start, size, prefetch, checkpoint), lambda x: Wiki(x).Wiki, limit)
+
+    def iter_blogs_all(self, start: int = 0, size: int = 25, pagingType: str = "t", limit: int = None, prefetch: int = 0,
+            checkpoint: Checkpoint = None):
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/x{self.comId}/s/feed/blog-all?pagingType={pagingType}&start={start}&size={size}"
+        )["blogList"], start, size, prefetch, checkpoint), lambda x: Blog(x).Blog, limit)
+
+    def iter_recent_blogs(self, pageToken: str = None, size: int = 25, limit: int = None, checkpoint: Checkpoint = None):
+        """
+        Streams Blog objects by following `nextPageToken`.
+
+        - pageToken (str, optional): Resume from a token handed out by a previous listing.
+        """
+        def fetch(pageToken, size):
+            req = self.getRequest(f"/x{self.comId}/s/feed/blog-all?pagingType=t&size={size}{tokenParam(pageToken)}")
+            return req["blogList"], nextToken(req)
+
+        yield from items(tokenPages(fetch, pageToken, size, checkpoint), lambda x: Blog(x).Blog, limit)
+
+    def iter_chat_messages(self, chatId: str, pageToken: str = None, size: int = 25, limit: int = None, checkpoint: Checkpoint = None):
+        """Streams Message objects from the newest one backwards."""
+        def fetch(pageToken, size):
+            req = self.getRequest(
+                f"/x{self.comId}/s/chat/thread/{chatId}/message?v=2&pagingType=t&size={size}{tokenParam(pageToken)}"
+            )
+            return req["messageList"], nextToken(req)
+
+        yield from items(tokenPages(fetch, pageToken, size, checkpoint), lambda x: Message(x).Message, limit)
+
+    def iter_notifications(self, pageToken: str = None, size: int = 25, limit: int = None, checkpoint: Checkpoint = None):
+        """Streams raw notification dicts, there is no single notification object."""
+        def fetch(pageToken, size):
+            req = self.getRequest(f"/x{self.comId}/s/notification?pagingType=t&size={size}{tokenParam(pageToken)}")
+            return req["notificationList"], nextToken(req)
+
+        yield from items(tokenPages(fetch, pageToken, size, checkpoint), limit=limit)
+
+    def iter_wall_comments(self, userId: str, sorting: str = "newest", start: int = 0, size: int = 25, limit: int = None,
+            prefetch: int = 0, checkpoint: Checkpoint = None):
+        """Streams the raw comment dicts of a profile wall, oldest or newest first depending on `sorting`."""
+        sorting = sorting.lower().replace("top", "vote")
+        if sorting not in ["newest", "oldest", "vote"]:
+            raise TypeError("Please insert a valid sorting")
+
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"/x{self.comId}/s/user-profile/{userId}/comment?sort={sorting}&start={start}&size={size}"
+        )["commentList"], start, size, prefetch, checkpoint), limit=limit)
+
+    def iter_blog_comments(self, wikiId: str = None, blogId: str = None, quizId: str = None, sorting: str = "newest",
+            start: int = 0, size: int = 25, limit: int = None, prefetch: int = 0, checkpoint: Checkpoint = None):
+        """Streams the raw comment dicts of a blog, quiz or wiki."""
+        sorting = sorting.lower().replace("top", "vote")
+        if sorting not in ["newest", "oldest", "vote"]:
+            raise TypeError("Please insert a valid sorting")
+
+        if quizId:
+            blogId = quizId
+        if blogId:
+            link = f"/x{self.comId}/s/blog/{blogId}/comment?sort={sorting}"
+        elif wikiId:
+            link = f"/x{self.comId}/s/item/{wikiId}/comment?sort={sorting}"
+        else:
+            raise TypeError("Please choose a wiki or a blog")
+
+        yield from items(offsetPages(lambda start, size: self.getRequest(
+            f"{link}&start={start}&size={size}"
+        )["commentList"], start, size, prefetch, checkpoint), limit=limit)
+
+    def sync_chat_messages(self, chatId: str, store: CheckpointStore, size: int = 100):
+        """
+        Incrementally mirrors a chat, see `ChatSync`. The first call walks the whole history,
+        later calls only yield messages newer than the ones already synced.
+        """
+        yield from ChatSync(self, chatId, store, size).run()
+
+    def send_messages(self, jobs: list, workers: int = 8, rate: float = None, retries: int = 3,
+                      stopOnError: bool = True):
+        """
+        Sends many messages at once, see `bulkSend`.
+
+        - jobs (list): (chatId, message) pairs, message being the text or a dict of `send_message` arguments.
+        - workers (int, optional): how many chats are sent to at the same time.
+        - rate (float, optional): messages per second across all chats.
+
+        Returns a SendResult per job, in order, with `.result` or `.error`.
+        """
+        return bulkSend(self.send_message, jobs, workers, rate, retries=retries, stopOnError=stopOnError)
@@ -0,0 +1,478 @@
+"""
+Local stand-in for the Amino REST API and websocket, for offline tests and load benchmarks.
+
+    with MockServer(latency=0.01, errorRate=0.05) as server:
+        server.use()  # points samino at the mock
+        local = samino.Local(server.comId)
+        local.get_all_users(size=100)
+
+Run `python -m samino.mock` to keep one running in the foreground.
+"""
+
+import asyncio
+import base64
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import parse_qs, urlsplit
+
+import ujson as json
+import websockets
+
+from .lib import util
+
+ERRORS = {
+    219: "Too many requests. Try again later.",
+    291: "Please wait a moment before trying again.",
+}
+
+
+def isoTime(stamp: float):
+    return datetime.fromtimestamp(stamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def fakeId(kind: str, index: int):
+    return f"{kind[:8]:0<8}-0000-4000-8000-{index:012d}"
+
+
+def fakeSid(uid: str):
+    # same layout the real sid uses, Headers.updateHeaders reads the uid from key "2"
+    payload = json.dumps({"0": 2, "1": None, "2": uid, "3": 0, "4": "127.0.0.1", "5": int(time.time()), "6": 100})
+    raw = b"\x02" + payload.encode() + bytes(20)
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+class HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 makes bursts of new connections (prefetching, benchmarks) wait on SYN retries
+    request_queue_size = 128
+
+
+class MockServer:
+    """
+    Threaded HTTP server answering the REST endpoints samino uses with generated
+    data, plus a websocket that pushes synthetic chat frames.
+
+    - latency (float, optional): Seconds added to every response.
+    - jitter (float, optional): Random extra latency, up to this many seconds.
+    - errorRate (float, optional): Probability of answering with one of `errorCodes` instead.
+    - errorCodes (tuple, optional): api:statuscodes used for injected errors, 219 and 291 by default.
+    - members (int, optional): Size of every generated member/follower listing.
+    - messages (int, optional): Length of every generated chat history.
+    """
+
+    def __init__(
+            self,
+            host: str = "127.0.0.1",
+            port: int = 0,
+            wsPort: int = 0,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            errorRate: float = 0.0,
+            errorCodes: tuple = (219, 291),
+            members: int = 1000,
+            messages: int = 500,
+            comId: int = 1,
+            seed: int = None
+    ):
+        self.host = host
+        self.port = port
+        self.wsPort = wsPort
+        self.latency = latency
+        self.jitter = jitter
+        self.errorRate = errorRate
+        self.errorCodes = errorCodes
+        self.members = members
+        self.messages = messages
+        self.comId = comId
+
+        self.random = random.Random(seed)
+        self.requests = Counter()
+        self.failures = []
+        self.routes = []
+        self.lock = threading.Lock()
+
+        self.http: HTTPServer = None
+        self.loop: asyncio.AbstractEventLoop = None
+        self.sockets = set()
+        self.threads = []
+        self.wsReady = threading.Event()
+        self.wsStop: asyncio.Event = None
+
+        self._defaultRoutes()
+
+    def __enter__(self) -> "MockServer":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    @property
+    def apiUrl(self):
+        return f"http://{self.host}:{self.port}/api/v1"
+
+    @property
+    def webUrl(self):
+        return f"http://{self.host}:{self.port}/api"
+
+    @property
+    def socketUrl(self):
+        return f"ws://{self.host}:{self.wsPort}"
+
+    def use(self):
+        """Point samino's base urls at this server."""
+        util.setBaseUrls(api=self.apiUrl, web=self.webUrl, socket=self.socketUrl)
+
+    def start(self):
+        self.http = HTTPServer((self.host, self.port), self._handlerClass())
+        self.port = self.http.server_address[1]
+        self.threads.append(threading.Thread(target=self.http.serve_forever, daemon=True))
+
+        self.threads.append(threading.Thread(target=lambda: asyncio.run(self._serveSocket()), daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+        self.wsReady.wait(10)
+        return self
+
+    def stop(self):
+        if self.http:
+            self.http.shutdown()
+            self.http.server_close()
+        if self.loop and self.wsStop:
+            self.loop.call_soon_threadsafe(self.wsStop.set)
+        for thread in self.threads:
+            thread.join(5)
+        self.threads.clear()
+
+    def fail_next(self, statusCode: int = 219, count: int = 1):
+        """Answer the next `count` requests with `statusCode`."""
+        with self.lock:
+            self.failures.extend([statusCode] * count)
+
+    def route(self, method: str, pattern: str, handler: Callable):
+        """
+        Register a canned response, checked before the built-in ones.
+        `handler(match, query, body)` returns the response dict, or a (httpStatus, dict) tuple.
+        """
+        self.routes.insert(0, (method.upper(), re.compile(pattern), handler))
+
+    # ------------------------------------------------------------------ generated data
+
+    def profile(self, index: int, comId=None):
+        uid = fakeId("user", index)
+        return {
+            "uid": uid,
+            "nickname": f"user{index}",
+            "level": index % 20 + 1,
+            "role": 0,
+            "reputation": index * 7,
+            "status": 0,
+            "icon": f"http://{self.host}:{self.port}/media/{uid}.jpg",
+            "ndcId": comId or 0,
+            "membershipStatus": 1,
+            "onlineStatus": 1,
+            "accountMembershipStatus": 0,
+            "isGlobal": comId is None,
+            "createdTime": isoTime(1500000000 + index * 60),
+            "modifiedTime": isoTime(1600000000 + index * 60),
+            "membersCount": index % 50,
+            "joinedCount": index % 30,
+            "content": f"bio of user{index}",
+            "extensions": {},
+        }
+
+    def message(self, chatId: str, index: int, comId=None):
+        """Message number `index` of a chat, 0 being the oldest."""
+        author = self.profile(index % max(self.members, 1), comId)
+        return {
+            "messageId": fakeId("msg", index),
+            "threadId": chatId,
+            "uid": author["uid"],
+            "author": {key: author[key] for key in ("uid", "nickname", "level", "role", "icon", "reputation")},
+            "content": f"message {index}",
+            "type": 0,
+            "mediaType": 0,
+            "clientRefId": index,
+            "isHidden": False,
+            "includedInSummary": True,
+            "createdTime": isoTime(1700000000 + index * 5),
+            "extensions": {},
+        }
+
+    def thread(self, chatId: str, comId=None):
+        return {
+            "threadId": chatId,
+            "ndcId": comId or 0,
+            "title": f"chat {chatId[-4:]}",
+            "icon": None,
+            "type": 2,
+            "status": 0,
+            "membersCount": self.members,
+            "uid": fakeId("user", 0),
+            "author": self.profile(0, comId),
+            "keywords": None,
+            "extensions": {"coHost": [], "announcement": None},
+            "latestActivityTime": isoTime(time.time()),
+        }
+
+    def community(self, comId):
+        return {
+            "ndcId": int(comId),
+            "name": f"community {comId}",
+            "endpoint": f"community{comId}",
+            "link": f"http://aminoapps.com/c/community{comId}",
+            "membersCount": self.members,
+            "status": 0,
+            "primaryLanguage": "en",
+            "createdTime": isoTime(1500000000),
+            "agent": self.profile(0, comId),
+        }
+
+    def frame(self, chatId: str = None, content: str = None, index: int = None):
+        """A websocket chatMessage frame (t=1000) as the real socket sends it."""
+        index = self.random.randrange(1 << 30) if index is None else index
+        chatId = chatId or fakeId("chat", 0)
+        message = self.message(chatId, index, self.comId)
+        message["createdTime"] = isoTime(time.time())
+        if content is not None:
+            message["content"] = content
+        return {"t": 1000, "o": {"ndcId": self.comId, "chatMessage": message, "alertOption": 1, "membershipStatus": 1}}
+
+    # ------------------------------------------------------------------ routes
+
+    def _ok(self, **data):
+        return {"api:statuscode": 0, "api:message": "OK", "api:duration": "0.001s",
+                "api:timestamp": isoTime(time.time()), **data}
+
+    def _page(self, query, total: int, build: Callable):
+        start = int(query.get("start", 0))
+        size = int(query.get("size", 25))
+        return [build(index) for index in range(start, min(start + size, total))]
+
+    @staticmethod
+    def _comId(scope: str):
+        return int(scope[1:]) if scope and scope.startswith("x") else None
+
+    def _defaultRoutes(self):
+        scope = r"/(?:g|(?P<scope>x\d+))/s"
+
+        def login(match, query, body):
+            uid = fakeId("user", 0)
+            return self._ok(sid=fakeSid(uid), auid=uid, secret=f"secret-{uid}",
+                            account={"uid": uid, "nickname": "user0", "aminoId": "user0", "email": body.get("email")})
+
+        def members(match, query, body):
+            comId = self._comId(match["scope"])
+            return self._ok(userProfileList=self._page(query, self.members, lambda i: self.profile(i, comId)))
+
+        def chatMessages(match, query, body):
+            size = int(query.get("size", 25))
+            offset = int(query["pageToken"][1:]) if query.get("pageToken") else 0
+            newest = self.messages - 1 - offset
+            page = [self.message(match["chatId"], index, self._comId(match["scope"]))
+                    for index in range(newest, max(newest - size, -1), -1)]
+            token = f"p{offset + size}" if offset + size < self.messages else None
+            return self._ok(messageList=page, paging={"nextPageToken": token, "prevPageToken": f"p{offset}"})
+
+        def sendMessage(match, query, body):
+            message = self.message(match["chatId"], self.random.randrange(1 << 30), self._comId(match["scope"]))
+            message.update(content=body.get("content"), type=body.get("type", 0), createdTime=isoTime(time.time()))
+            if body.get("mediaUploadValue"):
+                message["mediaValue"] = f"http://{self.host}:{self.port}/media/{self.random.randrange(1 << 48):x}.jpg"
+            elif body.get("mediaValue"):
+                message["mediaValue"] = body["mediaValue"]
+            return self._ok(message=message)
+
+        def comments(match, query, body):
+            return self._ok(commentList=self._page(query, self.members, lambda i: {
+                "commentId": fakeId("comment", i), "content": f"comment {i}", "author": self.profile(i),
+                "createdTime": isoTime(1700000000 - i * 60), "votedValue": 0, "votesSum": i % 5}))
+
+        def blogs(match, query, body):
+            start = int(query["pageToken"][1:]) if query.get("pageToken") else int(query.get("start", 0))
+            page = self._page({**query, "start": start}, self.members, lambda i: {
+                "blogId": fakeId("blog", i), "title": f"blog {i}", "content": "...", "author": self.profile(i),
+                "createdTime": isoTime(1700000000 - i * 60)})
+            token = f"p{start + len(page)}" if page else None
+            return self._ok(blogList=page, paging={"nextPageToken": token})
+
+        def linkResolution(match, query, body):
+            link = query.get("q") or body.get("objectId", "")
+            if "dead" in link:
+                return 400, {"api:statuscode": 107, "api:message": "The requested data does not exist."}
+            objectId = fakeId("object", sum(map(ord, link)))
+            info = {"objectId": objectId, "objectType": 12, "shortUrl": link, "targetCode": 1,
+                    "ndcId": self.comId, "fullPath": f"/x{self.comId}/chat/thread/{objectId}"}
+            return self._ok(linkInfoV2={"path": info["fullPath"], "extensions": {
+                "linkInfo": info, "community": self.community(self.comId)}})
+
+        self.routes.extend([
+            ("POST", re.compile(r"/g/s/auth/login$"), login),
+            ("GET", re.compile(r"/g/s/account$"), lambda m, q, b: self._ok(
+                account={"uid": fakeId("user", 0), "nickname": "user0", "aminoId": "user0"})),
+            ("GET", re.compile(scope + r"/user-profile$"), members),
+            ("GET", re.compile(scope + r"/user-profile/(?P<uid>[^/]+)/(?:joined|member)$"), members),
+            ("GET", re.compile(scope + r"/live-layer$"), members),
+            ("GET", re.compile(scope + r"/user-profile/(?P<uid>[^/]+)$"), lambda m, q, b: self._ok(
+                userProfile={**self.profile(int(m["uid"][-12:]) if m["uid"][-12:].isdigit() else 0,
+                                            self._comId(m["scope"])), "uid": m["uid"]})),
+            ("GET", re.compile(scope + r"/chat/thread/(?P<chatId>[^/]+)/message$"), chatMessages),
+            ("POST", re.compile(scope + r"/chat/thread/(?P<chatId>[^/]+)/message$"), sendMessage),
+            ("GET", re.compile(scope + r"/chat/thread/(?P<chatId>[^/]+)/member$"), lambda m, q, b: self._ok(
+                memberList=self._page(q, self.members, lambda i: self.profile(i, self._comId(m["scope"]))))),
+            ("GET", re.compile(scope + r"/chat/thread/(?P<chatId>[^/]+)$"), lambda m, q, b: self._ok(
+                thread=self.thread(m["chatId"], self._comId(m["scope"])))),
+            ("GET", re.compile(scope + r"/chat/thread$"), lambda m, q, b: self._ok(threadList=self._page(
+                q, 100, lambda i: self.thread(fakeId("chat", i), self._comId(m["scope"]))))),
+            ("GET", re.compile(r"/g/s-x(?P<comId>\d+)/community/info$"), lambda m, q, b: self._ok(
+                community=self.community(m["comId"]))),
+            ("GET", re.compile(scope + r"/(?:blog|item|user-profile)/[^/]+/(?:g-)?comment$"), comments),
+            ("GET", re.compile(scope + r"/feed/blog-all$"), blogs),
+            ("GET", re.compile(r"/g/s(?:-x\d+)?/link-resolution$"), linkResolution),
+            ("POST", re.compile(r"/g/s(?:-x\d+)?/link-resolution$"), linkResolution),
+            ("POST", re.compile(r"/(?:g|x\d+)/s/media/upload.*$"), lambda m, q, b: self._ok(
+                mediaValue=f"http://{self.host}:{self.port}/media/{self.random.randrange(1 << 48):x}.jpg")),
+        ])
+
+    def _respond(self, method: str, path: str, query: dict, body: dict):
+        delay = self.latency + (self.random.random() * self.jitter if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        with self.lock:
+            # handlers run on their own threads, Counter increments are not atomic
+            self.requests[f"{method} {path}"] += 1
+            injected = self.failures.pop(0) if self.failures else None
+        if injected is None and self.errorRate and self.random.random() < self.errorRate:
+            injected = self.random.choice(self.errorCodes)
+        if injected is not None:
+            return 400, {"api:statuscode": injected, "api:message": ERRORS.get(injected, "Injected error.")}
+
+        for routeMethod, pattern, handler in self.routes:
+            match = pattern.match(path) if routeMethod == method else None
+            if match:
+                result = handler(match, query, body)
+                return result if isinstance(result, tuple) else (200, result)
+
+        return 200, self._ok()
+
+    def _handlerClass(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except ConnectionError:
+                    pass  # the client hung up, e.g. a cancelled prefetch
+
+            def handle_one(self, method: str):
+                url = urlsplit(self.path)
+                path = re.sub(r"^/api(?:/v1)?", "", url.path)
+                query = {key: value[-1] for key, value in parse_qs(url.query).items()}
+
+                raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                try:
+                    body = json.loads(raw) if raw and raw[:1] in (b"{", b"[") else {}
+                except ValueError:
+                    body = {}
+
+                status, data = server._respond(method, path, query, body if isinstance(body, dict) else {})
+                payload = json.dumps(data).encode()
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self.handle_one("GET")
+
+            def do_POST(self):
+                self.handle_one("POST")
+
+            def do_DELETE(self):
+                self.handle_one("DELETE")
+
+        return Handler
+
+    # ------------------------------------------------------------------ websocket
+
+    async def _serveSocket(self):
+        self.loop = asyncio.get_running_loop()
+        self.wsStop = asyncio.Event()
+
+        async with websockets.serve(self._socketHandler, self.host, self.wsPort) as server:
+            self.wsPort = list(server.sockets)[0].getsockname()[1]
+            self.wsReady.set()
+            await self.wsStop.wait()
+
+    async def _socketHandler(self, socket, *args):
+        self.sockets.add(socket)
+        try:
+            async for _ in socket:
+                pass  # actions sent by the client are accepted and ignored
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self.sockets.discard(socket)
+
+    async def _broadcast(self, frames: list, interval: float):
+        for frame in frames:
+            data = json.dumps(frame)
+            for socket in list(self.sockets):
+                try:
+                    await socket.send(data)
+                except websockets.exceptions.ConnectionClosed:
+                    self.sockets.discard(socket)
+            if interval:
+                await asyncio.sleep(interval)
+
+    def emit(self, frame: dict):
+        """Send one frame to every connected socket."""
+        asyncio.run_coroutine_threadsafe(self._broadcast([frame], 0), self.loop).result()
+
+    def stream(self, count: int, rate: float = None, chatId: str = None, wait: bool = True):
+        """Push `count` synthetic chat messages, `rate` per second or as fast as possible."""
+        frames = [self.frame(chatId) for _ in range(count)]
+        future = asyncio.run_coroutine_threadsafe(self._broadcast(frames, 1 / rate if rate else 0), self.loop)
+        return future.result() if wait else future
+
+    def wait_for_socket(self, count: int = 1, timeout: float = 10):
+        deadline = time.monotonic() + timeout
+        while len(self.sockets) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return len(self.sockets) >= count
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="samino mock Amino server")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--ws-port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with MockServer(port=args.port, wsPort=args.ws_port, latency=args.latency, errorRate=args.error_rate) as mock:
+        print(f"api: {mock.apiUrl}\nweb: {mock.webUrl}\nsocket: {mock.socketUrl}")
+        print(f"export SAMINO_API_URL={mock.apiUrl} SAMINO_WEB_URL={mock.webUrl} SAMINO_SOCKET_URL={mock.socketUrl}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
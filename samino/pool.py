@@ -0,0 +1,316 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from time import monotonic
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Union
+
+from .client import Client
+from .lib.auth import Credentials, SessionStore, accountKey
+from .lib.devices import devices
+from .lib.exception import (AccountDisabled, AminoBaseException, CommandCooldown, InvalidAccountOrPassword,
+                            InvalidSession, TooManyRequests, YouAreBanned)
+from .lib.hooks import hooks
+from .lib.paging import backoff
+from .lib.proxies import ProxyPool
+from .local import Local
+
+# account states
+LOGIN = "login"
+READY = "ready"
+DEAD = "dead"
+
+# errors after which an account is not logged in again
+LOST = (AccountDisabled, InvalidAccountOrPassword)
+# errors another account may not get, the operation is tried again on one
+RETRYABLE = (TooManyRequests, CommandCooldown, InvalidSession, AccountDisabled, YouAreBanned)
+
+
+class NoHealthyAccount(Exception):
+    """No account of an AccountPool can be used for an operation, or none got free in time."""
+
+
+class PooledAccount:
+    """One account of an AccountPool, its clients and what the pool knows of its health."""
+
+    def __init__(self, email: str = None, password: str = None, secret: str = None):
+        self.email = email
+        self.password = password
+        self.secret = secret
+        self.key = accountKey(email, secret)
+        self.credentials = Credentials(deviceId=devices.device(self.key))
+        self.client: Client = None
+        self.locals: Dict[int, Local] = {}
+
+        self.state = LOGIN
+        self.busy = 0
+        self.uses: Dict[Optional[int], int] = {}
+        self.strikes = 0  # rate limits in a row
+        self.failures = 0  # other failures in a row
+        self.logins = 0  # failed logins in a row
+        self.until: Dict[Optional[int], float] = {}  # comId (None for all of them) -> unusable until
+        self.banned: Set[int] = set()
+        self.errors = deque(maxlen=20)
+
+    def usable(self, comId: Optional[int], now: float) -> bool:
+        return (self.state == READY and comId not in self.banned
+                and self.until.get(None, 0) <= now and self.until.get(comId, 0) <= now)
+
+    def local(self, comId: Optional[int]) -> Union[Client, Local]:
+        """The Local of `comId` acting as this account, the Client itself for None."""
+        if comId is None:
+            return self.client
+        local = self.locals.get(comId)
+        if local is None:
+            local = self.locals.setdefault(comId, self.client.local(comId))
+        return local
+
+    @property
+    def health(self) -> dict:
+        now = monotonic()
+        return {
+            "account": self.key,
+            "uid": self.credentials.uid,
+            "state": self.state,
+            "busy": self.busy,
+            "uses": sum(self.uses.values()),
+            "quarantined": max(0.0, self.until.get(None, 0) - now),
+            "cooldowns": {comId: until - now for comId, until in self.until.items() if comId is not None and until > now},
+            "banned": sorted(self.banned),
+            "errors": list(self.errors),
+        }
+
+    def __repr__(self):
+        return f"PooledAccount({self.key!r}, {self.state}, busy={self.busy})"
+
+
+class AccountPool:
+    """
+    Spreads operations over several accounts, each logged in with its own Credentials
+    and device, so throughput grows with the number of accounts instead of hitting the
+    rate limits of one.
+
+        pool = AccountPool(store=FileSessionStore("sessions.json", key=key))
+        for email, password in accounts:
+            pool.add(email, password)
+
+        pool.run(lambda local: local.send_message(chatId, "hi"), comId)
+        pool.map(lambda local, uid: local.follow(uid), uids, comId)
+        with pool.account(comId) as local:
+            local.join_community()
+
+    Every operation gets the healthy account of the community with the fewest running
+    operations, at most `concurrency` at once per account. What the api answers moves
+    the account out of rotation:
+
+    - TooManyRequests rests it everywhere, CommandCooldown in that community, for
+      `cooldown` seconds doubling with every further one, up to `quarantine`.
+    - InvalidSession drops its sid and logs it in again in the background.
+    - YouAreBanned takes it out of that community, AccountDisabled out of the pool.
+    - `maxFailures` other failures (network errors ...) in a row quarantine it for
+      `quarantine` seconds.
+
+    Accounts log in on background threads as they are added, with `store` reusing the
+    sessions of earlier runs (see `Client.login`). With a ProxyPool as `proxies` every
+    account goes out through a proxy of its own.
+    """
+
+    def __init__(self, store: SessionStore = None, concurrency: int = 2, cooldown: float = 5.0,
+                 quarantine: float = 300.0, maxFailures: int = 3, loginWorkers: int = 2,
+                 proxies: Union[dict, ProxyPool] = None):
+        self.store = store if store is not None else SessionStore()
+        self.concurrency = concurrency
+        self.cooldown = cooldown
+        self.quarantine = quarantine
+        self.maxFailures = maxFailures
+        self.proxies = proxies
+        self.accounts: List[PooledAccount] = []
+        self.lock = threading.Condition()
+        self.logins = ThreadPoolExecutor(max_workers=loginWorkers, thread_name_prefix="samino-pool-login")
+
+    def __enter__(self) -> "AccountPool":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.accounts)
+
+    def add(self, email: str = None, password: str = None, secret: str = None) -> PooledAccount:
+        """Adds an account, it is used once its login in the background succeeded."""
+        if not ((email and password) or secret):
+            raise ValueError("Please provide VALID login info")
+        account = PooledAccount(email, password, secret)
+        with self.lock:
+            self.accounts.append(account)
+        self.logins.submit(self._login, account)
+        return account
+
+    def remove(self, account: PooledAccount):
+        with self.lock:
+            account.state = DEAD
+            self.accounts.remove(account)
+            self.lock.notify_all()
+
+    def wait(self, count: int = None, timeout: float = None) -> int:
+        """
+        Waits until `count` accounts (all of them by default) are logged in, lost, or failed a
+        login they keep retrying in the background, returns how many are ready.
+        """
+        with self.lock:
+            self.lock.wait_for(lambda: sum(a.state != LOGIN or a.logins > 0 for a in self.accounts)
+                               >= (count or len(self.accounts)), timeout)
+            return sum(a.state == READY for a in self.accounts)
+
+    # ------------------------------------------------------------------ logins
+
+    def _login(self, account: PooledAccount):
+        if account.state == DEAD:
+            return
+        try:
+            if account.client is None:
+                account.client = Client(proxies=self.proxies, credentials=account.credentials)
+            account.client.login(account.email, account.password, account.secret, store=self.store)
+        except LOST as error:
+            with self.lock:
+                account.errors.append((monotonic(), type(error).__name__))
+                account.state = DEAD
+                self.lock.notify_all()
+        except Exception as error:
+            with self.lock:
+                account.errors.append((monotonic(), type(error).__name__))
+                account.logins += 1
+                delay = backoff(account.logins - 1, self.cooldown, self.quarantine)
+                self.lock.notify_all()
+            timer = threading.Timer(delay, self._relogin, (account,))
+            timer.daemon = True
+            timer.start()
+        else:
+            with self.lock:
+                if account.state == LOGIN: account.state = READY
+                account.logins = account.failures = 0
+                self.lock.notify_all()
+
+    def _relogin(self, account: PooledAccount):
+        try:
+            self.logins.submit(self._login, account)
+        except RuntimeError:
+            pass  # the pool was closed
+
+    # ------------------------------------------------------------------ accounts
+
+    def acquire(self, comId: int = None, timeout: float = None) -> PooledAccount:
+        """
+        Takes the least loaded healthy account for `comId`, waiting up to `timeout` seconds
+        for one to get free. Hand it back with `release`.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        with self.lock:
+            while True:
+                now = monotonic()
+                ready = [a for a in self.accounts if a.usable(comId, now) and a.busy < self.concurrency]
+                if ready:
+                    account = min(ready, key=lambda a: (a.busy, a.uses.get(comId, 0)))
+                    account.busy += 1
+                    account.uses[comId] = account.uses.get(comId, 0) + 1
+                    return account
+
+                if not any(a.state != DEAD and comId not in a.banned for a in self.accounts):
+                    raise NoHealthyAccount(f"no account of the pool can be used in {comId}")
+                if deadline is not None and now >= deadline:
+                    raise NoHealthyAccount(f"no account got free in {timeout}s")
+
+                # sleep until the first rest ends, a release or a login wakes the wait sooner
+                ends = [until for a in self.accounts if a.state == READY
+                        for key, until in a.until.items() if key in (None, comId) and until > now]
+                wakeup = min(ends + ([deadline] if deadline is not None else []), default=None)
+                self.lock.wait(None if wakeup is None else wakeup - now)
+
+    def release(self, account: PooledAccount, comId: int = None, error: Exception = None):
+        """Hands `account` back, with the error its operation failed with."""
+        with self.lock:
+            account.busy -= 1
+            if error is None:
+                account.strikes = account.failures = 0
+            else:
+                self._record(account, comId, error)
+            self.lock.notify_all()
+
+    def _record(self, account: PooledAccount, comId: Optional[int], error: Exception):
+        now = monotonic()
+        account.errors.append((now, type(error).__name__))
+
+        if isinstance(error, (TooManyRequests, CommandCooldown)):
+            account.strikes += 1
+            rest = backoff(account.strikes - 1, self.cooldown, self.quarantine)
+            scope = None if isinstance(error, TooManyRequests) else comId
+            account.until[scope] = max(account.until.get(scope, 0), now + rest)
+        elif isinstance(error, InvalidSession):
+            if account.state == READY:
+                account.state = LOGIN
+                self.store.delete(account.key)
+                self._relogin(account)
+        elif isinstance(error, AccountDisabled) or (isinstance(error, YouAreBanned) and comId is None):
+            account.state = DEAD
+        elif isinstance(error, YouAreBanned):
+            account.banned.add(comId)
+        elif not isinstance(error, AminoBaseException):
+            account.failures += 1
+            if account.failures >= self.maxFailures:
+                account.failures = 0
+                account.until[None] = now + self.quarantine
+
+    @contextmanager
+    def account(self, comId: int = None, timeout: float = None) -> Iterator[Union[Client, Local]]:
+        """The Local of `comId` (the Client for None) of the account picked by `acquire`."""
+        account = self.acquire(comId, timeout)
+        try:
+            yield account.local(comId)
+        except Exception as error:
+            self.release(account, comId, error)
+            raise
+        self.release(account, comId)
+
+    def run(self, func: Callable[[Union[Client, Local]], object], comId: int = None, retries: int = 3,
+            timeout: float = None):
+        """
+        `func(local)` with the Local of `comId` of the account picked by `acquire`. Failing
+        with an error that is about the account (see RETRYABLE) or the network, it is run
+        again on another one, up to `retries` times.
+        """
+        for attempt in range(retries + 1):
+            try:
+                with self.account(comId, timeout) as local:
+                    return func(local)
+            except RETRYABLE as error:
+                if attempt == retries: raise
+                hooks.retrying(error)
+            except AminoBaseException:
+                raise
+            except NoHealthyAccount:
+                raise
+            except Exception as error:
+                if attempt == retries: raise
+                hooks.retrying(error)
+
+    def map(self, func: Callable[[Union[Client, Local], object], object], items: Iterable, comId: int = None,
+            retries: int = 3, workers: int = None) -> list:
+        """`run(lambda local: func(local, item))` for every item at the same time, the results in order."""
+        items = list(items)
+        workers = workers or max(1, len(self.accounts) * self.concurrency)
+        with ThreadPoolExecutor(max_workers=min(workers, max(1, len(items))), thread_name_prefix="samino-pool") as pool:
+            futures = [pool.submit(self.run, lambda local, item=item: func(local, item), comId, retries) for item in items]
+            return [future.result() for future in futures]
+
+    @property
+    def health(self) -> List[dict]:
+        with self.lock:
+            return [account.health for account in self.accounts]
+
+    def close(self):
+        with self.lock:
+            for account in self.accounts:
+                if account.state == LOGIN: account.state = DEAD
+            self.lock.notify_all()
+        self.logins.shutdown(wait=True)
@@ -11,7 +11,10 @@ import ujson as json
 import websocket
 
 from .lib import *
+from .lib.cache import metadata, profiles
 from .lib.objects import *
+from .lib.recorder import Recorder
+from .lib.store import MessageStore
 
 
 class Callbacks:
@@ -96,6 +99,8 @@ class Callbacks:
         return self.notif_methods.get(key, self.default)(data)
 
     def _resolve_chat_message(self, data):
+        profiles.author(data)
+        metadata.event(data)
         key = f"{data['o']['chatMessage']['type']}:{data['o']['chatMessage'].get('mediaType', 0)}"
         return self.chat_methods.get(key, self.default)(data)
 
@@ -683,8 +688,10 @@ class Wss(Callbacks, WssClient, Headers):
         WssClient.__init__(self, self)
 
         self.narvi = "https://service.narvii.com/api/v1/"
-        self.socket_url = "wss://ws1.narvii.com"
+        self.socket_url = util.socketUrl
         self.lastMessage = {}
+        self.recorder: Optional[Recorder] = None
+        self.store: Optional[MessageStore] = None
         self.socket_thread: Optional[threading.Thread] = None
         websocket.enableTrace(trace)
 
@@ -707,7 +714,9 @@ class Wss(Callbacks, WssClient, Headers):
         return self.lastMessage
 
     def on_message(self, ws, data):
+        if self.recorder: self.recorder.write(data)
         self.lastMessage = json.loads(data)
+        if self.store: self.store.add_event(self.lastMessage)
         self.resolve(data)
         if self.trace:
             print("[ON-MESSAGE] Received a message . . .")
@@ -731,19 +740,18 @@ class Wss(Callbacks, WssClient, Headers):
         if self.trace:
             print("[LAUNCH] Sockets starting . . . ")
 
-        if self.http_proxy_host is not None and self.http_proxy_port is not None:
-            self.socket_thread = threading.Thread(
-                target=lambda: self.socket.run_forever(
-                    ping_interval=60,
-                    http_proxy_host=self.http_proxy_host,
-                    http_proxy_port=self.http_proxy_port,
-                    proxy_type=self.proxy_type,
-                    http_proxy_auth=self.http_proxy_auth)
-            )
-        else:
-            self.socket_thread = threading.Thread(
-                target=lambda: self.socket.run_forever(ping_interval=60)
-            )
+        options = {"ping_interval": 60}
+        if getattr(self.client, "proxyPool", None) is not None:
+            # the proxy the account's api requests go through
+            options.update(self.client.proxyPool.assign(self.client.credentials).websocket)
+        elif self.http_proxy_host is not None and self.http_proxy_port is not None:
+            options.update(
+                http_proxy_host=self.http_proxy_host,
+                http_proxy_port=self.http_proxy_port,
+                proxy_type=self.proxy_type,
+                http_proxy_auth=self.http_proxy_auth)
+
+        self.socket_thread = threading.Thread(target=lambda: self.socket.run_forever(**options))
         self.socket_thread.start()
 
     def close(self):
@@ -752,6 +760,28 @@ class Wss(Callbacks, WssClient, Headers):
             print("[CLOSE] closing socket . . .")
         timer.sleep(1.5)
 
+    def start_recording(self, path: str):
+        """
+        Append every raw frame received from now on to `path`,
+        the recording can be replayed offline with `lib.recorder.Replay`.
+        """
+        self.stop_recording()
+        self.recorder = Recorder(path)
+        return self.recorder
+
+    def stop_recording(self):
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+
+    def start_archiving(self, store: MessageStore):
+        """Write every chat message received from now on to a `lib.store.MessageStore`."""
+        self.store = store
+        return store
+
+    def stop_archiving(self):
+        self.store = None
+
     def socket_status(self):
         print("\nSockets are OPEN\n") if self.isOpened else print(
             "\nSockets are CLOSED\n"
@@ -48,6 +48,7 @@ setup(
         "ujson",
         "aiohttp"
     ],
+    extras_require={"crypto": ["cryptography"]},
     setup_requires=["wheel"],
     packages=find_packages(),
 )